@@ -3,37 +3,82 @@ import re
 import glob
 import yaml
 import json
+import time
 import uuid
 import shutil
+import secrets
 import logging
-import subprocess
-from ansible_vault import Vault
+from app.logs import setup_logging
+from app.serialization import serialize_list
+from app.middleware import CompressionMiddleware, LazySwaggerUI
+from app.tracing import setup_tracing, tracer
 from app.response_messages import response, errors
-from logging.handlers import RotatingFileHandler
-from flask import Flask, jsonify, request, Response, abort, make_response
+from flask import Flask, Blueprint, jsonify, request, Response, abort, \
+    make_response, current_app, g, has_request_context
 from werkzeug.security import generate_password_hash, check_password_hash
-from flask_swagger_ui import get_swaggerui_blueprint
-from functools import wraps
+from functools import wraps, partial
 from app.utils import get_connection, create_fetch_cmd, create_cmd_workspace,\
     create_cmd_up_pinfile, check_workspace_empty, get_connection_users, \
     create_admin_user, check_workspace_has_pinfile
+from app.data_access_layer.batching import GroupCommitWriter
+from app.data_access_layer.changes import ChangeFeed
+from app.data_access_layer.storage import AtomicJSONStorage
+from app.utils.archiver import WorkspaceArchiver
+from app.utils.artifacts import GZIP_SUFFIX, precompress_artifacts
+from app.utils.batch import BATCH_USER_KEY, dispatch_batch
+from app.utils.bulk import bulk_items, stream_ndjson
+from app.utils.clone import clone_tree
+from app.utils.expiry import ExpiryScheduler, parse_expiry
+from app.utils.files import file_response, workspace_file
+from app.utils.host_index import HostIndex
+from app.utils.idempotency import IdempotencyStore, idempotent
+from app.utils.provision_hash import hash_provision_inputs
+from app.utils.validation import validate_pinfile, validate_pinfile_file
+from app.utils.ratelimit import AdmissionControl, RateLimiter
+from app.utils.runner import LinchpinRunner
+from app.utils.scheduler import FairScheduler
+from app.utils.transfer import ArchiveError, export_workspace, \
+    extract_stream, file_stream
+from app.utils.webhooks import WebhookDispatcher, valid_webhook_url
+from app.utils.workspace_lock import WorkspaceOperations, operation_key
 
-app = Flask(__name__)
+api = Blueprint('api', __name__)
+logger = logging.getLogger(__name__)
 
 APP_DIR = os.path.dirname(os.path.realpath(__file__))
+CONFIG_FILE = os.environ.get('RESTYLINCHPIN_CONFIG', APP_DIR + '/config.yml')
 
 try:
-    with open(APP_DIR + '/config.yml', 'r') as f:
-        config = yaml.load(f)
+    with open(CONFIG_FILE, 'r') as f:
+        config = yaml.load(f, Loader=getattr(yaml, 'CSafeLoader',
+                                             yaml.SafeLoader))
 except Exception as x:
     config = {}
-    app.logger.error(x)
+    logger.error(x)
 
 
 # loads defaults when config.yml does not exists or has been removed
 WORKSPACE_DIR = config.get('workspace_path', '/tmp')
-LOGGER_FILE = config.get('logger_file_name', 'restylinchpin.log')
-DB_PATH = config.get('db_path', 'db.json')
+LOGGER_FILE = config.get('logger_file_name', 'restylinchpin-{pid}.log')
+ACCESS_LOGGER_FILE = config.get('access_logger_file_name',
+                                'restylinchpin-access-{pid}.log')
+LOGGER_MAX_BYTES = config.get('logger_max_bytes', 10485760)
+LOGGER_BACKUP_COUNT = config.get('logger_backup_count', 5)
+TRACING_ENABLED = config.get('tracing_enabled', True)
+TRACING_RING_SIZE = config.get('tracing_ring_size', 10000)
+TRACING_FILE = config.get('tracing_file_name', None)
+# single file holding both stores in configurations predating the split
+LEGACY_DB_PATH = config.get('db_path', None)
+USERS_DB_PATH = config.get('users_db_path', LEGACY_DB_PATH or 'users.json')
+WORKSPACES_DB_PATH = config.get('workspaces_db_path',
+                                LEGACY_DB_PATH or 'workspaces.json')
+WORKSPACES_DB_PARTITIONED = config.get('workspaces_db_partitioned', False)
+if WORKSPACES_DB_PARTITIONED and LEGACY_DB_PATH and \
+        'workspaces_db_path' not in config:
+    # the db_path file shared with the users cannot become a directory
+    raise ValueError("workspaces_db_partitioned needs a workspaces_db_path "
+                     "directory, db_path %s is a single file" %
+                     LEGACY_DB_PATH)
 INVENTORY_PATH = config.get('inventory_path', '/dummy/inventories/*')
 LATEST_PATH = config.get('linchpin_latest_file_path',
                          '/dummy/resources/linchpin.latest')
@@ -43,23 +88,517 @@ ADMIN_USERNAME = config.get('admin_username', 'admin')
 ADMIN_PASSWORD = config.get('admin_password', 'password')
 ADMIN_EMAIL = config.get('admin_email', 'email')
 CREDS_PATH = config.get('creds_path', '/tmp')
+SERVER_CONFIG = config.get('server', {})
 
 # URL for exposing Swagger UI (without trailing '/')
 SWAGGER_URL = '/api/docs'
 # Our API url (can of course be a local resource)
 API_URL = 'https://api.myjson.com/bins/m95ah'
 
-# Call factory function to create our blueprint
-swaggerui_blueprint = get_swaggerui_blueprint(
-    SWAGGER_URL,
-    API_URL,
-    config={  # Swagger UI config overrides
-        'app_name': "restylinchpin"
-    }
-)
+# Swagger UI config overrides
+SWAGGER_UI_CONFIG = {
+    'app_name': "restylinchpin"
+}
 
 # path navigating to current workspace directory
-WORKSPACE_PATH = os.path.normpath(app.root_path + WORKSPACE_DIR + r' ')
+WORKSPACE_PATH = os.path.normpath(APP_DIR + WORKSPACE_DIR + r' ')
+# lock files serializing operations on a workspace across workers
+LOCKS_PATH = config.get('locks_path', WORKSPACE_PATH + '/.locks')
+
+# responses of requests sent with an Idempotency-Key header
+IDEMPOTENCY_PATH = config.get('idempotency_path',
+                              WORKSPACE_PATH + '/.idempotency')
+IDEMPOTENCY_TTL = config.get('idempotency_ttl', 86400)
+PINFILE_VALIDATION = config.get('pinfile_validation', True)
+JOBS_PATH = config.get('jobs_path', WORKSPACE_PATH + '/.jobs')
+LINCHPIN_TIMEOUTS = config.get('linchpin_timeouts', {})
+LINCHPIN_KILL_GRACE = config.get('linchpin_kill_grace', 10)
+LINCHPIN_RLIMITS = config.get('linchpin_rlimits', {})
+LINCHPIN_MAX_RUNNING = config.get('linchpin_max_running', 16)
+LINCHPIN_MAX_PER_USER = config.get('linchpin_max_per_user', 4)
+LINCHPIN_USER_WEIGHTS = config.get('linchpin_user_weights', {})
+LINCHPIN_PRIORITIES = config.get('linchpin_priorities', {})
+RATE_LIMITS = config.get('rate_limits', {})
+SHED_MAX_JOBS = config.get('shed_max_jobs', None)
+SHED_RETRY_AFTER = config.get('shed_retry_after', 30)
+BULK_MAX_ITEMS = config.get('bulk_max_items', 100)
+BULK_MAX_PARALLEL = config.get('bulk_max_parallel', 8)
+BATCH_MAX_REQUESTS = config.get('batch_max_requests', 50)
+BATCH_MAX_PARALLEL = config.get('batch_max_parallel', 8)
+COMPRESSION_ENABLED = config.get('compression_enabled', True)
+COMPRESSION_MIN_SIZE = config.get('compression_min_size', 1024)
+COMPRESSION_LEVELS = config.get('compression_levels', {})
+COMPRESSION_ENCODINGS = config.get('compression_encodings', None)
+PRECOMPRESS_ARTIFACTS = config.get('precompress_artifacts', True)
+HOST_INDEX_PATH = config.get('host_index_path',
+                             WORKSPACE_PATH + '/.host_index.db')
+SEARCH_MAX_RESULTS = config.get('search_max_results', 1000)
+CHANGES_PATH = config.get('changes_path', WORKSPACE_PATH + '/.changes.db')
+CHANGES_RETENTION = config.get('changes_retention', 86400)
+CHANGES_MAX_WAIT = config.get('changes_max_wait', 60)
+CHANGES_MAX_RESULTS = config.get('changes_max_results', 1000)
+# base URL of the API used in links sent to webhooks, defaults to the
+# URL the request completing the job was sent to
+PUBLIC_URL = config.get('public_url', None)
+WEBHOOK_DEAD_LETTER_PATH = config.get('webhook_dead_letter_path',
+                                      WORKSPACE_PATH + '/.webhooks')
+WEBHOOK_BATCH_INTERVAL = config.get('webhook_batch_interval', 1.0)
+WEBHOOK_BATCH_MAX = config.get('webhook_batch_max', 100)
+WEBHOOK_MAX_ATTEMPTS = config.get('webhook_max_attempts', 8)
+WEBHOOK_BACKOFF = config.get('webhook_backoff', 2.0)
+WEBHOOK_MAX_BACKOFF = config.get('webhook_max_backoff', 600)
+WEBHOOK_TIMEOUT = config.get('webhook_timeout', 10)
+ARCHIVE_ENABLED = config.get('archive_enabled', True)
+ARCHIVE_PATH = config.get('archive_path', WORKSPACE_PATH + '/.archive')
+ARCHIVE_IDLE_DAYS = config.get('archive_idle_days', 30)
+ARCHIVE_HIGH_WATERMARK = config.get('archive_high_watermark', None)
+ARCHIVE_LOW_WATERMARK = config.get('archive_low_watermark', None)
+ARCHIVE_INTERVAL = config.get('archive_interval', 3600)
+# ttl given to provisions requested without one, None for no expiry
+DEFAULT_TTL = config.get('default_ttl', None)
+MAX_TTL = config.get('max_ttl', None)
+EXPIRY_MAX_WORKERS = config.get('expiry_max_workers', 4)
+CLONE_HARDLINKS = config.get('clone_hardlinks', True)
+CLONE_STATE_DIRS = config.get('clone_state_dirs', ['resources',
+                                                   'inventories'])
+EXPORT_COMPRESS_LEVEL = config.get('export_compress_level', 1)
+IMPORT_MAX_SIZE = config.get('import_max_size', 10737418240)
+IMPORT_MAX_FILES = config.get('import_max_files', 100000)
+FILES_OFFLOAD = config.get('files_offload', None)
+FILES_OFFLOAD_PREFIX = config.get('files_offload_prefix', '/_workspaces/')
+FILES_MAX_AGE = config.get('files_max_age', 0)
+# workspaces in these states are never archived
+ARCHIVE_SKIP_STATUSES = (response.PROVISION_STATUS_SUCCESS,
+                         response.WORKSPACE_REQUESTED)
+
+workspace_ops = WorkspaceOperations(LOCKS_PATH)
+idempotency_store = IdempotencyStore(IDEMPOTENCY_PATH, IDEMPOTENCY_TTL)
+linchpin_scheduler = FairScheduler(JOBS_PATH + '/slots', LINCHPIN_MAX_RUNNING,
+                                   LINCHPIN_MAX_PER_USER,
+                                   LINCHPIN_USER_WEIGHTS, LINCHPIN_PRIORITIES)
+linchpin_runner = LinchpinRunner(JOBS_PATH, LINCHPIN_TIMEOUTS,
+                                 LINCHPIN_RLIMITS, LINCHPIN_KILL_GRACE,
+                                 scheduler=linchpin_scheduler)
+admission = AdmissionControl(RateLimiter(RATE_LIMITS), JOBS_PATH,
+                             SHED_MAX_JOBS, SHED_RETRY_AFTER)
+host_index = HostIndex(HOST_INDEX_PATH)
+archiver = WorkspaceArchiver(WORKSPACE_PATH, ARCHIVE_PATH, workspace_ops,
+                             ARCHIVE_IDLE_DAYS, ARCHIVE_HIGH_WATERMARK,
+                             ARCHIVE_LOW_WATERMARK,
+                             COMPRESSION_LEVELS.get('gzip', 6))
+workspace_changes = ChangeFeed(CHANGES_PATH, CHANGES_RETENTION)
+
+
+def webhook_settings(username) -> tuple:
+    """
+        Looks up the registered webhook of a user, called by the webhook
+        dispatcher thread
+        :return : webhook url and signing secret, None when unset
+    """
+    user = get_connection_users(USERS_DB_PATH).db_get_username(username)
+    if not user:
+        return None, None
+    return user.get('webhook_url'), user.get('webhook_secret')
+
+
+webhooks = WebhookDispatcher(webhook_settings, WEBHOOK_DEAD_LETTER_PATH,
+                             WEBHOOK_BATCH_INTERVAL, WEBHOOK_BATCH_MAX,
+                             WEBHOOK_MAX_ATTEMPTS, WEBHOOK_BACKOFF,
+                             WEBHOOK_MAX_BACKOFF, WEBHOOK_TIMEOUT)
+
+
+def get_workspace_connection(current_user):
+    """
+        Method to connect to the workspaces store on behalf of a user,
+        non-admin users are scoped to their own partition when
+        workspaces_db_partitioned is set
+        :return : an instantiated workspaces db connection
+    """
+    owner = None if current_user['admin'] else current_user['username']
+    return get_connection(WORKSPACES_DB_PATH, WORKSPACES_DB_PARTITIONED,
+                          owner, workspace_changes)
+
+
+def get_vault(vault_pass):
+    """
+        Method to create an ansible vault, ansible_vault pulls in the
+        ansible crypto stack so it is only imported by credentials routes
+        :return : an instantiated Vault for vault_pass
+    """
+    from ansible_vault import Vault
+    return Vault(vault_pass)
+
+
+def inventory_files(pattern) -> list:
+    """
+        :return: paths matching a glob pattern, without the precompressed
+                 copies of the files
+    """
+    return [path for path in glob.glob(pattern)
+            if not path.endswith(GZIP_SUFFIX)]
+
+
+def read_provision_result(identity, code) -> dict:
+    """
+        Reads the linchpin.latest and newest inventory of a workspace
+        :return : dict with provisioned workspace id, status, inventory,
+                  linchpin.latest contents and return code
+    """
+    linchpin_latest_path = WORKSPACE_PATH + "/" + identity + LATEST_PATH
+    with open(linchpin_latest_path, 'r') as file:
+        linchpin_latest = json.load(file)
+    directory_path = inventory_files(WORKSPACE_PATH + "/" + identity +
+                                     INVENTORY_PATH)
+    latest_file = max(directory_path, key=os.path.getctime)
+    with open(latest_file, 'r') as data:
+        inventory = data.read().replace('\n', ' ')
+    return dict(id=identity,
+                status=response.PROVISION_SUCCESS,
+                inventory=inventory,
+                latest=linchpin_latest,
+                code=code,
+                mimetype='application/json')
+
+
+def index_workspace_hosts(identity, username) -> None:
+    """
+        Indexes the hosts of a provisioned workspace for host search, a
+        failing index is logged and does not fail the provision
+    """
+    try:
+        host_index.update_files(
+            identity, username, WORKSPACE_PATH + "/" + identity +
+            LATEST_PATH, inventory_files(WORKSPACE_PATH + "/" + identity +
+                                         INVENTORY_PATH))
+    except Exception as e:
+        logger.error(e)
+
+
+def unindex_workspace_hosts(identity) -> None:
+    """
+        Drops the hosts of a destroyed or deleted workspace from host search
+    """
+    try:
+        host_index.remove(identity)
+    except Exception as e:
+        logger.error(e)
+
+
+def reindex_hosts() -> int:
+    """
+        Rebuilds the host search index from every provisioned workspace
+        :return : number of workspaces indexed
+    """
+    db_con = get_connection(WORKSPACES_DB_PATH, WORKSPACES_DB_PARTITIONED,
+                            changes=workspace_changes)
+    count = 0
+    for workspace in db_con.db_list_all(None, True):
+        if workspace.get('status') == response.PROVISION_STATUS_SUCCESS:
+            index_workspace_hosts(workspace['id'], workspace['username'])
+            count += 1
+        else:
+            unindex_workspace_hosts(workspace['id'])
+    return count
+
+
+def workspace_links(identity) -> dict:
+    """
+        :return : dict of the API routes returning the artifacts of a
+                  workspace, absolute when the base URL is known
+    """
+    base = PUBLIC_URL or (request.host_url if has_request_context() else '')
+    base = base.rstrip('/') + '/api/v1.0/workspaces/' + identity
+    return dict(linchpin_latest=base + '/linchpin_latest',
+                inventory=base + '/inventory')
+
+
+def notify_completion(action, identity, username, result,
+                      webhook_url=None) -> None:
+    """
+        Queues the completion event of a job for the webhooks of username
+        and webhook_url, delivery happens in the background
+        :param action: up, destroy or fetch
+        :param result: dict returned to the client for the job
+    """
+    try:
+        webhooks.notify(username, dict(event=action, id=identity,
+                                       username=username,
+                                       status=result.get('status'),
+                                       code=result.get('code'),
+                                       message=result.get('message'),
+                                       cached=result.get('cached', False),
+                                       links=workspace_links(identity),
+                                       time=time.time()),
+                        webhook_url)
+    except Exception as e:
+        logger.error(e)
+
+
+def with_webhooks(action, identity, username, webhook_url, function):
+    """
+        Runs function and notifies the webhooks of username and
+        webhook_url of its result, or of its failure
+        :return : the result of function
+    """
+    try:
+        result = function()
+    except Exception as e:
+        notify_completion(action, identity, username,
+                          dict(status=errors.ERROR_STATUS, message=str(e)),
+                          webhook_url)
+        raise
+    notify_completion(action, identity, username, result, webhook_url)
+    return result
+
+
+def workspace_expiries() -> list:
+    """
+        :return : (id, expires_at) of the provisioned workspaces with an
+                  expiry, loaded by the expiry scheduler when it starts
+    """
+    db_con = get_connection(WORKSPACES_DB_PATH, WORKSPACES_DB_PARTITIONED,
+                            changes=workspace_changes)
+    return [(workspace['id'], workspace['expires_at'])
+            for workspace in db_con.db_list_all(None, True)
+            if workspace.get('status') ==
+            response.PROVISION_STATUS_SUCCESS and
+            workspace.get('expires_at') is not None]
+
+
+def destroy_request(data, provision_type) -> dict:
+    """
+        :return : the fields of an up request body the destroy of an
+                  expired workspace is built from
+    """
+    if provision_type == "pinfile":
+        fields = dict(pinfile_path=os.path.dirname(PINFILE_JSON_PATH),
+                      pinfile_name=os.path.basename(PINFILE_JSON_PATH))
+    else:
+        fields = {key: data[key] for key in ('pinfile_path', 'pinfile_name')
+                  if key in data}
+    if 'creds_path' in data:
+        fields['creds_path'] = data['creds_path']
+    return fields
+
+
+def destroy_expired(db_con, identity) -> dict:
+    """
+        Runs linchpin destroy for a workspace whose expiry time is
+        reached, called with the workspace lock held. Workspaces destroyed
+        meanwhile or whose expiry has been moved are left alone.
+        :return : dict with destroyed workspace id, status and return code,
+                  None when the workspace was not destroyed
+    """
+    workspace = db_con.db_search_identities([identity])
+    if not workspace or \
+            workspace[0]['status'] != response.PROVISION_STATUS_SUCCESS:
+        return None
+    workspace = workspace[0]
+    expires_at = workspace.get('expires_at')
+    if expires_at is None or expires_at > time.time():
+        # moved by a request served by another worker process
+        expiry_scheduler.schedule(identity, expires_at)
+        return None
+    username = workspace['username']
+    user = get_connection_users(USERS_DB_PATH).db_search_name(username)
+    data = dict(workspace.get('destroy_request') or {})
+    if not check_workspace_has_pinfile(
+            identity + data.get('pinfile_path', ''),
+            data.get('pinfile_name', 'PinFile'), WORKSPACE_PATH):
+        logger.error("%s expired but its PinFile is gone", identity)
+        return None
+    creds_path = WORKSPACE_PATH + CREDS_PATH + (user.get('creds_folder') or
+                                                '')
+    cmd = create_cmd_workspace(data, identity, "destroy", WORKSPACE_PATH,
+                               WORKSPACE_DIR, creds_path)
+    logger.info("destroying expired workspace %s", identity)
+    return with_webhooks('expire', identity, username, None,
+                         lambda: destroy_workspace(db_con, cmd, identity,
+                                                   username))
+
+
+def expire_workspace(identity) -> None:
+    """
+        Destroys an expired workspace, called by the expiry scheduler of
+        every worker process
+    """
+    db_con = get_connection(WORKSPACES_DB_PATH, WORKSPACES_DB_PARTITIONED,
+                            changes=workspace_changes)
+    workspace_ops.run(identity, operation_key('expire', identity, None),
+                      lambda: destroy_expired(db_con, identity))
+
+
+expiry_scheduler = ExpiryScheduler(expire_workspace, EXPIRY_MAX_WORKERS)
+
+
+def archivable_workspaces() -> list:
+    """
+        :return : ids of the workspaces the archiver may pack, those not
+                  provisioned nor being created
+    """
+    db_con = get_connection(WORKSPACES_DB_PATH, WORKSPACES_DB_PARTITIONED,
+                            changes=workspace_changes)
+    return [workspace['id'] for workspace in db_con.db_list_all(None, True)
+            if workspace.get('status') not in ARCHIVE_SKIP_STATUSES]
+
+
+def workspace_archivable(identity) -> bool:
+    """
+        Checks again, with the workspace lock held, that the archiver may
+        still pack a workspace
+        :return : True when it is neither provisioned nor being created
+    """
+    db_con = get_connection(WORKSPACES_DB_PATH, WORKSPACES_DB_PARTITIONED,
+                            changes=workspace_changes)
+    workspace = db_con.db_search_identities([identity])
+    return bool(workspace) and \
+        workspace[0].get('status') not in ARCHIVE_SKIP_STATUSES
+
+
+def archive_idle_workspaces() -> int:
+    """
+        Archives the idle workspaces once
+        :return : number of workspaces archived, None when another process
+                  is archiving
+    """
+    return archiver.run_once(archivable_workspaces, workspace_archivable)
+
+
+def provision_workspace(db_con, cmd, identity, pinfile=None,
+                        creds_path=None, force=False) -> dict:
+    """
+        Runs linchpin up for a workspace, called with the workspace lock
+        held. When pinfile is given and the PinFile, the files it
+        references, the credentials and cmd are unchanged since the last
+        successful run, the stored inventory and linchpin.latest are
+        returned without running linchpin unless force is set
+        :param pinfile: path of the PinFile to hash, None to always run
+        :param creds_path: credentials folder passed to linchpin
+        :param force: boolean forcing linchpin up to run
+        :return : dict with provisioned workspace id, status, inventory,
+                  linchpin.latest contents and return code
+    """
+    provision_hash = None
+    if pinfile is not None:
+        provision_hash = hash_provision_inputs(pinfile, creds_path, cmd)
+        workspace = db_con.db_search_identities([identity])
+        if not force and workspace and \
+                workspace[0]['status'] == response.PROVISION_STATUS_SUCCESS \
+                and workspace[0].get('provision_hash') == provision_hash:
+            try:
+                result = read_provision_result(identity, 0)
+                result['cached'] = True
+                return result
+            except (OSError, ValueError):
+                # outputs of the last run are gone, provision again
+                pass
+    output = linchpin_runner.run(cmd, identity)
+    result = read_provision_result(identity, output.returncode)
+    if output.returncode == 0 and PRECOMPRESS_ARTIFACTS:
+        precompress_artifacts(
+            [WORKSPACE_PATH + "/" + identity + LATEST_PATH] +
+            inventory_files(WORKSPACE_PATH + "/" + identity +
+                            INVENTORY_PATH),
+            COMPRESSION_LEVELS.get('gzip', 6))
+    if output.returncode == 0:
+        workspace = db_con.db_search_identities([identity])
+        if workspace:
+            index_workspace_hosts(identity, workspace[0]['username'])
+    db_con.db_update_provisioned(identity,
+                                 response.PROVISION_STATUS_SUCCESS,
+                                 provision_hash
+                                 if output.returncode == 0 else None)
+    return result
+
+
+def destroy_workspace(db_con, cmd, identity, username=None) -> dict:
+    """
+        Runs linchpin destroy for a workspace, called with the workspace
+        lock held
+        :param username: user the job runs for, defaults to the user of
+                         the current request
+        :return : dict with destroyed workspace id, status and return code
+    """
+    output = linchpin_runner.run(cmd, identity, username)
+    db_con.db_update(identity, response.DESTROY_STATUS_SUCCESS)
+    if output.returncode == 0:
+        unindex_workspace_hosts(identity)
+    return dict(id=identity,
+                status=response.DESTROY_SUCCESS,
+                code=output.returncode,
+                mimetype='application/json')
+
+
+def init_workspace(db_con, identity, name, username) -> dict:
+    """
+        Runs linchpin init for a workspace inserted in db, used by bulk
+        creation
+        :return : dict with created workspace name, id, status and code
+    """
+    try:
+        output = linchpin_runner.run(["linchpin", "-w " + WORKSPACE_DIR +
+                                      identity + "/", "init"], identity,
+                                     username)
+        db_con.db_update(identity, response.WORKSPACE_SUCCESS)
+        return dict(name=name, id=identity,
+                    status=response.CREATE_SUCCESS,
+                    Code=output.returncode)
+    except Exception as e:
+        logger.error(e)
+        db_con.db_update(identity, response.WORKSPACE_FAILED)
+        return dict(name=name, id=identity, status=errors.ERROR_STATUS,
+                    message=str(e))
+
+
+def destroy_bulk_item(db_con, data, cmd, username) -> dict:
+    """
+        Destroys one workspace of a bulk destroy request
+        :return : dict with destroyed workspace id, status and return code
+    """
+    identity = data['id']
+    try:
+        return workspace_ops.run(
+            identity, operation_key('destroy', identity, data),
+            partial(with_webhooks, 'destroy', identity, username,
+                    data.get('webhook_url'),
+                    lambda: destroy_workspace(db_con, cmd, identity,
+                                              username)))
+    except Exception as e:
+        logger.error(e)
+        db_con.db_update(identity, response.DESTROY_FAILED)
+        return dict(id=identity, status=errors.ERROR_STATUS, message=str(e))
+
+
+def write_pinfile(json_pinfile_path, pinfile_content) -> dict:
+    """
+        Replaces a workspace PinFile, called with the workspace lock held.
+        The file is written aside and renamed so clones sharing it through
+        a hard link keep their own copy.
+        :return : dict with successful pinfile updation status
+    """
+    AtomicJSONStorage(json_pinfile_path).write(pinfile_content)
+    return dict(message=response.PINFILE_UPDATED)
+
+
+def delete_workspace(db_con, identity, current_user) -> dict:
+    """
+        Removes a workspace directory and record, called with the
+        workspace lock held
+        :return : dict with deleted workspace id and status
+    """
+    archived = archiver.remove(identity)
+    for w in os.listdir(WORKSPACE_PATH):
+        if w == identity:
+            shutil.rmtree(WORKSPACE_PATH + "/" + w)
+            archived = True
+    if archived:
+        db_con.db_remove(identity, current_user['admin'],
+                         current_user['username'])
+        unindex_workspace_hosts(identity)
+        return dict(id=identity,
+                    status=response.DELETE_SUCCESS,
+                    mimetype='application/json')
+    return dict(status=response.NOT_FOUND)
 
 
 def auth_required(function):
@@ -70,23 +609,35 @@ def auth_required(function):
             :return : returns successful route if success else
                         api-key invalid message
         """
-        db_con = get_connection_users(DB_PATH)
-        api_key = None
-        if 'api_key' in request.headers:
-            api_key = request.headers['api_key']
-        if not api_key:
-            return jsonify(response.API_KEY_MISSING)
-        try:
-            current_user = db_con.db_get_api_key(api_key)
-            if current_user is None:
-                return jsonify(response.API_KEY_INVALID)
-        except Exception as e:
-            return jsonify(message=response.API_KEY_INVALID, status=e)
+        with tracer.span('auth_required'):
+            batch = request.environ.get(BATCH_USER_KEY)
+            if batch is not None:
+                # sub-request of /batch, authenticated once by the batch
+                api_key, current_user = batch
+            else:
+                db_con = get_connection_users(USERS_DB_PATH)
+                api_key = None
+                if 'api_key' in request.headers:
+                    api_key = request.headers['api_key']
+                if not api_key:
+                    return jsonify(response.API_KEY_MISSING)
+                try:
+                    current_user = db_con.db_get_api_key(api_key)
+                    if current_user is None:
+                        return jsonify(response.API_KEY_INVALID)
+                except Exception as e:
+                    return jsonify(message=response.API_KEY_INVALID,
+                                   status=e)
+            g.current_user = current_user
+            rejected = admission.check(api_key, request.endpoint,
+                                       request.method)
+            if rejected is not None:
+                return rejected
         return function(current_user, *args, **kwargs)
     return decorated
 
 
-@app.route('/api/v1.0/users', methods=['POST'])
+@api.route('/api/v1.0/users', methods=['POST'])
 @auth_required
 def new_user(current_user):
     """
@@ -94,7 +645,7 @@ def new_user(current_user):
         :return : response with created username,
                     email, admin status.
     """
-    db_con = get_connection_users(DB_PATH)
+    db_con = get_connection_users(USERS_DB_PATH)
     try:
         if not current_user['admin']:
             return jsonify(message=errors.UNAUTHORIZED_REQUEST)
@@ -117,17 +668,17 @@ def new_user(current_user):
         return jsonify(status=errors.ERROR_STATUS,
                        message=errors.KEY_ERROR)
     except Exception as e:
-        app.logger.error(e)
+        current_app.logger.error(e)
         return jsonify(status=errors.ERROR_STATUS, message=str(e))
 
 
-@app.route('/api/v1.0/login')
+@api.route('/api/v1.0/login')
 def login():
     """
         GET request route for user login
         :return : response with API KEY to be used for making request
     """
-    db_con = get_connection_users(DB_PATH)
+    db_con = get_connection_users(USERS_DB_PATH)
     try:
         authorize = request.authorization
         if not authorize or not authorize.username \
@@ -144,11 +695,11 @@ def login():
         return jsonify(status=errors.ERROR_STATUS,
                        message=errors.KEY_ERROR)
     except Exception as e:
-        app.logger.error(e)
+        current_app.logger.error(e)
         return jsonify(status=errors.ERROR_STATUS, message=str(e))
 
 
-@app.route('/api/v1.0/users/<username>')
+@api.route('/api/v1.0/users/<username>')
 @auth_required
 def get_user(current_user, username):
     """
@@ -156,7 +707,7 @@ def get_user(current_user, username):
         :return : response with user's username, api_key,
                     email, admin status.
     """
-    db_con = get_connection_users(DB_PATH)
+    db_con = get_connection_users(USERS_DB_PATH)
     try:
         if not current_user['admin'] and \
                 not current_user['username'] == username:
@@ -169,11 +720,11 @@ def get_user(current_user, username):
                        email=current_user['email'],
                        admin=current_user['admin'])
     except Exception as e:
-        app.logger.error(e)
+        current_app.logger.error(e)
         return jsonify(status=errors.ERROR_STATUS, message=str(e))
 
 
-@app.route('/api/v1.0/users')
+@api.route('/api/v1.0/users')
 @auth_required
 def get_users(current_user):
     """
@@ -181,19 +732,18 @@ def get_users(current_user):
         :return : response with list of all users
                   present in db.
     """
-    db_con = get_connection_users(DB_PATH)
+    db_con = get_connection_users(USERS_DB_PATH)
     try:
         if not current_user['admin']:
             return jsonify(message=errors.UNAUTHORIZED_REQUEST)
         users = db_con.db_list_all()
-        return Response(json.dumps(users), status=response.STATUS_OK,
-                        mimetype='application/json')
+        return serialize_list(users, response.STATUS_OK)
     except Exception as e:
-        app.logger.error(e)
+        current_app.logger.error(e)
         return jsonify(status=errors.ERROR_STATUS, message=str(e))
 
 
-@app.route('/api/v1.0/users', methods=['DELETE'])
+@api.route('/api/v1.0/users', methods=['DELETE'])
 @auth_required
 def delete_api_key(current_user):
     """
@@ -201,7 +751,7 @@ def delete_api_key(current_user):
         Request args are accepted as /api/v1.0/users?api_key=value
         :return : response with success message
     """
-    db_con = get_connection_users(DB_PATH)
+    db_con = get_connection_users(USERS_DB_PATH)
     try:
         api_key = request.args.get('api_key')
         user = db_con.db_get_api_key(api_key)
@@ -213,11 +763,11 @@ def delete_api_key(current_user):
         db_con.db_remove_api_key(api_key)
         return jsonify(message=response.API_KEY_DELETED)
     except Exception as e:
-        app.logger.error(e)
+        current_app.logger.error(e)
         return jsonify(status=errors.ERROR_STATUS, message=str(e))
 
 
-@app.route('/api/v1.0/users/<username>/reset', methods=['POST'])
+@api.route('/api/v1.0/users/<username>/reset', methods=['POST'])
 def reset_api_key(username):
     """
          POST request route for resetting/adding a user's API key
@@ -225,7 +775,7 @@ def reset_api_key(username):
          Authentication is done using basic auth username, password
          :return : response with success message and new api_key value
     """
-    db_con = get_connection_users(DB_PATH)
+    db_con = get_connection_users(USERS_DB_PATH)
     try:
         authorize = request.authorization
         user = db_con.db_get_username(username)
@@ -242,18 +792,18 @@ def reset_api_key(username):
         return jsonify(message=response.API_KEY_RESET,
                        api_key=hashed_new_api_key)
     except Exception as e:
-        app.logger.error(e)
+        current_app.logger.error(e)
         return jsonify(status=errors.ERROR_STATUS, message=str(e))
 
 
-@app.route('/api/v1.0/users/<username>/promote', methods=['PUT'])
+@api.route('/api/v1.0/users/<username>/promote', methods=['PUT'])
 @auth_required
 def promote_user(current_user, username):
     """
         PUT request route for promoting a user to admin status
         :return : response with success message.
     """
-    db_con = get_connection_users(DB_PATH)
+    db_con = get_connection_users(USERS_DB_PATH)
     try:
         if not current_user['admin']:
             return jsonify(message=errors.UNAUTHORIZED_REQUEST)
@@ -263,11 +813,11 @@ def promote_user(current_user, username):
         db_con.db_update_admin(username, True)
         return jsonify(message=response.USER_PROMOTED)
     except Exception as e:
-        app.logger.error(e)
+        current_app.logger.error(e)
         return jsonify(status=errors.ERROR_STATUS, message=str(e))
 
 
-@app.route('/api/v1.0/users/<user_name>', methods=['PUT'])
+@api.route('/api/v1.0/users/<user_name>', methods=['PUT'])
 @auth_required
 def update_user(current_user, user_name):
     """
@@ -275,7 +825,7 @@ def update_user(current_user, user_name):
         :return : response with a list of fields updated
                   for user.
     """
-    db_con = get_connection_users(DB_PATH)
+    db_con = get_connection_users(USERS_DB_PATH)
     try:
         if not current_user['admin'] and \
                 not current_user['username'] == user_name:
@@ -304,18 +854,18 @@ def update_user(current_user, user_name):
         return jsonify(status=errors.ERROR_STATUS,
                        message=errors.KEY_ERROR)
     except Exception as e:
-        app.logger.error(e)
+        current_app.logger.error(e)
         return jsonify(status=errors.ERROR_STATUS, message=str(e))
 
 
-@app.route('/api/v1.0/users/<username>', methods=['DELETE'])
+@api.route('/api/v1.0/users/<username>', methods=['DELETE'])
 @auth_required
 def delete_user(current_user, username):
     """
         DELETE request route for deleting a user with given username
         :return : response with success message
     """
-    db_con = get_connection_users(DB_PATH)
+    db_con = get_connection_users(USERS_DB_PATH)
     try:
         if not current_user['admin'] and \
                 not current_user['username'] == username:
@@ -326,13 +876,14 @@ def delete_user(current_user, username):
         db_con.db_remove(username)
         return jsonify(message=response.USER_DELETED)
     except Exception as e:
-        app.logger.error(e)
+        current_app.logger.error(e)
         return jsonify(status=errors.ERROR_STATUS, message=str(e))
 
 
 # Route for creating workspaces
-@app.route('/api/v1.0/workspaces', methods=['POST'])
+@api.route('/api/v1.0/workspaces', methods=['POST'])
 @auth_required
+@idempotent(idempotency_store)
 def linchpin_init(current_user) -> Response:
     """
         POST request route for creating workspaces.
@@ -340,7 +891,7 @@ def linchpin_init(current_user) -> Response:
         :return : response with created workspace name,
                   id, status and code
     """
-    db_con = get_connection(DB_PATH)
+    db_con = get_workspace_connection(current_user)
     try:
         data = request.json  # Get request body
         name = data["name"]
@@ -356,9 +907,9 @@ def linchpin_init(current_user) -> Response:
                                message=errors.INVALID_NAME)
             else:
                 # Checking if workspace name contains any special characters
-                output = subprocess.Popen(["linchpin", "-w " +
-                                          WORKSPACE_DIR + identity +
-                                          "/", "init"], stdout=subprocess.PIPE)
+                output = linchpin_runner.run(["linchpin", "-w " +
+                                              WORKSPACE_DIR + identity +
+                                              "/", "init"], identity)
                 db_con.db_update(identity, response.WORKSPACE_SUCCESS)
                 return jsonify(name=data["name"], id=identity,
                                status=response.CREATE_SUCCESS,
@@ -366,7 +917,7 @@ def linchpin_init(current_user) -> Response:
                                mimetype='application/json')
         except Exception as e:
             db_con.db_update(identity, response.WORKSPACE_FAILED)
-            app.logger.error(e)
+            current_app.logger.error(e)
             return jsonify(status=errors.ERROR_STATUS, message=str(e))
     except (KeyError, ValueError, TypeError):
         return jsonify(status=errors.ERROR_STATUS,
@@ -374,7 +925,7 @@ def linchpin_init(current_user) -> Response:
 
 
 # Route for listing all workspaces
-@app.route('/api/v1.0/workspaces', methods=['GET'])
+@api.route('/api/v1.0/workspaces', methods=['GET'])
 @auth_required
 def linchpin_list_workspace(current_user) -> Response:
     """
@@ -382,7 +933,7 @@ def linchpin_list_workspace(current_user) -> Response:
         :return : response with a list of workspaces
         from the destination set in config.py
     """
-    db_con = get_connection(DB_PATH)
+    db_con = get_workspace_connection(current_user)
     try:
         workspace = db_con.db_search_username(current_user['username'])
         if not current_user['admin'] and not workspace:
@@ -390,22 +941,54 @@ def linchpin_list_workspace(current_user) -> Response:
         workspace_array = db_con.db_list_all(current_user['username'],
                                              current_user['admin'])
         # path specifying location of working directory inside server
-        return Response(json.dumps(workspace_array), status=response.STATUS_OK,
-                        mimetype='application/json')
+        return serialize_list(workspace_array, response.STATUS_OK)
+    except Exception as e:
+        current_app.logger.error(e)
+        return jsonify(status=errors.ERROR_STATUS, message=str(e))
+
+
+# Route for following changes of workspaces
+@api.route('/api/v1.0/workspaces/changes', methods=['GET'])
+@auth_required
+def linchpin_workspace_changes(current_user) -> Response:
+    """
+        GET request route for the changes of workspaces after a revision,
+        waits up to wait seconds for a change when there is none yet.
+        Users see the changes of their own workspaces, admin users see
+        the changes of every workspace
+        Request args are accepted as
+        /api/v1.0/workspaces/changes?since=revision&wait=seconds
+        :return : response with the changes oldest first, each with its
+                  revision, workspace id, name, status, username and
+                  whether it was deleted, the revision to pass as since
+                  in the next request and reset set when changes after
+                  since were purged and workspaces should be listed again
+    """
+    try:
+        since = max(request.args.get('since', 0, type=int), 0)
+        wait = min(max(request.args.get('wait', 0, type=float), 0),
+                   CHANGES_MAX_WAIT)
+        username = None if current_user['admin'] \
+            else current_user['username']
+        with tracer.span('changes.wait', since=since, wait=wait):
+            changes, revision, reset = workspace_changes.wait(
+                since, username, wait, CHANGES_MAX_RESULTS)
+        return jsonify(changes=changes, revision=revision, reset=reset,
+                       status=response.STATUS_OK)
     except Exception as e:
-        app.logger.error(e)
+        current_app.logger.error(e)
         return jsonify(status=errors.ERROR_STATUS, message=str(e))
 
 
 # Route for listing workspaces filtered by name
-@app.route('/api/v1.0/workspaces/<name>', methods=['GET'])
+@api.route('/api/v1.0/workspaces/<name>', methods=['GET'])
 @auth_required
 def linchpin_list_workspace_by_name(current_user, name) -> Response:
     """
         GET request route for listing workspaces by name
         :return : response with a list of workspaces filtered by name
     """
-    db_con = get_connection(DB_PATH)
+    db_con = get_workspace_connection(current_user)
     try:
         workspace_owner_user = \
             db_con.db_search_username(current_user['username'])
@@ -414,15 +997,14 @@ def linchpin_list_workspace_by_name(current_user, name) -> Response:
         workspace = db_con.db_search(name, current_user['admin'],
                                      current_user['username'])
         # path specifying location of working directory inside server
-        return Response(json.dumps(workspace), status=response.STATUS_OK,
-                        mimetype='application/json')
+        return serialize_list(workspace, response.STATUS_OK)
     except Exception as e:
-        app.logger.error(e)
+        current_app.logger.error(e)
         return jsonify(status=errors.ERROR_STATUS, message=str(e))
 
 
 # Route for deleting workspaces by Id
-@app.route('/api/v1.0/workspaces/<identity>', methods=['DELETE'])
+@api.route('/api/v1.0/workspaces/<identity>', methods=['DELETE'])
 @auth_required
 def linchpin_delete_workspace(current_user, identity) -> Response:
     """
@@ -430,7 +1012,7 @@ def linchpin_delete_workspace(current_user, identity) -> Response:
         :param : unique uuid_name assigned to the workspace
         :return : response with deleted workspace id and status
     """
-    db_con = get_connection(DB_PATH)
+    db_con = get_workspace_connection(current_user)
     try:
         # path specifying location of working directory inside server
         workspace_owner_user =\
@@ -442,34 +1024,35 @@ def linchpin_delete_workspace(current_user, identity) -> Response:
             if not db_con.db_search(workspace['name'], current_user['admin'],
                                     current_user['username']):
                 return jsonify(response.NOT_FOUND)
-        for w in os.listdir(WORKSPACE_PATH):
-            if w == identity:
-                shutil.rmtree(WORKSPACE_PATH + "/" + w)
-                db_con.db_remove(identity, current_user['admin'],
-                                 current_user['username'])
-                return jsonify(id=identity,
-                               status=response.DELETE_SUCCESS,
-                               mimetype='application/json')
-        return jsonify(status=response.NOT_FOUND)
+        result = workspace_ops.run(
+            identity, operation_key('delete', identity, None),
+            lambda: delete_workspace(db_con, identity, current_user))
+        return jsonify(**result)
     except Exception as e:
-        app.logger.error(e)
+        current_app.logger.error(e)
         return jsonify(status=errors.ERROR_STATUS, message=str(e))
 
 
-@app.route('/api/v1.0/workspaces/fetch', methods=['POST'])
+@api.route('/api/v1.0/workspaces/fetch', methods=['POST'])
 @auth_required
+@idempotent(idempotency_store)
 def linchpin_fetch_workspace(current_user) -> Response:
     """
         POST request route for fetching workspaces from a remote URL
         RequestBody: {"name": "workspacename","url": "www.github.com/someurl",
-        "rootfolder":"/path/to/folder"}
+        "rootfolder":"/path/to/folder",
+        "webhook_url": "https://receiver/path" --> optional}
         :return : response with fetched workspace name,id, status and code
     """
-    db_con = get_connection(DB_PATH)
+    db_con = get_workspace_connection(current_user)
     try:
         data = request.json  # Get request body
         name = data['name']
         identity = str(uuid.uuid4()) + "_" + name
+        webhook_url = data.get('webhook_url')
+        if webhook_url is not None and not valid_webhook_url(webhook_url):
+            return jsonify(status=errors.ERROR_STATUS,
+                           message=errors.INVALID_WEBHOOK_URL)
         try:
             db_con.db_insert(identity, name,
                              response.WORKSPACE_REQUESTED,
@@ -481,29 +1064,42 @@ def linchpin_fetch_workspace(current_user) -> Response:
                 return jsonify(status=errors.ERROR_STATUS,
                                message=errors.INVALID_NAME)
             else:
-                output = subprocess.Popen(cmd, stdout=subprocess.PIPE)
-                output.communicate()
+                output = linchpin_runner.run(cmd, identity)
                 if check_workspace_empty(identity, WORKSPACE_PATH):
                     db_con.db_update(identity,
                                      response.WORKSPACE_FAILED)
+                    notify_completion('fetch', identity,
+                                      current_user['username'],
+                                      dict(status=response.EMPTY_WORKSPACE,
+                                           code=output.returncode),
+                                      webhook_url)
                     return jsonify(status=response.EMPTY_WORKSPACE)
                 db_con.db_update(identity,
                                  response.WORKSPACE_SUCCESS)
+                notify_completion('fetch', identity,
+                                  current_user['username'],
+                                  dict(status=response.CREATE_SUCCESS,
+                                       code=output.returncode),
+                                  webhook_url)
                 return jsonify(name=data["name"], id=identity,
                                status=response.CREATE_SUCCESS,
                                code=output.returncode,
                                mimetype='application/json')
         except Exception as e:
             db_con.db_update(identity, response.WORKSPACE_FAILED)
-            app.logger.error(e)
+            notify_completion('fetch', identity, current_user['username'],
+                              dict(status=errors.ERROR_STATUS,
+                                   message=str(e)), webhook_url)
+            current_app.logger.error(e)
             return jsonify(status=errors.ERROR_STATUS, message=str(e))
     except (KeyError, ValueError, TypeError):
         return jsonify(status=errors.ERROR_STATUS,
                        message=errors.KEY_ERROR_PARAMS_FETCH)
 
 
-@app.route('/api/v1.0/users/<username>/workspaces/up', methods=['POST'])
+@api.route('/api/v1.0/users/<username>/workspaces/up', methods=['POST'])
 @auth_required
+@idempotent(idempotency_store)
 def linchpin_up(current_user, username) -> Response:
     """
         POST request route for provisioning workspaces/pinFile already
@@ -511,14 +1107,21 @@ def linchpin_up(current_user, username) -> Response:
         RequestBody: {"id": "workspace_id",
                     provision_type: "workspace",
                     --> value can be either pinfile or workspace
+                    force: true
+                    --> optional, runs linchpin up even when nothing
+                        changed since the last successful provision
+                    webhook_url: "https://receiver/path"
+                    --> optional, called when the provision completes
+                    ttl: seconds or expires_at: timestamp or ISO 8601 date
+                    --> optional, destroys the workspace when reached
                     }
         :return : response with provisioned workspace id, status,
                   contents_of_latest_inventory_generated_in_inventoryfolder,
                   contents_of_linchpin.latest_file_in_resource_folder
     """
     identity = None
-    db_con = get_connection(DB_PATH)
-    db_con_users = get_connection_users(DB_PATH)
+    db_con = get_workspace_connection(current_user)
+    db_con_users = get_connection_users(USERS_DB_PATH)
     try:
         workspace = db_con.db_search_username(current_user['username'])
         user = db_con_users.db_search_name(username)
@@ -529,6 +1132,15 @@ def linchpin_up(current_user, username) -> Response:
             return jsonify(message=response.NOT_FOUND)
         data = request.json  # Get request body
         provision_type = data['provision_type']
+        webhook_url = data.get('webhook_url')
+        if webhook_url is not None and not valid_webhook_url(webhook_url):
+            return jsonify(status=errors.ERROR_STATUS,
+                           message=errors.INVALID_WEBHOOK_URL)
+        try:
+            expires_at = parse_expiry(data, DEFAULT_TTL, MAX_TTL)
+        except (ValueError, TypeError, OverflowError):
+            return jsonify(status=errors.ERROR_STATUS,
+                           message=errors.INVALID_EXPIRY)
         creds_path = WORKSPACE_PATH + CREDS_PATH + user['creds_folder']
         if provision_type == "workspace":
             identity = data['id']
@@ -539,66 +1151,78 @@ def linchpin_up(current_user, username) -> Response:
                                         current_user['admin'],
                                         current_user['username']):
                     return jsonify(message=response.NOT_FOUND)
+            archiver.restore(identity)
             if not os.path.exists(WORKSPACE_PATH + "/" + identity):
                 return jsonify(status=response.NOT_FOUND)
             cmd = create_cmd_workspace(data, identity, "up",
                                        WORKSPACE_PATH, WORKSPACE_DIR,
                                        creds_path)
+            pinfile = WORKSPACE_PATH + "/" + identity + \
+                data.get('pinfile_path', '') + "/" + \
+                data.get('pinfile_name', 'PinFile')
+            creds_path = data.get('creds_path', creds_path)
+            problems = validate_pinfile_file(pinfile) \
+                if PINFILE_VALIDATION else []
+            if problems:
+                return jsonify(status=errors.ERROR_STATUS,
+                               message=errors.INVALID_PINFILE,
+                               errors=problems)
         elif provision_type == "pinfile":
+            problems = validate_pinfile(data['pinfile_content']) \
+                if PINFILE_VALIDATION else []
+            if problems:
+                return jsonify(status=errors.ERROR_STATUS,
+                               message=errors.INVALID_PINFILE,
+                               errors=problems)
             if 'name' in data:
                 identity = str(uuid.uuid4()) + "_" + data['name']
             else:
                 identity = str(uuid.uuid4())
             precmd = ["linchpin", "-w " + WORKSPACE_DIR + identity +
                       "/", "init"]
-            output = subprocess.Popen(precmd, stdout=subprocess.PIPE)
-            output.communicate()
+            linchpin_runner.run(precmd, identity)
             db_con.db_insert_no_name(identity,
                                      response.WORKSPACE_REQUESTED,
                                      current_user['username'])
             cmd = create_cmd_up_pinfile(data, identity, WORKSPACE_PATH,
                                         WORKSPACE_DIR, PINFILE_JSON_PATH,
                                         creds_path)
+            pinfile = None
         else:
             raise ValueError
-        output = subprocess.Popen(cmd, stdout=subprocess.PIPE)
-        output.communicate()
-        linchpin_latest_path = WORKSPACE_PATH + "/" + identity + LATEST_PATH
-        with open(linchpin_latest_path, 'r') as file:
-            linchpin_latest = json.load(file)
-        directory_path = glob.glob(WORKSPACE_PATH + "/" + identity +
-                                   INVENTORY_PATH)
-        latest_file = max(directory_path, key=os.path.getctime)
-        with open(latest_file, 'r') as data:
-            inventory = data.read().replace('\n', ' ')
-        db_con.db_update(identity, response.PROVISION_STATUS_SUCCESS)
-        return jsonify(id=identity,
-                       status=response.PROVISION_SUCCESS,
-                       inventory=inventory,
-                       latest=linchpin_latest,
-                       code=output.returncode,
-                       mimetype='application/json')
+        force = str(data.get('force', False)).lower() == 'true'
+        db_con.db_update_expiry(identity, expires_at,
+                                destroy_request(data, provision_type))
+        expiry_scheduler.schedule(identity, expires_at)
+        result = workspace_ops.run(
+            identity, operation_key('up', identity, data),
+            partial(with_webhooks, 'up', identity, username, webhook_url,
+                    lambda: provision_workspace(db_con, cmd, identity,
+                                                pinfile, creds_path,
+                                                force)))
+        return jsonify(**result)
     except (KeyError, ValueError, TypeError):
         return jsonify(status=errors.ERROR_STATUS,
                        message=errors.KEY_ERROR)
     except Exception as e:
         db_con.db_update(identity, response.PROVISION_FAILED)
-        app.logger.error(e)
+        current_app.logger.error(e)
         return jsonify(status=errors.ERROR_STATUS, message=str(e))
 
 
-@app.route('/api/v1.0/users/<username>/workspaces/destroy', methods=['POST'])
+@api.route('/api/v1.0/users/<username>/workspaces/destroy', methods=['POST'])
 @auth_required
 def linchpin_destroy(current_user, username) -> Response:
     """
         POST request route for destroying workspaces/resources already created
         or provisioned
-        RequestBody: {"id": "workspace_id"}
+        RequestBody: {"id": "workspace_id",
+                      "webhook_url": "https://receiver/path" --> optional}
         :return : response with destroyed workspace id and status
     """
     identity = None
-    db_con = get_connection(DB_PATH)
-    db_con_users = get_connection_users(DB_PATH)
+    db_con = get_workspace_connection(current_user)
+    db_con_users = get_connection_users(USERS_DB_PATH)
     try:
         workspace = db_con.db_search_username(current_user['username'])
         user = db_con_users.db_search_name(username)
@@ -609,31 +1233,149 @@ def linchpin_destroy(current_user, username) -> Response:
             return jsonify(message=response.NOT_FOUND)
         data = request.json  # Get request body
         identity = data['id']
+        webhook_url = data.get('webhook_url')
+        if webhook_url is not None and not valid_webhook_url(webhook_url):
+            return jsonify(status=errors.ERROR_STATUS,
+                           message=errors.INVALID_WEBHOOK_URL)
         creds_path = WORKSPACE_PATH + CREDS_PATH + user['creds_folder']
         if not current_user['admin']:
             workspace = db_con.db_search_identity(identity)
             if not db_con.db_search(workspace['name'], current_user['admin'],
                                     current_user['username']):
                 return jsonify(message=response.NOT_FOUND)
+        archiver.restore(identity)
         cmd = create_cmd_workspace(data, identity, "destroy", WORKSPACE_PATH,
                                    WORKSPACE_DIR, creds_path)
-        output = subprocess.Popen(cmd, stdout=subprocess.PIPE)
-        output.communicate()
-        db_con.db_update(identity, response.DESTROY_STATUS_SUCCESS)
-        return jsonify(id=identity,
-                       status=response.DESTROY_SUCCESS,
-                       code=output.returncode,
-                       mimetype='application/json')
+        result = workspace_ops.run(
+            identity, operation_key('destroy', identity, data),
+            partial(with_webhooks, 'destroy', identity, username,
+                    webhook_url,
+                    lambda: destroy_workspace(db_con, cmd, identity)))
+        return jsonify(**result)
     except (KeyError, ValueError, TypeError):
         return jsonify(status=errors.ERROR_STATUS,
                        message=errors.KEY_ERROR_DESTROY)
     except Exception as e:
         db_con.db_update(identity, response.DESTROY_FAILED)
-        app.logger.error(e)
+        current_app.logger.error(e)
+        return jsonify(status=errors.ERROR_STATUS, message=str(e))
+
+
+@api.route('/api/v1.0/workspaces/bulk', methods=['POST'])
+@auth_required
+def linchpin_init_bulk(current_user) -> Response:
+    """
+        POST request route for creating many workspaces at once, the
+        records are inserted in a single db write, linchpin init runs in
+        parallel under the job scheduler and the resulting statuses are
+        written together once every init finished
+        RequestBody: {"workspaces": [{"name": "workspacename"}, ...]}
+        :return : streamed response with one JSON line per workspace with
+                  its name, id, status and code, in completion order
+    """
+    db_con = get_workspace_connection(current_user)
+    try:
+        items = bulk_items(request.json, 'workspaces', BULK_MAX_ITEMS)
+        names = [item['name'] for item in items]
+    except ValueError as e:
+        return jsonify(status=errors.ERROR_STATUS, message=str(e))
+    except (KeyError, TypeError):
+        return jsonify(status=errors.ERROR_STATUS,
+                       message=errors.KEY_ERROR_BULK_CREATE)
+    try:
+        ready, records = [], []
+        for name in names:
+            if not isinstance(name, str) or \
+                    not re.match("^[a-zA-Z0-9]*$", name):
+                ready.append(dict(name=name, status=errors.ERROR_STATUS,
+                                  message=errors.INVALID_NAME))
+                continue
+            records.append({'id': str(uuid.uuid4()) + "_" + name,
+                            'name': name,
+                            'status': response.WORKSPACE_REQUESTED,
+                            'username': current_user['username']})
+        db_con.db_insert_multiple(records)
+        # statuses of the new workspaces are written once all are done
+        writer = GroupCommitWriter(db_con, deferred=True)
+        tasks = [partial(init_workspace, writer, record['id'],
+                         record['name'], current_user['username'])
+                 for record in records]
+        return Response(stream_ndjson(ready, tasks, BULK_MAX_PARALLEL,
+                                      writer.flush),
+                        mimetype='application/x-ndjson')
+    except Exception as e:
+        current_app.logger.error(e)
+        return jsonify(status=errors.ERROR_STATUS, message=str(e))
+
+
+@api.route('/api/v1.0/users/<username>/workspaces/destroy/bulk',
+           methods=['POST'])
+@auth_required
+def linchpin_destroy_bulk(current_user, username) -> Response:
+    """
+        POST request route for destroying many workspaces at once, linchpin
+        destroy runs in parallel under the job scheduler and status
+        updates finishing together share db writes
+        RequestBody: {"workspaces": [{"id": "workspace_id",
+                                      "webhook_url": "..." --> optional},
+                                     ...]}
+        :return : streamed response with one JSON line per workspace with
+                  its id, status and code, in completion order
+    """
+    db_con = get_workspace_connection(current_user)
+    db_con_users = get_connection_users(USERS_DB_PATH)
+    try:
+        if not current_user['username'] == username \
+                and not current_user['admin']:
+            return jsonify(message=errors.UNAUTHORIZED_REQUEST)
+        items = bulk_items(request.json, 'workspaces', BULK_MAX_ITEMS)
+        identities = [item['id'] for item in items]
+        user = db_con_users.db_get_username(username)
+        if not user:
+            return jsonify(response.USER_NOT_FOUND)
+        creds_path = WORKSPACE_PATH + CREDS_PATH + user['creds_folder']
+    except ValueError as e:
+        return jsonify(status=errors.ERROR_STATUS, message=str(e))
+    except (KeyError, TypeError):
+        return jsonify(status=errors.ERROR_STATUS,
+                       message=errors.KEY_ERROR_BULK_DESTROY)
+    try:
+        known = {w['id']: w for w in db_con.db_search_identities(identities)}
+        writer = GroupCommitWriter(db_con)
+        ready, tasks = [], []
+        for data in items:
+            identity = data['id']
+            workspace = known.get(identity)
+            if workspace is not None:
+                archiver.restore(identity)
+            if workspace is None or not os.path.exists(
+                    WORKSPACE_PATH + "/" + identity) or \
+                    (not current_user['admin'] and
+                     workspace['username'] != current_user['username']):
+                ready.append(dict(id=identity, status=response.NOT_FOUND))
+                continue
+            cmd = create_cmd_workspace(data, identity, "destroy",
+                                       WORKSPACE_PATH, WORKSPACE_DIR,
+                                       creds_path)
+            if not isinstance(cmd, list):
+                ready.append(dict(id=identity,
+                                  status=response.PINFILE_NOT_FOUND))
+                continue
+            if data.get('webhook_url') is not None and \
+                    not valid_webhook_url(data['webhook_url']):
+                ready.append(dict(id=identity, status=errors.ERROR_STATUS,
+                                  message=errors.INVALID_WEBHOOK_URL))
+                continue
+            tasks.append(partial(destroy_bulk_item, writer, data, cmd,
+                                 current_user['username']))
+        return Response(stream_ndjson(ready, tasks, BULK_MAX_PARALLEL),
+                        mimetype='application/x-ndjson')
+    except Exception as e:
+        current_app.logger.error(e)
         return jsonify(status=errors.ERROR_STATUS, message=str(e))
 
 
-@app.route('/api/v1.0/workspaces/<identity>', methods=['PUT'])
+@api.route('/api/v1.0/workspaces/<identity>', methods=['PUT'])
 @auth_required
 def linchpin_update_pinfile(current_user, identity) -> Response:
     """
@@ -643,7 +1385,7 @@ def linchpin_update_pinfile(current_user, identity) -> Response:
                        pinfile_path:path_to_pinfile }
        return : response with successful pinfile updation status
     """
-    db_con = get_connection(DB_PATH)
+    db_con = get_workspace_connection(current_user)
     try:
         workspace = db_con.db_search_username(current_user['username'])
         if not current_user['admin'] and not workspace:
@@ -665,21 +1407,241 @@ def linchpin_update_pinfile(current_user, identity) -> Response:
         else:
             pinfile_name = "PinFile.json"
         json_pinfile_path = WORKSPACE_PATH + "/" + check_path + pinfile_name
+        archiver.restore(identity)
         if not check_workspace_has_pinfile(check_path, pinfile_name,
                                            WORKSPACE_PATH):
             return jsonify(status=response.PINFILE_NOT_FOUND)
-        with open(json_pinfile_path, 'w') as json_data:
-            json.dump(pinfile_content, json_data)
-        return jsonify(message=response.PINFILE_UPDATED)
+        problems = validate_pinfile(pinfile_content,
+                                    os.path.dirname(json_pinfile_path)) \
+            if PINFILE_VALIDATION else []
+        if problems:
+            return jsonify(status=errors.ERROR_STATUS,
+                           message=errors.INVALID_PINFILE,
+                           errors=problems)
+        result = workspace_ops.run(
+            identity, operation_key('update', identity, data),
+            lambda: write_pinfile(json_pinfile_path, pinfile_content))
+        return jsonify(**result)
     except (KeyError, ValueError, TypeError):
         return jsonify(status=errors.ERROR_STATUS,
                        message=errors.KEY_ERROR)
     except Exception as e:
-        app.logger.error(e)
+        current_app.logger.error(e)
+        return jsonify(status=errors.ERROR_STATUS, message=str(e))
+
+
+@api.route('/api/v1.0/workspaces/<identity>/clone', methods=['POST'])
+@auth_required
+@idempotent(idempotency_store)
+def linchpin_clone_workspace(current_user, identity) -> Response:
+    """
+        POST request route for creating a workspace from a copy of another
+        RequestBody: {"name": "workspacename",
+                      "include_state": false --> optional, copies the
+                      provisioning state too}
+        :return : response with cloned workspace name, id, source, status
+                  and the number of files cloned per method
+    """
+    db_con = get_workspace_connection(current_user)
+    try:
+        data = request.json  # Get request body
+        name = data['name']
+        include_state = bool(data.get('include_state', False))
+    except (KeyError, ValueError, TypeError, AttributeError):
+        return jsonify(status=errors.ERROR_STATUS,
+                       message=errors.KEY_ERROR_NAME)
+    try:
+        workspace = db_con.db_search_identities([identity])
+        if not workspace or (not current_user['admin'] and
+                             workspace[0]['username'] !=
+                             current_user['username']):
+            return jsonify(message=response.NOT_FOUND)
+        # Checking if workspace name contains any special characters
+        if not isinstance(name, str) or not re.match("^[a-zA-Z0-9]*$", name):
+            return jsonify(status=errors.ERROR_STATUS,
+                           message=errors.INVALID_NAME)
+        archiver.restore(identity)
+        source = os.path.join(WORKSPACE_PATH, identity)
+        if not os.path.isdir(source):
+            return jsonify(message=response.NOT_FOUND)
+    except Exception as e:
+        current_app.logger.error(e)
+        return jsonify(status=errors.ERROR_STATUS, message=str(e))
+    new_identity = str(uuid.uuid4()) + "_" + name
+    try:
+        db_con.db_insert(new_identity, name, response.WORKSPACE_REQUESTED,
+                         current_user['username'])
+        with tracer.span('workspace.clone', workspace=identity):
+            stats = workspace_ops.run(
+                identity, operation_key('clone', new_identity, data),
+                lambda: clone_tree(
+                    source, os.path.join(WORKSPACE_PATH, new_identity),
+                    exclude=() if include_state else CLONE_STATE_DIRS,
+                    private=CLONE_STATE_DIRS, hardlinks=CLONE_HARDLINKS))
+        db_con.db_update(new_identity, response.WORKSPACE_SUCCESS)
+        return jsonify(name=name, id=new_identity, source=identity,
+                       status=response.CREATE_SUCCESS, files=stats,
+                       mimetype='application/json')
+    except Exception as e:
+        db_con.db_update(new_identity, response.WORKSPACE_FAILED)
+        current_app.logger.error(e)
         return jsonify(status=errors.ERROR_STATUS, message=str(e))
 
 
-@app.route('/api/v1.0/workspaces/<identity>/linchpin_latest', methods=['POST'])
+@api.route('/api/v1.0/workspaces/<identity>/export', methods=['GET'])
+@auth_required
+def linchpin_export_workspace(current_user, identity) -> Response:
+    """
+        GET request route for downloading a workspace as a tar archive,
+        streamed while the workspace directory is read
+        route?compression=gzip (default) or none
+        :return : response streaming the archive
+    """
+    db_con = get_workspace_connection(current_user)
+    try:
+        compression = request.args.get('compression', 'gzip')
+        if compression not in ('gzip', 'none'):
+            return jsonify(status=errors.ERROR_STATUS,
+                           message=errors.INVALID_COMPRESSION)
+        workspace = db_con.db_search_identities([identity])
+        if not workspace or (not current_user['admin'] and
+                             workspace[0]['username'] !=
+                             current_user['username']):
+            return jsonify(message=response.NOT_FOUND)
+        # archived workspaces are sent as they are, without unpacking
+        archive = archiver.open_archive(identity) \
+            if compression == 'gzip' else None
+        if archive is not None:
+            chunks = file_stream(archive)
+        else:
+            archiver.restore(identity)
+            directory = os.path.join(WORKSPACE_PATH, identity)
+            if not os.path.isdir(directory):
+                return jsonify(message=response.NOT_FOUND)
+            chunks = export_workspace(
+                directory, identity,
+                EXPORT_COMPRESS_LEVEL if compression == 'gzip' else None)
+        suffix = '.tar.gz' if compression == 'gzip' else '.tar'
+        return Response(
+            chunks, mimetype='application/gzip' if compression == 'gzip'
+            else 'application/x-tar',
+            headers={'Content-Disposition': 'attachment; filename="%s%s"' %
+                     (identity, suffix)})
+    except Exception as e:
+        current_app.logger.error(e)
+        return jsonify(status=errors.ERROR_STATUS, message=str(e))
+
+
+@api.route('/api/v1.0/workspaces/<identity>/files/<path:path>',
+           methods=['GET'])
+@auth_required
+def linchpin_workspace_file(current_user, identity, path) -> Response:
+    """
+        GET request route for downloading a file of a workspace as it is,
+        such as resources/linchpin.latest or an inventory. Supports Range,
+        If-Range and the If-Match, If-None-Match, If-Modified-Since and
+        If-Unmodified-Since conditions.
+        :return : response with the file contents
+    """
+    db_con = get_workspace_connection(current_user)
+    try:
+        workspace = db_con.db_search_identities([identity])
+        if not workspace or (not current_user['admin'] and
+                             workspace[0]['username'] !=
+                             current_user['username']):
+            return jsonify(message=response.NOT_FOUND)
+        archiver.restore(identity)
+        file_path = workspace_file(os.path.join(WORKSPACE_PATH, identity),
+                                   path)
+        if file_path is None:
+            return jsonify(message=response.NOT_FOUND)
+        return file_response(file_path, request, FILES_OFFLOAD,
+                             os.path.realpath(WORKSPACE_PATH),
+                             FILES_OFFLOAD_PREFIX, FILES_MAX_AGE)
+    except Exception as e:
+        current_app.logger.error(e)
+        return jsonify(status=errors.ERROR_STATUS, message=str(e))
+
+
+@api.route('/api/v1.0/workspaces/import', methods=['POST'])
+@auth_required
+def linchpin_import_workspace(current_user) -> Response:
+    """
+        POST request route for creating a workspace from a tar archive,
+        extracted while it is uploaded
+        route?name=workspacename
+        RequestBody: tar archive, optionally gzipped, of a workspace
+                     directory as returned by the export route
+        :return : response with imported workspace name, id, status and
+                  the number of files, directories, links and bytes
+                  extracted
+    """
+    db_con = get_workspace_connection(current_user)
+    name = request.args.get('name')
+    if not name:
+        return jsonify(status=errors.ERROR_STATUS,
+                       message=errors.KEY_ERROR_NAME)
+    # Checking if workspace name contains any special characters
+    if not re.match("^[a-zA-Z0-9]*$", name):
+        return jsonify(status=errors.ERROR_STATUS,
+                       message=errors.INVALID_NAME)
+    identity = str(uuid.uuid4()) + "_" + name
+    try:
+        db_con.db_insert(identity, name, response.WORKSPACE_REQUESTED,
+                         current_user['username'])
+        with tracer.span('workspace.import', workspace=identity):
+            stats = extract_stream(request.stream,
+                                   os.path.join(WORKSPACE_PATH, identity),
+                                   IMPORT_MAX_SIZE, IMPORT_MAX_FILES)
+        db_con.db_update(identity, response.WORKSPACE_SUCCESS)
+        return jsonify(name=name, id=identity,
+                       status=response.CREATE_SUCCESS, files=stats,
+                       mimetype='application/json')
+    except ArchiveError as e:
+        db_con.db_update(identity, response.WORKSPACE_FAILED)
+        return jsonify(status=errors.ERROR_STATUS,
+                       message=errors.INVALID_ARCHIVE, errors=[str(e)])
+    except Exception as e:
+        db_con.db_update(identity, response.WORKSPACE_FAILED)
+        current_app.logger.error(e)
+        return jsonify(status=errors.ERROR_STATUS, message=str(e))
+
+
+@api.route('/api/v1.0/workspaces/<identity>/expiry', methods=['PUT'])
+@auth_required
+def linchpin_update_expiry(current_user, identity) -> Response:
+    """
+        PUT request route for setting, moving or clearing the time a
+        provisioned workspace is destroyed at
+        RequestBody: {"ttl": seconds} or
+                     {"expires_at": timestamp or ISO 8601 date},
+                     {} clears the expiry
+        return : response with workspace id and expires_at timestamp
+    """
+    db_con = get_workspace_connection(current_user)
+    try:
+        workspace = db_con.db_search_identities([identity])
+        if not workspace or (not current_user['admin'] and
+                             workspace[0]['username'] !=
+                             current_user['username']):
+            return jsonify(message=response.NOT_FOUND)
+        try:
+            expires_at = parse_expiry(request.get_json(silent=True) or {},
+                                      max_ttl=MAX_TTL)
+        except (ValueError, TypeError, AttributeError, OverflowError):
+            return jsonify(status=errors.ERROR_STATUS,
+                           message=errors.INVALID_EXPIRY)
+        db_con.db_update_expiry(identity, expires_at,
+                                workspace[0].get('destroy_request'))
+        expiry_scheduler.schedule(identity, expires_at)
+        return jsonify(id=identity, expires_at=expires_at,
+                       status=response.STATUS_OK)
+    except Exception as e:
+        current_app.logger.error(e)
+        return jsonify(status=errors.ERROR_STATUS, message=str(e))
+
+
+@api.route('/api/v1.0/workspaces/<identity>/linchpin_latest', methods=['POST'])
 @auth_required
 def get_linchpin_latest(current_user, identity) -> Response:
     """
@@ -688,7 +1650,7 @@ def get_linchpin_latest(current_user, identity) -> Response:
         RequestBody: { linchpin_latest_path:path_to_linchpin.latest }
         return : response with workspace id and linchpin.latest file contents
     """
-    db_con = get_connection(DB_PATH)
+    db_con = get_workspace_connection(current_user)
     try:
         workspace = db_con.db_search_username(current_user['username'])
         if not current_user['admin'] and not workspace:
@@ -704,24 +1666,26 @@ def get_linchpin_latest(current_user, identity) -> Response:
             check_path = linchpin_latest_path
         else:
             check_path = "/"
+        archiver.restore(identity)
         linchpin_latest_directory = WORKSPACE_PATH + "/" + identity + check_path
         if not os.listdir(linchpin_latest_directory).\
                 __contains__(LINCHPIN_LATEST_NAME):
             return jsonify(message=response.LINCHPIN_LATEST_NOT_FOUND)
         linchpin_latest_path = linchpin_latest_directory + LINCHPIN_LATEST_NAME
-        with open(linchpin_latest_path, 'r') as file:
-            linchpin_latest = json.load(file)
+        with tracer.span('file.read', path=linchpin_latest_path):
+            with open(linchpin_latest_path, 'r') as file:
+                linchpin_latest = json.load(file)
         return jsonify(id=identity,
                        latest=linchpin_latest)
     except (KeyError, ValueError, TypeError):
         return jsonify(status=errors.ERROR_STATUS,
                        message=errors.KEY_ERROR)
     except Exception as e:
-        app.logger.error(e)
+        current_app.logger.error(e)
         return jsonify(status=errors.ERROR_STATUS, message=str(e))
 
 
-@app.route('/api/v1.0/workspaces/<identity>/inventory', methods=['POST'])
+@api.route('/api/v1.0/workspaces/<identity>/inventory', methods=['POST'])
 @auth_required
 def get_linchpin_inventory(current_user, identity) -> Response:
     """
@@ -730,7 +1694,7 @@ def get_linchpin_inventory(current_user, identity) -> Response:
         RequestBody: { linchpin_inventory_path:path_to_inventories_folder }
         return : response with workspace id and all inventory files contents
     """
-    db_con = get_connection(DB_PATH)
+    db_con = get_workspace_connection(current_user)
     try:
         workspace = db_con.db_search_username(current_user['username'])
         if not current_user['admin'] and not workspace:
@@ -748,11 +1712,13 @@ def get_linchpin_inventory(current_user, identity) -> Response:
             check_path = linchpin_inventory_path + "*"
         else:
             check_path = "/*"
-        directory_path = glob.glob(WORKSPACE_PATH + "/" + identity +
-                                   check_path)
+        archiver.restore(identity)
+        directory_path = inventory_files(WORKSPACE_PATH + "/" + identity +
+                                         check_path)
         for i in range(0, len(directory_path), 1):
-            with open(directory_path[i], 'r') as data:
-                inventory = data.read().replace('\n', ' ')
+            with tracer.span('file.read', path=directory_path[i]):
+                with open(directory_path[i], 'r') as data:
+                    inventory = data.read().replace('\n', ' ')
             inventory_list.append(inventory)
         return jsonify(id=identity,
                        inventory=inventory_list)
@@ -760,11 +1726,11 @@ def get_linchpin_inventory(current_user, identity) -> Response:
         return jsonify(status=errors.ERROR_STATUS,
                        message=errors.KEY_ERROR)
     except Exception as e:
-        app.logger.error(e)
+        current_app.logger.error(e)
         return jsonify(status=errors.ERROR_STATUS, message=str(e))
 
 
-@app.route('/api/v1.0/users/<username>/credentials', methods=['POST'])
+@api.route('/api/v1.0/users/<username>/credentials', methods=['POST'])
 @auth_required
 def upload_credentials(current_user, username) -> Response:
     """
@@ -776,7 +1742,7 @@ def upload_credentials(current_user, username) -> Response:
                     }
         return : response with successful credential upload status
     """
-    db_con = get_connection_users(DB_PATH)
+    db_con = get_connection_users(USERS_DB_PATH)
     try:
         user = db_con.db_search_name(username)
         if not current_user['username'] == username \
@@ -807,7 +1773,7 @@ def upload_credentials(current_user, username) -> Response:
                 yaml_file.write(file_read)
         else:
             vault_pass = request.form['vault_pass']
-            vault = Vault(vault_pass)
+            vault = get_vault(vault_pass)
             vault.dump(file_read, open(WORKSPACE_PATH + CREDS_PATH +
                                        creds_folder + "/" + file_name +
                                        ".yml", 'wb'))
@@ -816,11 +1782,11 @@ def upload_credentials(current_user, username) -> Response:
         return jsonify(status=errors.ERROR_STATUS,
                        message=errors.KEY_ERROR)
     except Exception as e:
-        app.logger.error(e)
+        current_app.logger.error(e)
         return jsonify(status=errors.ERROR_STATUS, message=str(e))
 
 
-@app.route('/api/v1.0/users/<username>/credentials/<file_name>',
+@api.route('/api/v1.0/users/<username>/credentials/<file_name>',
            methods=['GET'])
 @auth_required
 def get_credentials(current_user, file_name, username) -> Response:
@@ -828,7 +1794,7 @@ def get_credentials(current_user, file_name, username) -> Response:
         GET request to retrieve credentials from a credential file
         return : response with encrypted credentials from file
     """
-    db_con = get_connection_users(DB_PATH)
+    db_con = get_connection_users(USERS_DB_PATH)
     try:
         user = db_con.db_search_name(username)
         if not current_user['username'] == username \
@@ -845,11 +1811,11 @@ def get_credentials(current_user, file_name, username) -> Response:
         return jsonify(status=errors.ERROR_STATUS,
                        message=errors.KEY_ERROR)
     except Exception as e:
-        app.logger.error(e)
+        current_app.logger.error(e)
         return jsonify(status=errors.ERROR_STATUS, message=str(e))
 
 
-@app.route('/api/v1.0/users/<username>/credentials/<file_name>',
+@api.route('/api/v1.0/users/<username>/credentials/<file_name>',
            methods=['PUT'])
 @auth_required
 def update_credentials(current_user, username, file_name) -> Response:
@@ -861,7 +1827,7 @@ def update_credentials(current_user, username, file_name) -> Response:
                         }
         return : response with successful credential update status
      """
-    db_con = get_connection_users(DB_PATH)
+    db_con = get_connection_users(USERS_DB_PATH)
     try:
         user = db_con.db_search_name(username)
         if not current_user['username'] == username \
@@ -888,16 +1854,16 @@ def update_credentials(current_user, username, file_name) -> Response:
                 yaml_file.write(file_read)
         else:
             vault_pass = request.form['vault_pass']
-            vault = Vault(vault_pass)
+            vault = get_vault(vault_pass)
             vault.dump(file_read, open(WORKSPACE_PATH + CREDS_PATH +
                                        creds_folder + "/" + file_name, 'wb'))
         return jsonify(message=response.CREDENTIALS_UPDATED)
     except Exception as e:
-        app.logger.error(e)
+        current_app.logger.error(e)
         return jsonify(status=errors.ERROR_STATUS, message=str(e))
 
 
-@app.route('/api/v1.0/users/<username>/credentials/<file_name>',
+@api.route('/api/v1.0/users/<username>/credentials/<file_name>',
            methods=['DELETE'])
 @auth_required
 def delete_credentials(current_user, username, file_name) -> Response:
@@ -905,7 +1871,7 @@ def delete_credentials(current_user, username, file_name) -> Response:
         DELETE request to delete a credential file
         return : response with successful delete status
     """
-    db_con = get_connection_users(DB_PATH)
+    db_con = get_connection_users(USERS_DB_PATH)
     try:
         user = db_con.db_search_name(username)
         if not current_user['username'] == username \
@@ -924,16 +1890,301 @@ def delete_credentials(current_user, username, file_name) -> Response:
                                mimetype='application/json')
         return jsonify(status=response.CREDENTIALS_FILE_NOT_FOUND)
     except Exception as e:
-        app.logger.error(e)
+        current_app.logger.error(e)
+        return jsonify(status=errors.ERROR_STATUS, message=str(e))
+
+
+@api.route('/api/v1.0/users/<username>/webhook', methods=['PUT'])
+@auth_required
+def register_webhook(current_user, username) -> Response:
+    """
+        PUT request route for registering the webhook called when up,
+        destroy and fetch jobs of a user complete. A new secret signing
+        the deliveries is generated on every registration, it also signs
+        deliveries to webhook_url given with a request
+        RequestBody: {"url": "https://receiver/path" --> optional}
+        :return : response with the webhook url and signing secret
+    """
+    db_con = get_connection_users(USERS_DB_PATH)
+    try:
+        if not current_user['username'] == username \
+                and not current_user['admin']:
+            return jsonify(message=errors.UNAUTHORIZED_REQUEST)
+        if not db_con.db_get_username(username):
+            return jsonify(response.USER_NOT_FOUND)
+        url = (request.get_json(silent=True) or {}).get('url')
+        if url is not None and not valid_webhook_url(url):
+            return jsonify(status=errors.ERROR_STATUS,
+                           message=errors.INVALID_WEBHOOK_URL)
+        secret = secrets.token_hex(32)
+        db_con.db_update_webhook(username, url, secret)
+        return jsonify(url=url, secret=secret, status=response.STATUS_OK)
+    except (KeyError, ValueError, TypeError, AttributeError):
+        return jsonify(status=errors.ERROR_STATUS,
+                       message=errors.KEY_ERROR)
+    except Exception as e:
+        current_app.logger.error(e)
+        return jsonify(status=errors.ERROR_STATUS, message=str(e))
+
+
+@api.route('/api/v1.0/users/<username>/webhook', methods=['DELETE'])
+@auth_required
+def delete_webhook(current_user, username) -> Response:
+    """
+        DELETE request route for removing the webhook and signing secret
+        of a user
+        :return : response with success message
+    """
+    db_con = get_connection_users(USERS_DB_PATH)
+    try:
+        if not current_user['username'] == username \
+                and not current_user['admin']:
+            return jsonify(message=errors.UNAUTHORIZED_REQUEST)
+        if not db_con.db_get_username(username):
+            return jsonify(response.USER_NOT_FOUND)
+        db_con.db_update_webhook(username, None, None)
+        return jsonify(message=response.WEBHOOK_REMOVED)
+    except Exception as e:
+        current_app.logger.error(e)
+        return jsonify(status=errors.ERROR_STATUS, message=str(e))
+
+
+@api.route('/api/v1.0/webhooks/dead_letters', methods=['GET'])
+@auth_required
+def list_dead_letters(current_user) -> Response:
+    """
+        GET request route for listing webhook deliveries that failed every
+        attempt, admin users see the deliveries of every user
+        :return : response with a list of deliveries with id, url,
+                  events, attempts and last error, oldest first
+    """
+    try:
+        username = None if current_user['admin'] \
+            else current_user['username']
+        return serialize_list(webhooks.dead_letters.list(username),
+                              response.STATUS_OK)
+    except Exception as e:
+        current_app.logger.error(e)
+        return jsonify(status=errors.ERROR_STATUS, message=str(e))
+
+
+@api.route('/api/v1.0/webhooks/dead_letters/<delivery_id>/retry',
+           methods=['POST'])
+@auth_required
+def retry_dead_letter(current_user, delivery_id) -> Response:
+    """
+        POST request route for delivering a failed webhook delivery again
+        :return : response with the delivery id and status
+    """
+    try:
+        delivery = webhooks.dead_letters.get(delivery_id)
+        if delivery is None:
+            return jsonify(status=errors.ERROR_STATUS,
+                           message=response.DELIVERY_NOT_FOUND)
+        if not current_user['admin'] \
+                and delivery['username'] != current_user['username']:
+            return jsonify(message=errors.UNAUTHORIZED_REQUEST)
+        webhooks.redeliver(delivery)
+        return jsonify(id=delivery_id, status=response.DELIVERY_REQUEUED)
+    except Exception as e:
+        current_app.logger.error(e)
         return jsonify(status=errors.ERROR_STATUS, message=str(e))
 
 
-if __name__ == "__main__":
-    create_admin_user(DB_PATH, ADMIN_USERNAME,
+@api.route('/api/v1.0/admin/traces', methods=['GET'])
+@auth_required
+def get_traces(current_user) -> Response:
+    """
+        GET request route for listing recently finished tracing spans
+        of the worker process answering the request, every worker keeps
+        its own ring buffer. Request args are accepted as
+        /api/v1.0/admin/traces?trace_id=value&limit=value
+        :return : response with a list of spans, oldest first
+    """
+    try:
+        if not current_user['admin']:
+            return jsonify(message=errors.UNAUTHORIZED_REQUEST)
+        if tracer.ring_buffer is None:
+            return jsonify(message=response.TRACING_DISABLED)
+        limit = request.args.get('limit', type=int)
+        spans = tracer.ring_buffer.spans(request.args.get('trace_id'),
+                                         limit)
+        return serialize_list(spans, response.STATUS_OK)
+    except Exception as e:
+        current_app.logger.error(e)
+        return jsonify(status=errors.ERROR_STATUS, message=str(e))
+
+
+@api.route('/api/v1.0/search/hosts', methods=['GET'])
+@auth_required
+def search_hosts(current_user) -> Response:
+    """
+        GET request route for finding the workspaces that provisioned a
+        host, searching host names, IPs, resource names and providers from
+        linchpin.latest and inventory files by prefix. Users only search
+        their own workspaces, admin users search every workspace
+        Request args are accepted as
+        /api/v1.0/search/hosts?q=value&limit=value
+        :return : response with a list of matches with value, kind,
+                  workspace id and username
+    """
+    query = request.args.get('q', '').strip()
+    if not query:
+        return jsonify(status=errors.ERROR_STATUS,
+                       message=errors.MISSING_SEARCH_QUERY)
+    try:
+        limit = min(max(request.args.get('limit', 100, type=int), 1),
+                    SEARCH_MAX_RESULTS)
+        username = None if current_user['admin'] \
+            else current_user['username']
+        with tracer.span('host_index.search'):
+            matches = host_index.search(query, username, limit)
+        return serialize_list(matches, response.STATUS_OK)
+    except Exception as e:
+        current_app.logger.error(e)
+        return jsonify(status=errors.ERROR_STATUS, message=str(e))
+
+
+@api.route('/api/v1.0/batch', methods=['POST'])
+@auth_required
+def batch(current_user) -> Response:
+    """
+        POST request route for running many API calls in one request,
+        sub-requests are dispatched through the API routes as the user
+        of the batch request. Consecutive GET sub-requests run
+        concurrently, other sub-requests run one at a time in order.
+        RequestBody: {"requests": [{"method": "GET",
+                                    "path": "/api/v1.0/workspaces/name",
+                                    "body": {...}}, ...]}
+        :return : response with a list of sub-responses with status,
+                  headers and body, in request order
+    """
+    try:
+        sub_requests = request.json['requests']
+        if not isinstance(sub_requests, list):
+            raise TypeError
+        if len(sub_requests) > BATCH_MAX_REQUESTS:
+            return jsonify(status=errors.ERROR_STATUS,
+                           message=errors.BATCH_TOO_LARGE %
+                           BATCH_MAX_REQUESTS)
+    except (KeyError, ValueError, TypeError):
+        return jsonify(status=errors.ERROR_STATUS,
+                       message=errors.KEY_ERROR_BATCH)
+    try:
+        environ = {BATCH_USER_KEY: (request.headers['api_key'],
+                                    current_user)}
+        results = dispatch_batch(current_app._get_current_object(),
+                                 sub_requests, environ, request.path,
+                                 BATCH_MAX_PARALLEL)
+        return serialize_list(results, response.STATUS_OK)
+    except Exception as e:
+        current_app.logger.error(e)
+        return jsonify(status=errors.ERROR_STATUS, message=str(e))
+
+
+@api.route('/api/v1.0/jobs', methods=['GET'])
+@auth_required
+def list_jobs(current_user) -> Response:
+    """
+        GET request route for listing running linchpin jobs, admin users
+        see the jobs of every user
+        :return : response with a list of jobs, oldest first
+    """
+    try:
+        username = None if current_user['admin'] \
+            else current_user['username']
+        jobs = linchpin_runner.jobs.list(username)
+        return serialize_list(jobs, response.STATUS_OK)
+    except Exception as e:
+        current_app.logger.error(e)
+        return jsonify(status=errors.ERROR_STATUS, message=str(e))
+
+
+@api.route('/api/v1.0/jobs/<job_id>', methods=['GET'])
+@auth_required
+def get_job(current_user, job_id) -> Response:
+    """
+        GET request route for a running or queued linchpin job
+        :return : response with the job, queued jobs carry their 1 based
+                  position in the queue of their worker process
+    """
+    try:
+        job = linchpin_runner.jobs.get(job_id)
+        if job is None:
+            return jsonify(status=errors.ERROR_STATUS,
+                           message=response.JOB_NOT_FOUND)
+        if not current_user['admin'] \
+                and job['username'] != current_user['username']:
+            return jsonify(message=errors.UNAUTHORIZED_REQUEST)
+        job['position'] = linchpin_runner.jobs.position(job)
+        return jsonify(**job)
+    except Exception as e:
+        current_app.logger.error(e)
+        return jsonify(status=errors.ERROR_STATUS, message=str(e))
+
+
+@api.route('/api/v1.0/jobs/<job_id>', methods=['DELETE'])
+@auth_required
+def cancel_job(current_user, job_id) -> Response:
+    """
+        DELETE request route for cancelling a running linchpin job, the
+        whole process group of the job is terminated
+        :return : response with the cancelled job id and status
+    """
+    try:
+        job = linchpin_runner.jobs.get(job_id)
+        if job is None:
+            return jsonify(status=errors.ERROR_STATUS,
+                           message=response.JOB_NOT_FOUND)
+        if not current_user['admin'] \
+                and job['username'] != current_user['username']:
+            return jsonify(message=errors.UNAUTHORIZED_REQUEST)
+        linchpin_runner.jobs.cancel(job_id)
+        return jsonify(id=job_id, status=response.JOB_CANCELLED,
+                       mimetype='application/json')
+    except Exception as e:
+        current_app.logger.error(e)
+        return jsonify(status=errors.ERROR_STATUS, message=str(e))
+
+
+def start_background_services() -> None:
+    """
+        Starts the threads of the archiver and of the expiry scheduler in
+        the current process. Called by every server worker process after
+        it is forked, never in the master, since their threads hold locks
+        forked children inherit and the master reaps the children of the
+        destroys run on expiry
+    """
+    if ARCHIVE_ENABLED:
+        archiver.start(archivable_workspaces, ARCHIVE_INTERVAL,
+                       workspace_archivable)
+    expiry_scheduler.start(workspace_expiries)
+
+
+def create_app(background=True) -> Flask:
+    """
+        Application factory assembling the flask app, called once per
+        process or once in the master process when workers are preloaded
+        :param background: boolean starting the background services in
+                           this process, servers forking workers leave it
+                           to the workers
+        :return : flask application serving the API
+    """
+    app = Flask(__name__)
+    app.register_blueprint(api)
+    # Swagger UI and its dependencies are loaded on the first docs request
+    app.wsgi_app = LazySwaggerUI(app.wsgi_app, SWAGGER_URL, API_URL,
+                                 SWAGGER_UI_CONFIG)
+    if COMPRESSION_ENABLED:
+        app.wsgi_app = CompressionMiddleware(app.wsgi_app,
+                                             COMPRESSION_MIN_SIZE,
+                                             COMPRESSION_LEVELS,
+                                             COMPRESSION_ENCODINGS)
+    setup_logging(app, LOGGER_FILE, ACCESS_LOGGER_FILE, LOGGER_MAX_BYTES,
+                  LOGGER_BACKUP_COUNT)
+    setup_tracing(app, TRACING_ENABLED, TRACING_RING_SIZE, TRACING_FILE)
+    create_admin_user(USERS_DB_PATH, ADMIN_USERNAME,
                       ADMIN_PASSWORD, ADMIN_EMAIL)
-    handler = RotatingFileHandler(LOGGER_FILE,
-                                  maxBytes=10000, backupCount=1)
-    handler.setLevel(logging.INFO)
-    app.logger.addHandler(handler)
-    app.register_blueprint(swaggerui_blueprint, url_prefix=SWAGGER_URL)
-    app.run(host='0.0.0.0', debug=True)
+    if background:
+        start_background_services()
+    return app
@@ -0,0 +1,73 @@
+from __future__ import absolute_import
+import argparse
+import sys
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        prog='restylinchpin',
+        description="REST application for Linchpin project")
+    commands = parser.add_subparsers(dest='command')
+    serve = commands.add_parser(
+        'serve', help="run the API with the production server, defaults "
+                      "are read from the server section of config.yml")
+    serve.add_argument('-b', '--bind', help="address to listen on, "
+                                            "host:port")
+    serve.add_argument('-w', '--workers', type=int,
+                       help="number of worker processes")
+    serve.add_argument('-t', '--threads', type=int,
+                       help="number of threads per worker")
+    serve.add_argument('-k', '--worker-class', dest='worker_class',
+                       help="gunicorn worker class, sync or gthread")
+    serve.add_argument('--keepalive', type=int,
+                       help="seconds to keep idle connections open")
+    serve.add_argument('--timeout', type=int,
+                       help="seconds before a silent worker is restarted")
+    serve.add_argument('--graceful-timeout', dest='graceful_timeout',
+                       type=int, help="seconds workers get to finish "
+                                      "requests on restart")
+    serve.add_argument('--max-requests', dest='max_requests', type=int,
+                       help="restart workers after this many requests")
+    serve.add_argument('--no-preload', dest='preload',
+                       action='store_false', default=None,
+                       help="run create_app in every worker instead of "
+                            "once before forking")
+    commands.add_parser(
+        'reindex-hosts', help="rebuild the host search index from the "
+                              "provisioned workspaces")
+    commands.add_parser(
+        'archive-workspaces', help="archive the idle workspaces now "
+                                   "instead of waiting for the archiver")
+    return parser
+
+
+def main(argv=None) -> int:
+    """
+        Entry point of the restylinchpin command
+    """
+    args = build_parser().parse_args(argv)
+    if args.command == 'reindex-hosts':
+        from app import reindex_hosts
+        print("indexed %d workspaces" % reindex_hosts())
+        return 0
+    if args.command == 'archive-workspaces':
+        from app import archive_idle_workspaces
+        archived = archive_idle_workspaces()
+        if archived is None:
+            print("another process is archiving workspaces")
+            return 1
+        print("archived %d workspaces" % archived)
+        return 0
+    if args.command != 'serve':
+        build_parser().print_help()
+        return 1
+    from app import SERVER_CONFIG
+    from app.server import serve, server_options
+    overrides = vars(args)
+    overrides.pop('command')
+    serve(server_options(SERVER_CONFIG, overrides))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -11,6 +11,10 @@ class BaseDB(ABC):
     def db_insert_no_name(self, identity, status, username):
         return
 
+    @abstractmethod
+    def db_insert_multiple(self, workspaces):
+        return
+
     @abstractmethod
     def db_search(self, name, admin, username):
         return
@@ -19,6 +23,18 @@ class BaseDB(ABC):
     def db_update(self, identity, status):
         pass
 
+    @abstractmethod
+    def db_update_multiple(self, statuses):
+        pass
+
+    @abstractmethod
+    def db_update_provisioned(self, identity, status, provision_hash):
+        pass
+
+    @abstractmethod
+    def db_update_expiry(self, identity, expires_at, destroy_request):
+        pass
+
     @abstractmethod
     def db_remove(self, identity, admin, username):
         pass
@@ -34,3 +50,7 @@ class BaseDB(ABC):
     @abstractmethod
     def db_search_identity(self, identity):
         pass
+
+    @abstractmethod
+    def db_search_identities(self, identities):
+        pass
@@ -0,0 +1,117 @@
+from __future__ import absolute_import
+import os
+from urllib.parse import quote
+from app.data_access_layer.BaseDB import BaseDB
+from app.data_access_layer.RestDB import RestDB
+from typing import List
+from typing import Dict
+
+
+class PartitionedRestDB(BaseDB):
+    """
+        Workspace store split into one TinyDB file per owner under a
+        directory. Operations of a non-admin owner only load and rewrite
+        that owner's partition, admin operations span all partitions.
+    """
+
+    def __init__(self, path, owner=None, changes=None):
+        """
+            :param path: directory holding the partition files
+            :param owner: username the connection is scoped to, None for
+                          admin connections that may touch any partition
+            :param changes: ChangeFeed shared by the partitions, None to
+                            not record changes
+        """
+        self.path = path
+        self.owner = owner
+        self.changes = changes
+        if not os.path.isdir(path):
+            os.makedirs(path, exist_ok=True)
+
+    def _partition(self, username) -> RestDB:
+        file_name = quote(str(username), safe='') + '.json'
+        return RestDB(os.path.join(self.path, file_name), self.changes)
+
+    def _partitions(self) -> List[RestDB]:
+        if self.owner is not None:
+            return [self._partition(self.owner)]
+        return [RestDB(os.path.join(self.path, f), self.changes)
+                for f in sorted(os.listdir(self.path))
+                if f.endswith('.json')]
+
+    def _find(self, identity) -> RestDB:
+        for partition in self._partitions():
+            if partition.db_search_identities([identity]):
+                return partition
+        raise IndexError(identity)
+
+    def db_insert(self, identity, name, status, username) -> None:
+        self._partition(username).db_insert(identity, name, status, username)
+
+    def db_insert_no_name(self, identity, status, username) -> None:
+        self._partition(username).db_insert_no_name(identity, status,
+                                                    username)
+
+    def db_insert_multiple(self, workspaces) -> None:
+        by_owner = {}
+        for workspace in workspaces:
+            by_owner.setdefault(workspace['username'], []).append(workspace)
+        for username, owned in by_owner.items():
+            self._partition(username).db_insert_multiple(owned)
+
+    def db_remove(self, identity, admin, username) -> None:
+        if admin:
+            self._find(identity).db_remove(identity, admin, username)
+        else:
+            self._partition(username).db_remove(identity, admin, username)
+
+    def db_update(self, identity, status) -> None:
+        self._find(identity).db_update(identity, status)
+
+    def db_update_multiple(self, statuses) -> None:
+        remaining = dict(statuses)
+        for partition in self._partitions():
+            if not remaining:
+                break
+            found = {w['id'] for w in
+                     partition.db_search_identities(list(remaining))}
+            if found:
+                partition.db_update_multiple(
+                    {identity: remaining.pop(identity) for identity in found})
+
+    def db_update_provisioned(self, identity, status, provision_hash) -> None:
+        self._find(identity).db_update_provisioned(identity, status,
+                                                   provision_hash)
+
+    def db_update_expiry(self, identity, expires_at, destroy_request) -> None:
+        self._find(identity).db_update_expiry(identity, expires_at,
+                                              destroy_request)
+
+    def db_search(self, name, admin, username) -> List[Dict]:
+        if not admin:
+            return self._partition(username).db_search(name, admin,
+                                                       username)
+        result = []
+        for partition in self._partitions():
+            result.extend(partition.db_search(name, admin, username))
+        return result
+
+    def db_search_username(self, username) -> List[Dict]:
+        return self._partition(username).db_search_username(username)
+
+    def db_search_identity(self, identity) -> Dict:
+        return self._find(identity).db_search_identity(identity)
+
+    def db_search_identities(self, identities) -> List[Dict]:
+        result = []
+        for partition in self._partitions():
+            result.extend(partition.db_search_identities(identities))
+        return result
+
+    def db_list_all(self, username, admin) -> List[Dict]:
+        if not admin:
+            return self._partition(username).db_list_all(username, admin)
+        result = []
+        for partition in self._partitions():
+            result.extend(partition.db_list_all(username, admin))
+        return result
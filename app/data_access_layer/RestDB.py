@@ -1,16 +1,38 @@
 from __future__ import absolute_import
 from tinydb import TinyDB, Query
+from app.data_access_layer.changes import changed_records, record_changes
+from app.data_access_layer.locking import get_store_lock, read_locked, \
+    write_locked
+from app.data_access_layer.storage import AtomicJSONStorage
+from app.tracing import trace_methods
 from app.data_access_layer.BaseDB import BaseDB
 from typing import List
 from typing import Dict
 
 
+@trace_methods
 class RestDB(BaseDB):
 
-    def __init__(self, path):
-        self.db = TinyDB(path)
+    def __init__(self, path, changes=None):
+        """
+            :param path: path of the TinyDB file
+            :param changes: ChangeFeed recording every write, None to not
+                            record changes
+        """
+        self.changes = changes
+        self.lock = get_store_lock(path)
+        self.db = TinyDB(path, storage=AtomicJSONStorage)
         self.table = self.db.table('Workspaces')
 
+    def _refresh(self) -> None:
+        """
+            Drops the table caches so an operation running under the store
+            lock sees writes made by other connections or processes
+        """
+        self.table.clear_cache()
+        self.table._next_id = None
+
+    @write_locked
     def db_insert(self, identity, name, status, username) -> None:
         """
             Inserts a workspace with id, name, status and username of user
@@ -20,9 +42,12 @@ class RestDB(BaseDB):
             :param status: field specifying workspace creation inserted in db
             :param username: username of the user creating the workspace
         """
-        self.table.insert({'id': str(identity), 'name': name,
-                           'status': status, 'username': username})
+        record = {'id': str(identity), 'name': name,
+                  'status': status, 'username': username}
+        self.table.insert(record)
+        record_changes(self.changes, [record])
 
+    @write_locked
     def db_insert_no_name(self, identity, status, username) -> None:
         """
             Inserts a workspace with id, status and username of user
@@ -31,9 +56,25 @@ class RestDB(BaseDB):
             :param status: field specifying workspace creation inserted in db
             :param username: username of the user creating the workspace
         """
-        self.table.insert({'id': str(identity), 'status': status,
-                           'username': username})
+        record = {'id': str(identity), 'status': status,
+                  'username': username}
+        self.table.insert(record)
+        record_changes(self.changes, [record])
+
+    @write_locked
+    def db_insert_multiple(self, workspaces) -> None:
+        """
+            Inserts many workspace records in a single db write
+            :param workspaces: list of dicts with the id, name, status and
+                               username of each workspace
+        """
+        records = [{'id': str(w['id']), 'name': w['name'],
+                    'status': w['status'], 'username': w['username']}
+                   for w in workspaces]
+        self.table.insert_multiple(records)
+        record_changes(self.changes, records)
 
+    @write_locked
     def db_remove(self, identity, admin, username) -> None:
         """
             Removes a workspace record from db
@@ -43,13 +84,17 @@ class RestDB(BaseDB):
         """
         workspace = Query()
         if admin:
-            self.db.remove(workspace.id == identity)
+            removed = self.table.search(workspace.id == identity)
+            self.table.remove(workspace.id == identity)
         else:
-            el = self.db.get((workspace.id == identity) &
-                             (workspace.username == username))
+            el = self.table.get((workspace.id == identity) &
+                                (workspace.username == username))
             doc_id = el.doc_id
-            self.db.remove(doc_ids=[doc_id])
+            removed = [el]
+            self.table.remove(doc_ids=[doc_id])
+        record_changes(self.changes, removed, deleted=True)
 
+    @write_locked
     def db_update(self, identity, status) -> None:
         """
             Updates the workspace record status in db
@@ -57,8 +102,55 @@ class RestDB(BaseDB):
             :param status: field specifying workspace creation inserted in db
         """
         workspace = Query()
-        self.table.update({'status': status}, workspace.id == identity)
+        doc_ids = self.table.update({'status': status},
+                                    workspace.id == identity)
+        record_changes(self.changes, changed_records(self.table, doc_ids))
 
+    @write_locked
+    def db_update_multiple(self, statuses) -> None:
+        """
+            Updates the status of many workspace records in a single db
+            write
+            :param statuses: dict of workspace identity to status
+        """
+        workspace = Query()
+        doc_ids = self.table.update_multiple(
+            [({'status': status}, workspace.id == identity)
+             for identity, status in statuses.items()])
+        record_changes(self.changes, changed_records(self.table, doc_ids))
+
+    @write_locked
+    def db_update_provisioned(self, identity, status, provision_hash) -> None:
+        """
+            Updates the workspace record status and the hash of the inputs
+            it was provisioned from in db
+            :param identity: unique uuid_name assigned to the workspace
+            :param status: field specifying workspace creation inserted in db
+            :param provision_hash: hash of the PinFile, credentials and
+                                   command of the run, None if unknown
+        """
+        workspace = Query()
+        doc_ids = self.table.update({'status': status,
+                                     'provision_hash': provision_hash},
+                                    workspace.id == identity)
+        record_changes(self.changes, changed_records(self.table, doc_ids))
+
+    @write_locked
+    def db_update_expiry(self, identity, expires_at, destroy_request) -> None:
+        """
+            Updates the time a provisioned workspace is destroyed at
+            :param identity: unique uuid_name assigned to the workspace
+            :param expires_at: unix timestamp, None for no expiry
+            :param destroy_request: request body fields the destroy job is
+                                    built from
+        """
+        workspace = Query()
+        doc_ids = self.table.update({'expires_at': expires_at,
+                                     'destroy_request': destroy_request},
+                                    workspace.id == identity)
+        record_changes(self.changes, changed_records(self.table, doc_ids))
+
+    @read_locked
     def db_search(self, name, admin, username) -> List[Dict]:
         """
             Searches for a workspace record in db
@@ -75,6 +167,7 @@ class RestDB(BaseDB):
             return self.table.search((workspace.name == name) &
                                      (workspace.username == username))
 
+    @read_locked
     def db_search_username(self, username) -> List[Dict]:
         """
             Searches for a workspace record in db w.r.t user who created it
@@ -84,6 +177,7 @@ class RestDB(BaseDB):
         workspace = Query()
         return self.table.search(workspace.username == username)
 
+    @read_locked
     def db_search_identity(self, identity) -> List[Dict]:
         """
             Searches for a workspace record in db w.r.t it's identity
@@ -93,6 +187,19 @@ class RestDB(BaseDB):
         workspace = Query()
         return self.table.search(workspace.id == identity)[0]
 
+    @read_locked
+    def db_search_identities(self, identities) -> List[Dict]:
+        """
+            Searches for workspace records in db w.r.t their identities
+            :param identities: unique uuid_names assigned to the workspaces
+            :return: a list of records in db matching any of the identities
+        """
+        identities = set(identities)
+        workspace = Query()
+        return self.table.search(workspace.id.test(
+            lambda value: value in identities))
+
+    @read_locked
     def db_list_all(self, username, admin) -> List[Dict]:
         """
             Lists all workspace records in database
@@ -46,3 +46,7 @@ class UserBaseDB(ABC):
     @abstractmethod
     def db_update_creds_folder(self, username, creds_folder):
         pass
+
+    @abstractmethod
+    def db_update_webhook(self, username, url, secret):
+        pass
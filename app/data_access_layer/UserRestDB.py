@@ -1,17 +1,32 @@
 from __future__ import absolute_import
 from tinydb import TinyDB, Query
+from app.data_access_layer.locking import get_store_lock, read_locked, \
+    write_locked
+from app.data_access_layer.storage import AtomicJSONStorage
+from app.tracing import trace_methods
 from app.data_access_layer.UserBaseDB import UserBaseDB
 from typing import List
 from typing import Dict
 from tinydb.operations import delete
 
 
+@trace_methods
 class UserRestDB(UserBaseDB):
 
     def __init__(self, path):
-        self.db = TinyDB(path)
+        self.lock = get_store_lock(path)
+        self.db = TinyDB(path, storage=AtomicJSONStorage)
         self.table = self.db.table('Users')
 
+    def _refresh(self) -> None:
+        """
+            Drops the table caches so an operation running under the store
+            lock sees writes made by other connections or processes
+        """
+        self.table.clear_cache()
+        self.table._next_id = None
+
+    @write_locked
     def db_insert(self, username, password_hash, api_key_hash,
                   email, admin) -> None:
         """
@@ -30,6 +45,7 @@ class UserRestDB(UserBaseDB):
                            'email': email, 'admin': admin,
                            'creds_folder': creds_folder})
 
+    @read_locked
     def db_search_name(self, username) -> List[Dict]:
         """
             Searches a workspace record in db
@@ -40,6 +56,7 @@ class UserRestDB(UserBaseDB):
         user = Query()
         return self.table.search(user.username == username)[0]
 
+    @read_locked
     def db_list_all(self) -> List[Dict]:
         """
             Lists all user records in database
@@ -47,6 +64,7 @@ class UserRestDB(UserBaseDB):
         """
         return self.table.all()
 
+    @read_locked
     def db_get_username(self, username) -> List[Dict]:
         """
             Gets a user record that matches the username
@@ -56,6 +74,7 @@ class UserRestDB(UserBaseDB):
         user = Query()
         return self.table.get(user.username == username)
 
+    @read_locked
     def db_get_api_key(self, api_key) -> List[Dict]:
         """
             Gets a user record that matches the api_key
@@ -65,6 +84,7 @@ class UserRestDB(UserBaseDB):
         user = Query()
         return self.table.get(user.api_key == api_key)
 
+    @write_locked
     def db_remove(self, username) -> None:
         """
             Removes the user record that matches the username
@@ -73,6 +93,7 @@ class UserRestDB(UserBaseDB):
         user = Query()
         self.table.remove(user.username == username)
 
+    @write_locked
     def db_remove_api_key(self, api_key) -> None:
         """
             Removes the api_key field from user record
@@ -81,6 +102,7 @@ class UserRestDB(UserBaseDB):
         user = Query()
         self.table.update(delete('api_key'), user.api_key == api_key)
 
+    @write_locked
     def db_reset_api_key(self, username, new_api_key) -> None:
         """
             Resets the api_key field in user record matching username
@@ -92,6 +114,7 @@ class UserRestDB(UserBaseDB):
         self.table.update({'api_key': new_api_key},
                           user.username == username)
 
+    @write_locked
     def db_update_admin(self, username, admin) -> None:
         """
             Updates the admin value of a user record
@@ -101,6 +124,7 @@ class UserRestDB(UserBaseDB):
         user = Query()
         self.table.update({'admin': admin}, user.username == username)
 
+    @write_locked
     def db_update(self, username, updated_username, password_hash,
                   email) -> None:
         """
@@ -116,7 +140,21 @@ class UserRestDB(UserBaseDB):
                            'password': password_hash,
                            'email': email}, user.username == username)
 
+    @write_locked
     def db_update_creds_folder(self, username, creds_folder):
         user = Query()
         self.table.update({'creds_folder': creds_folder},
                           user.username == username)
+
+    @write_locked
+    def db_update_webhook(self, username, url, secret) -> None:
+        """
+            Updates the webhook called when jobs of a user complete
+            :param username: username of the user record to be matched
+            :param url: webhook URL, None to remove the webhook
+            :param secret: secret deliveries are signed with, None to
+                           remove it
+        """
+        user = Query()
+        self.table.update({'webhook_url': url, 'webhook_secret': secret},
+                          user.username == username)
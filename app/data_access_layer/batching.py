@@ -0,0 +1,59 @@
+from __future__ import absolute_import
+import threading
+
+
+class GroupCommitWriter(object):
+    """
+        Wraps a workspaces db connection so status updates made from many
+        threads at once share db writes. An update returns once it has
+        been written; while one batch is being written, updates arriving
+        meanwhile are collected and written together by the next caller.
+        A deferred writer only collects updates until flush is called.
+    """
+
+    def __init__(self, db_con, deferred=False):
+        self.db_con = db_con
+        self.deferred = deferred
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._batch = _Batch()
+
+    def db_update(self, identity, status) -> None:
+        """
+            Updates the workspace record status in db
+            :param identity: unique uuid_name assigned to the workspace
+            :param status: field specifying workspace creation inserted in db
+        """
+        with self._lock:
+            batch = self._batch
+            batch.statuses[identity] = status
+        if not self.deferred:
+            self.flush(batch)
+
+    def flush(self, batch=None) -> None:
+        """
+            Writes the pending updates, unless batch has been written
+            meanwhile by another thread
+        """
+        with self._lock:
+            batch = batch or self._batch
+        with self._flush_lock:
+            if not batch.written:
+                with self._lock:
+                    self._batch = _Batch()
+                try:
+                    if batch.statuses:
+                        self.db_con.db_update_multiple(batch.statuses)
+                except Exception as e:
+                    batch.error = e
+                batch.written = True
+        if batch.error is not None:
+            raise batch.error
+
+
+class _Batch(object):
+
+    def __init__(self):
+        self.statuses = {}
+        self.written = False
+        self.error = None
@@ -0,0 +1,162 @@
+from __future__ import absolute_import
+import os
+import time
+import sqlite3
+import threading
+from typing import Dict, Iterable, List, Optional, Tuple
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS changes (
+    revision INTEGER PRIMARY KEY AUTOINCREMENT,
+    identity TEXT NOT NULL,
+    username TEXT,
+    name TEXT,
+    status TEXT,
+    deleted INTEGER NOT NULL DEFAULT 0,
+    time REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS changes_user_revision
+    ON changes (username, revision);
+"""
+
+# revisions recorded between two purges of expired changes
+PURGE_EVERY = 1000
+
+
+class ChangeFeed(object):
+    """
+        SQLite log of the changes made to workspace records. Every insert,
+        update and removal gets the next revision number, shared by all
+        worker processes, so clients can ask for the changes after the
+        last revision they have seen instead of listing the workspaces
+        again. Waiters of this process are woken when a change is
+        recorded, changes recorded by other workers are noticed by
+        polling the latest revision.
+    """
+
+    def __init__(self, path, retention=86400, poll_interval=0.5):
+        """
+            :param path: path of the sqlite database
+            :param retention: seconds changes are kept for
+            :param poll_interval: seconds between checks for changes
+                                  recorded by other worker processes
+        """
+        self.path = path
+        self.retention = retention
+        self.poll_interval = poll_interval
+        self._local = threading.local()
+        self._cond = threading.Condition()
+
+    def _connection(self) -> sqlite3.Connection:
+        connection = getattr(self._local, 'connection', None)
+        # connections cannot be used across a fork
+        if connection is None or self._local.pid != os.getpid():
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)),
+                        exist_ok=True)
+            connection = sqlite3.connect(self.path, timeout=30)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.executescript(SCHEMA)
+            self._local.connection = connection
+            self._local.pid = os.getpid()
+        return connection
+
+    def record(self, workspaces: Iterable[Dict], deleted=False) -> None:
+        """
+            Records a change of each workspace record
+            :param workspaces: records as stored after the change, or
+                               before it for removals
+            :param deleted: boolean indicating the records were removed
+        """
+        now = time.time()
+        rows = [(w['id'], w.get('username'), w.get('name'), w.get('status'),
+                 int(deleted), now) for w in workspaces]
+        if not rows:
+            return
+        connection = self._connection()
+        with connection:
+            cursor = connection.executemany(
+                'INSERT INTO changes (identity, username, name, status, '
+                'deleted, time) VALUES (?, ?, ?, ?, ?, ?)', rows)
+            revision = connection.execute(
+                'SELECT MAX(revision) FROM changes').fetchone()[0]
+            if self.retention and \
+                    revision // PURGE_EVERY != \
+                    (revision - cursor.rowcount) // PURGE_EVERY:
+                connection.execute('DELETE FROM changes WHERE time < ?',
+                                   (now - self.retention,))
+        with self._cond:
+            self._cond.notify_all()
+
+    def revision(self) -> int:
+        """
+            :return: the latest revision, 0 before the first change
+        """
+        row = self._connection().execute(
+            'SELECT MAX(revision) FROM changes').fetchone()
+        return row[0] or 0
+
+    def changes(self, since, username=None,
+                limit=1000) -> Tuple[List[Dict], int, bool]:
+        """
+            Lists the changes after revision since
+            :param username: owner the changes are limited to, None for all
+            :param limit: largest number of changes returned
+            :return: the changes oldest first, the revision to resume
+                     from and whether changes after since were purged
+        """
+        connection = self._connection()
+        head = self.revision()
+        sql = 'SELECT revision, identity, username, name, status, ' \
+              'deleted FROM changes WHERE revision > ? AND revision <= ?'
+        args = [since, head]
+        if username is not None:
+            sql += ' AND username = ?'
+            args.append(username)
+        sql += ' ORDER BY revision LIMIT ?'
+        args.append(limit)
+        rows = connection.execute(sql, args).fetchall()
+        oldest = connection.execute(
+            'SELECT MIN(revision) FROM changes').fetchone()[0]
+        truncated = oldest is not None and since < oldest - 1
+        changes = [dict(revision=revision, id=identity, username=owner,
+                        name=name, status=status, deleted=bool(deleted))
+                   for revision, identity, owner, name, status, deleted
+                   in rows]
+        # a full page resumes after its last change, else after head
+        resume = changes[-1]['revision'] if len(changes) == limit else head
+        return changes, max(resume, since), truncated
+
+    def wait(self, since, username=None, timeout=30,
+             limit=1000) -> Tuple[List[Dict], int, bool]:
+        """
+            Waits up to timeout seconds for changes after revision since,
+            returns as soon as there are some
+            :return: same as changes
+        """
+        deadline = time.monotonic() + max(timeout, 0)
+        while True:
+            result = self.changes(since, username, limit)
+            remaining = deadline - time.monotonic()
+            if result[0] or result[2] or remaining <= 0:
+                return result
+            # skip the revisions of other users already looked at
+            since = result[1]
+            with self._cond:
+                self._cond.wait(min(self.poll_interval, remaining))
+
+
+def changed_records(table, doc_ids) -> List[Dict]:
+    """
+        :return: the records of a TinyDB table with the given doc_ids
+    """
+    records = (table.get(doc_id=doc_id) for doc_id in doc_ids or [])
+    return [record for record in records if record is not None]
+
+
+def record_changes(feed: Optional[ChangeFeed], workspaces,
+                   deleted=False) -> None:
+    """
+        Records changes of workspace records when feed is set
+    """
+    if feed is not None:
+        feed.record(workspaces, deleted)
@@ -0,0 +1,214 @@
+from __future__ import absolute_import
+import os
+import threading
+from contextlib import contextmanager
+from functools import wraps
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - non POSIX hosts
+    fcntl = None
+
+
+class ReadWriteLock(object):
+    """
+        Writer preferring reader/writer lock for threads of one process.
+        Readers proceed in parallel, a writer waits for active readers
+        to drain and blocks new ones while it is waiting. The writing
+        thread may re-enter both read and write sections.
+    """
+
+    def __init__(self):
+        self._cond = threading.Condition(threading.Lock())
+        self._readers = 0
+        self._writer = None
+        self._writer_depth = 0
+        self._writers_waiting = 0
+        self._local = threading.local()
+
+    def acquire_read(self) -> None:
+        me = threading.get_ident()
+        depth = getattr(self._local, 'reads', 0)
+        with self._cond:
+            if self._writer != me and depth == 0:
+                while self._writer is not None or self._writers_waiting:
+                    self._cond.wait()
+            self._readers += 1
+        self._local.reads = depth + 1
+
+    def release_read(self) -> None:
+        self._local.reads -= 1
+        with self._cond:
+            self._readers -= 1
+            if not self._readers:
+                self._cond.notify_all()
+
+    def acquire_write(self) -> None:
+        me = threading.get_ident()
+        with self._cond:
+            if self._writer == me:
+                self._writer_depth += 1
+                return
+            self._writers_waiting += 1
+            try:
+                while self._writer is not None or self._readers:
+                    self._cond.wait()
+            finally:
+                self._writers_waiting -= 1
+            self._writer = me
+            self._writer_depth = 1
+
+    def release_write(self) -> None:
+        with self._cond:
+            self._writer_depth -= 1
+            if not self._writer_depth:
+                self._writer = None
+                self._cond.notify_all()
+
+    @property
+    def write_depth(self) -> int:
+        return self._writer_depth
+
+    @contextmanager
+    def read(self):
+        self.acquire_read()
+        try:
+            yield
+        finally:
+            self.release_read()
+
+    @contextmanager
+    def write(self):
+        self.acquire_write()
+        try:
+            yield
+        finally:
+            self.release_write()
+
+
+class FileLock(object):
+    """
+        Advisory lock on a file shared between processes, used to
+        serialize writers across the workers of one deployment
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._fd = None
+
+    def acquire(self, exclusive=True, blocking=True) -> bool:
+        """
+            Takes the lock
+            :param exclusive: exclusive (writer) or shared (reader) lock
+            :param blocking: wait for the lock instead of failing
+            :return: True when the lock has been taken
+        """
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        if fcntl is not None:
+            flags = fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH
+            if not blocking:
+                flags |= fcntl.LOCK_NB
+            try:
+                fcntl.flock(fd, flags)
+            except (BlockingIOError, PermissionError):
+                os.close(fd)
+                return False
+        self._fd = fd
+        return True
+
+    def release(self) -> None:
+        fd, self._fd = self._fd, None
+        if fd is None:
+            return
+        if fcntl is not None:
+            fcntl.flock(fd, fcntl.LOCK_UN)
+        os.close(fd)
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
+
+
+class StoreLock(object):
+    """
+        Lock guarding one storage file. Reads only take the in-process
+        reader lock since writes are persisted with an atomic rename and
+        never expose a partial document. Writes take the in-process
+        writer lock plus an exclusive lock file so a read-modify-write
+        cycle cannot interleave with a writer in another process.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.rw_lock = ReadWriteLock()
+
+    @contextmanager
+    def read(self):
+        with self.rw_lock.read():
+            yield
+
+    @contextmanager
+    def write(self):
+        with self.rw_lock.write():
+            if self.rw_lock.write_depth > 1:
+                yield
+                return
+            with FileLock(self.path + '.lock'):
+                yield
+
+
+_store_locks = {}
+_store_locks_guard = threading.Lock()
+
+
+def get_store_lock(path) -> StoreLock:
+    """
+        Returns the lock shared by every connection to a storage file
+        :param path: path of the storage file
+        :return: StoreLock instance for path
+    """
+    key = os.path.abspath(path)
+    with _store_locks_guard:
+        lock = _store_locks.get(key)
+        if lock is None:
+            lock = _store_locks[key] = StoreLock(key)
+        return lock
+
+
+def _reset_store_locks():
+    # locks held by other threads at fork time would never be released
+    # in the child, start it with a fresh registry
+    global _store_locks_guard
+    _store_locks.clear()
+    _store_locks_guard = threading.Lock()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_store_locks)
+
+
+def read_locked(method):
+    """
+        Decorator for DB methods that only read the storage file
+    """
+    @wraps(method)
+    def wrapper(self, *args, **kwargs):
+        with self.lock.read():
+            self._refresh()
+            return method(self, *args, **kwargs)
+    return wrapper
+
+
+def write_locked(method):
+    """
+        Decorator for DB methods that modify the storage file
+    """
+    @wraps(method)
+    def wrapper(self, *args, **kwargs):
+        with self.lock.write():
+            self._refresh()
+            return method(self, *args, **kwargs)
+    return wrapper
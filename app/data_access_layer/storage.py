@@ -0,0 +1,55 @@
+from __future__ import absolute_import
+import os
+import json
+import tempfile
+from tinydb.storages import Storage
+from typing import Dict, Optional
+
+
+class AtomicJSONStorage(Storage):
+    """
+        TinyDB storage persisting the whole document with write-then-rename,
+        readers observe either the previous or the new document but never
+        a partially written file
+    """
+
+    def __init__(self, path, create_dirs=False, **kwargs):
+        super().__init__()
+        self._path = os.path.abspath(path)
+        self.kwargs = kwargs
+        directory = os.path.dirname(self._path)
+        if create_dirs and not os.path.isdir(directory):
+            os.makedirs(directory)
+
+    def read(self) -> Optional[Dict]:
+        try:
+            with open(self._path, 'r') as handle:
+                content = handle.read()
+        except FileNotFoundError:
+            return None
+        if not content.strip():
+            return None
+        return json.loads(content)
+
+    def write(self, data) -> None:
+        directory, name = os.path.split(self._path)
+        fd, tmp_path = tempfile.mkstemp(prefix='.' + name + '.',
+                                        suffix='.tmp', dir=directory)
+        try:
+            with os.fdopen(fd, 'w') as handle:
+                json.dump(data, handle, **self.kwargs)
+                handle.flush()
+                os.fsync(handle.fileno())
+            try:
+                mode = os.stat(self._path).st_mode & 0o777
+            except FileNotFoundError:
+                mode = 0o644
+            os.chmod(tmp_path, mode)
+            os.replace(tmp_path, self._path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    def close(self) -> None:
+        pass
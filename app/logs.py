@@ -0,0 +1,212 @@
+from __future__ import absolute_import
+import os
+import json
+import gzip
+import time
+import queue
+import atexit
+import shutil
+import logging
+import threading
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener, \
+    RotatingFileHandler
+from flask import g, request, has_app_context
+from flask.logging import default_handler
+
+ACCESS_LOGGER_NAME = 'restylinchpin.access'
+
+
+class JSONFormatter(logging.Formatter):
+    """
+        Formats records as one JSON object per line, access records carry
+        their fields in the ``access`` attribute
+    """
+
+    def format(self, record) -> str:
+        entry = {'time': datetime.fromtimestamp(record.created, timezone.utc)
+                 .isoformat(timespec='milliseconds'),
+                 'level': record.levelname,
+                 'logger': record.name}
+        access = getattr(record, 'access', None)
+        if access is not None:
+            entry.update(access)
+        else:
+            entry['message'] = record.getMessage()
+            if record.exc_info:
+                entry['exc_info'] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+class CompressingRotatingFileHandler(RotatingFileHandler):
+    """
+        Size based rotating handler gzipping rotated files. Rotation runs
+        on the queue listener thread so requests never wait for it.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.namer = lambda name: name + '.gz'
+        self.rotator = self._compress
+
+    @staticmethod
+    def _compress(source, dest) -> None:
+        with open(source, 'rb') as src, gzip.open(dest, 'wb') as dst:
+            shutil.copyfileobj(src, dst)
+        os.remove(source)
+
+
+class LogPipeline(object):
+    """
+        Routes the application and access loggers through a queue to a
+        listener thread owning the file handlers. The listener thread does
+        not survive fork, a forked worker starts its own on the first
+        record it logs. File names may contain ``{pid}`` so every worker
+        process rotates its own files, several processes rotating one file
+        lose records.
+    """
+
+    def __init__(self, log_file, access_log_file, max_bytes, backup_count):
+        self.log_file = log_file
+        self.access_log_file = access_log_file
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        self.queue_handler = _PipelineHandler(self)
+        self.listener = None
+        self._pid = None
+        self._lock = threading.Lock()
+        if hasattr(os, 'register_at_fork'):
+            os.register_at_fork(after_in_child=self._reinit_lock)
+
+    def _reinit_lock(self) -> None:
+        self._lock = threading.Lock()
+
+    def _handlers(self):
+        handlers = []
+        for path, access in ((self.log_file, False),
+                             (self.access_log_file, True)):
+            if not path:
+                continue
+            handler = CompressingRotatingFileHandler(
+                path.format(pid=os.getpid()), maxBytes=self.max_bytes,
+                backupCount=self.backup_count, delay=True)
+            handler.setLevel(logging.INFO)
+            handler.setFormatter(JSONFormatter())
+            handler.addFilter(_AccessFilter(access))
+            handlers.append(handler)
+        # replaces flask's stderr handler behind the queue
+        stream = logging.StreamHandler()
+        stream.setFormatter(default_handler.formatter)
+        stream.addFilter(_AccessFilter(False))
+        handlers.append(stream)
+        return handlers
+
+    def start(self) -> None:
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self.queue_handler.queue = queue.Queue(-1)
+            self.listener = QueueListener(self.queue_handler.queue,
+                                          *self._handlers(),
+                                          respect_handler_level=True)
+            self.listener.start()
+            self._pid = os.getpid()
+
+    def stop(self) -> None:
+        if self.listener is not None and self._pid == os.getpid():
+            self.listener.stop()
+            for handler in self.listener.handlers:
+                handler.close()
+        self.listener = None
+        self._pid = None
+
+
+class _PipelineHandler(QueueHandler):
+
+    def __init__(self, pipeline):
+        super().__init__(queue.Queue(-1))
+        self.pipeline = pipeline
+
+    def emit(self, record) -> None:
+        if self.pipeline._pid != os.getpid():
+            self.pipeline.start()
+        super().emit(record)
+
+
+class _AccessFilter(logging.Filter):
+    """
+        Sends access records to the access log and everything else to the
+        application log
+    """
+
+    def __init__(self, access):
+        super().__init__()
+        self.access = access
+
+    def filter(self, record) -> bool:
+        return (record.name == ACCESS_LOGGER_NAME) == self.access
+
+
+def setup_logging(app, log_file, access_log_file, max_bytes,
+                  backup_count) -> LogPipeline:
+    """
+        Installs queue based logging and per request access logging
+        :param app: flask application
+        :param log_file: application log file name
+        :param access_log_file: access log file name, falsy disables the
+                                access log
+        :param max_bytes: size at which log files are rotated
+        :param backup_count: number of compressed rotated files kept
+        :return: the started LogPipeline
+    """
+    pipeline = LogPipeline(log_file, access_log_file, max_bytes,
+                           backup_count)
+    pipeline.start()
+    atexit.register(pipeline.stop)
+
+    app.logger.setLevel(logging.INFO)
+    app.logger.removeHandler(default_handler)
+    app.logger.addHandler(pipeline.queue_handler)
+    access_logger = logging.getLogger(ACCESS_LOGGER_NAME)
+    access_logger.setLevel(logging.INFO)
+    access_logger.propagate = False
+    access_logger.addHandler(pipeline.queue_handler)
+
+    if access_log_file:
+        app.before_request(_start_timer)
+        app.after_request(_log_access)
+    return pipeline
+
+
+def add_subprocess_time(seconds) -> None:
+    """
+        Adds the wall time of a linchpin subprocess to the current
+        request's access log entry, no-op outside of a request
+    """
+    if has_app_context():
+        g.subprocess_time = g.get('subprocess_time', 0.0) + seconds
+
+
+def _start_timer() -> None:
+    g.request_start = time.perf_counter()
+    g.subprocess_time = 0.0
+
+
+def _log_access(response):
+    start = g.get('request_start')
+    if start is None:
+        return response
+    user = g.get('current_user')
+    rule = request.url_rule
+    logging.getLogger(ACCESS_LOGGER_NAME).info('', extra={'access': {
+        'method': request.method,
+        'route': rule.rule if rule is not None else None,
+        'path': request.path,
+        'user': user['username'] if user else None,
+        'status': response.status_code,
+        'latency_ms': round((time.perf_counter() - start) * 1000, 3),
+        'subprocess_ms': round(g.get('subprocess_time', 0.0) * 1000, 3),
+        'bytes': response.calculate_content_length(),
+        'remote_addr': request.remote_addr,
+    }})
+    return response
@@ -0,0 +1,271 @@
+from __future__ import absolute_import
+import zlib
+import threading
+from functools import partial
+import importlib.util
+from collections import OrderedDict
+from typing import Dict, Optional
+
+
+class LazySwaggerUI(object):
+    """
+        WSGI middleware serving Swagger UI from a separate flask app that
+        is only built, and flask_swagger_ui only imported, on the first
+        request below the docs prefix
+    """
+
+    def __init__(self, wsgi_app, swagger_url, api_url, ui_config=None):
+        self.wsgi_app = wsgi_app
+        self.swagger_url = swagger_url
+        self.api_url = api_url
+        self.ui_config = ui_config
+        self._ui_app = None
+        self._lock = threading.Lock()
+
+    def _get_ui_app(self):
+        if self._ui_app is None:
+            with self._lock:
+                if self._ui_app is None:
+                    from flask import Flask
+                    from flask_swagger_ui import get_swaggerui_blueprint
+                    ui_app = Flask(__name__)
+                    ui_app.register_blueprint(
+                        get_swaggerui_blueprint(self.swagger_url,
+                                                self.api_url,
+                                                config=self.ui_config),
+                        url_prefix=self.swagger_url)
+                    self._ui_app = ui_app
+        return self._ui_app
+
+    def __call__(self, environ, start_response):
+        path = environ.get('PATH_INFO', '')
+        if path == self.swagger_url or \
+                path.startswith(self.swagger_url + '/'):
+            return self._get_ui_app()(environ, start_response)
+        return self.wsgi_app(environ, start_response)
+
+
+class _Gzip(object):
+
+    def __init__(self, level):
+        # wbits 31 writes the gzip header and trailer
+        self._compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+
+    def compress(self, data) -> bytes:
+        return self._compressor.compress(data)
+
+    def flush(self) -> bytes:
+        return self._compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self) -> bytes:
+        return self._compressor.flush()
+
+
+class _Zstd(object):
+
+    def __init__(self, level):
+        import zstandard
+        self._flush_block = zstandard.COMPRESSOBJ_FLUSH_BLOCK
+        self._compressor = zstandard.ZstdCompressor(level=level) \
+            .compressobj()
+
+    def compress(self, data) -> bytes:
+        return self._compressor.compress(data)
+
+    def flush(self) -> bytes:
+        return self._compressor.flush(self._flush_block)
+
+    def finish(self) -> bytes:
+        return self._compressor.flush()
+
+
+class _Brotli(object):
+
+    def __init__(self, level):
+        import brotli
+        self._compressor = brotli.Compressor(quality=level)
+
+    def compress(self, data) -> bytes:
+        return self._compressor.process(data)
+
+    def flush(self) -> bytes:
+        return self._compressor.flush()
+
+    def finish(self) -> bytes:
+        return self._compressor.finish()
+
+
+def _available(module) -> bool:
+    try:
+        return importlib.util.find_spec(module) is not None
+    except ValueError:
+        return False
+
+
+# server preference when the client accepts several with the same q
+CODECS = OrderedDict((('zstd', (_Zstd, 'zstandard', 3)),
+                      ('br', (_Brotli, 'brotli', 5)),
+                      ('gzip', (_Gzip, None, 6))))
+
+COMPRESSIBLE_TYPES = ('text/', 'application/json', 'application/x-ndjson',
+                      'application/javascript', 'application/xml',
+                      'application/msgpack')
+
+
+def parse_accept_encoding(header) -> Dict[str, float]:
+    """
+        :return: dict of content coding to q value, q=0 entries included
+    """
+    accepted = {}
+    for part in (header or '').split(','):
+        coding, _, params = part.strip().partition(';')
+        coding = coding.strip().lower()
+        if not coding:
+            continue
+        q = 1.0
+        for param in params.split(';'):
+            name, _, value = param.strip().partition('=')
+            if name.strip().lower() == 'q':
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        accepted[coding] = q
+    return accepted
+
+
+class CompressionMiddleware(object):
+    """
+        WSGI middleware compressing compressible responses with the best
+        content coding the client accepts: zstd and br when their modules
+        are installed, else gzip. Responses with a Content-Length below
+        min_size are sent as is. Streamed responses, without a
+        Content-Length, are compressed from their headers alone chunk by
+        chunk, each chunk flushed so clients see streamed lines as they
+        are produced.
+    """
+
+    def __init__(self, wsgi_app, min_size=1024, levels=None,
+                 encodings=None):
+        """
+            :param wsgi_app: wrapped WSGI application
+            :param min_size: smallest body in bytes worth compressing
+            :param levels: dict of content coding to compression level
+            :param encodings: content codings offered in preference order,
+                              defaults to every installed one
+        """
+        self.wsgi_app = wsgi_app
+        self.min_size = min_size
+        self.codecs = OrderedDict()
+        for coding in encodings or CODECS:
+            codec, module, level = CODECS[coding]
+            if module is None or _available(module):
+                self.codecs[coding] = (codec, (levels or {})
+                                       .get(coding, level))
+
+    def select(self, accept_encoding) -> Optional[str]:
+        """
+            :return: the content coding to use for a request, None to send
+                     the response uncompressed
+        """
+        accepted = parse_accept_encoding(accept_encoding)
+        best, best_q = None, 0.0
+        for coding in self.codecs:
+            q = accepted.get(coding, accepted.get('*', 0.0))
+            if q > best_q:
+                best, best_q = coding, q
+        return best
+
+    def __call__(self, environ, start_response):
+        coding = None
+        if environ.get('REQUEST_METHOD') != 'HEAD':
+            coding = self.select(environ.get('HTTP_ACCEPT_ENCODING'))
+        if coding is None:
+            return self.wsgi_app(environ, partial(self._identity,
+                                                  start_response))
+        captured = {}
+
+        def capture(status, headers, exc_info=None):
+            if exc_info is not None and captured.get('sent'):
+                raise exc_info[1].with_traceback(exc_info[2])
+            captured['response'] = (status, headers, exc_info)
+            return captured.setdefault('body', []).append
+
+        app_iter = self.wsgi_app(environ, capture)
+        return self._respond(app_iter, captured, coding, start_response)
+
+    def _compressible(self, status, headers) -> bool:
+        names = {name.lower(): value for name, value in headers}
+        content_type = names.get('content-type', '').lower()
+        return not (status[:3] in ('204', '206', '304') or
+                    'content-encoding' in names or
+                    'no-transform' in names.get('cache-control', '') or
+                    not content_type.startswith(COMPRESSIBLE_TYPES))
+
+    def _identity(self, start_response, status, headers, exc_info=None):
+        # caches must not hand this response to clients accepting gzip
+        if self._compressible(status, headers):
+            headers = self._vary(headers)
+        return start_response(status, headers, exc_info)
+
+    @staticmethod
+    def _vary(headers):
+        vary = [value for name, value in headers if name.lower() == 'vary']
+        headers = [(name, value) for name, value in headers
+                   if name.lower() != 'vary']
+        return headers + [('Vary', ', '.join(vary + ['Accept-Encoding']))]
+
+    def _respond(self, app_iter, captured, coding, start_response):
+        try:
+            chunks = iter(app_iter)
+            buffered, finished = [], False
+            # start_response may be called as late as with the first chunk
+            while 'response' not in captured:
+                try:
+                    buffered.append(next(chunks))
+                except StopIteration:
+                    finished = True
+                    break
+            buffered = captured.get('body', []) + buffered
+            status, headers, exc_info = captured['response']
+            known = any(name.lower() == 'content-length'
+                        for name, _ in headers)
+            if known and not finished:
+                # bodies of known size are compressed whole
+                buffered.extend(chunks)
+                finished = True
+            compressible = self._compressible(status, headers)
+            if compressible:
+                headers = self._vary(headers)
+            captured['sent'] = True
+            # only the size of known bodies is weighed, a streamed body is
+            # not held back waiting for min_size bytes
+            if not compressible or (known or finished) and \
+                    sum(map(len, buffered)) < self.min_size:
+                start_response(status, headers, exc_info)
+                yield from buffered
+                yield from chunks
+                return
+            codec, level = self.codecs[coding]
+            codec = codec(level)
+            headers = [(name, value) for name, value in headers
+                       if name.lower() != 'content-length']
+            headers.append(('Content-Encoding', coding))
+            body = b''.join(codec.compress(chunk) for chunk in buffered)
+            if finished:
+                body += codec.finish()
+                headers.append(('Content-Length', str(len(body))))
+                start_response(status, headers, exc_info)
+                yield body
+                return
+            start_response(status, headers, exc_info)
+            # flush every chunk so streamed lines reach the client at once
+            if body:
+                yield body + codec.flush()
+            for chunk in chunks:
+                if chunk:
+                    yield codec.compress(chunk) + codec.flush()
+            yield codec.finish()
+        finally:
+            if hasattr(app_iter, 'close'):
+                app_iter.close()
@@ -8,3 +8,31 @@ INVALID_NAME = "Workspace name cannot contain special characters,"\
                "please try again my renaming"
 ERROR_STATUS = 409
 UNAUTHORIZED_REQUEST = "Unauthorized Request Error"
+IDEMPOTENCY_KEY_REUSED = "Idempotency-Key was already used with a " \
+                         "different request body"
+INVALID_PINFILE = "PinFile is not valid, see errors for details"
+JOB_CANCELLED = "linchpin job %s was cancelled"
+JOB_TIMEOUT = "linchpin %s timed out after %s seconds"
+RATE_LIMITED = "Rate limit exceeded, retry after the Retry-After delay"
+OVERLOADED = "Too many linchpin jobs pending, retry after the " \
+             "Retry-After delay"
+KEY_ERROR_BULK_CREATE = "Please provide request body in format:" \
+                        "{workspaces: [{name: workspacename}, ...]}"
+KEY_ERROR_BULK_DESTROY = "Please provide request body in format:" \
+                         "{workspaces: [{id: workspace_id}, ...]}"
+BULK_TOO_LARGE = "Bulk requests are limited to %s workspaces"
+KEY_ERROR_BATCH = "Please provide request body in format:" \
+                  "{requests: [{method: GET, path: /api/v1.0/..., " \
+                  "body: {...}}, ...]}"
+KEY_ERROR_BATCH_ITEM = "Sub-request needs a method and a path of the API " \
+                       "other than /api/v1.0/batch"
+BATCH_TOO_LARGE = "Batch requests are limited to %s sub-requests"
+INVALID_WEBHOOK_URL = "webhook_url must be an absolute http or https URL"
+INVALID_EXPIRY = "Please provide ttl as a positive number of seconds or " \
+                 "expires_at as a unix timestamp or ISO 8601 date, " \
+                 "within max_ttl"
+INVALID_COMPRESSION = "compression must be gzip or none"
+INVALID_ARCHIVE = "Please provide a tar archive, optionally gzipped, of a " \
+                  "single workspace directory within the import limits"
+MISSING_SEARCH_QUERY = "please provide the search query in request route " \
+                       "in the format route?q=value"
@@ -41,3 +41,9 @@ MISSING_USERNAME = "please provide the username in request route in "\
 CREDENTIALS_UPLOADED = "Credentials uploaded successfully"
 CREDENTIALS_UPDATED = "Credentials updated sccessfully"
 CREDENTIALS_DELETED = "Credentials deleted successfully"
+TRACING_DISABLED = "Tracing ring buffer is disabled"
+WEBHOOK_REMOVED = "Webhook has been removed"
+DELIVERY_NOT_FOUND = "No failed webhook delivery found with this id"
+DELIVERY_REQUEUED = "Webhook delivery queued for delivery again"
+JOB_NOT_FOUND = "No running job found with this id"
+JOB_CANCELLED = "Job cancellation requested"
@@ -0,0 +1,140 @@
+from __future__ import absolute_import
+import json
+from collections import OrderedDict
+from itertools import islice
+from flask import Response, request
+from typing import Iterable, Iterator
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+JSON_MIMETYPE = 'application/json'
+MSGPACK_MIMETYPE = 'application/msgpack'
+
+
+class JSONSerializer(object):
+    """
+        Encodes JSON with orjson when it is installed, else with the
+        standard library encoder. Values JSON cannot represent are
+        encoded as their str().
+    """
+
+    mimetype = JSON_MIMETYPE
+
+    def __init__(self, backend=None):
+        """
+            :param backend: 'orjson' or 'json', defaults to the fastest
+                            installed one
+        """
+        if backend is None:
+            backend = 'json' if orjson is None else 'orjson'
+        self.backend = backend
+        if backend == 'orjson' and orjson is not None:
+            options = orjson.OPT_NON_STR_KEYS
+
+            def dumps(obj):
+                return orjson.dumps(obj, default=str, option=options)
+        elif backend == 'json':
+            encoder = json.JSONEncoder(default=str, separators=(',', ':'))
+
+            def dumps(obj):
+                return encoder.encode(obj).encode('utf-8')
+        else:
+            raise ValueError("JSON backend %s is not available" % backend)
+        self.dumps = dumps
+
+    def iter_array(self, items, chunk_items=1000) -> Iterator[bytes]:
+        """
+            Encodes a list incrementally, chunk_items items per chunk, so
+            the response starts before the whole list is encoded and the
+            encoded list is never held in memory at once
+        """
+        yield b'['
+        items = iter(items)
+        separator = b''
+        chunk = list(islice(items, chunk_items))
+        while chunk:
+            # encoding the chunk as an array is as fast as one item
+            yield separator + self.dumps(chunk)[1:-1]
+            separator = b','
+            chunk = list(islice(items, chunk_items))
+        yield b']'
+
+
+class MsgpackSerializer(object):
+    """
+        Encodes MessagePack with the msgpack package, offered to clients
+        sending Accept: application/msgpack when msgpack is installed
+    """
+
+    mimetype = MSGPACK_MIMETYPE
+
+    def __init__(self):
+        import msgpack
+        self._msgpack = msgpack
+
+    def _packer(self):
+        return self._msgpack.Packer(default=str, use_bin_type=True)
+
+    def dumps(self, obj) -> bytes:
+        return self._packer().pack(obj)
+
+    def iter_array(self, items, chunk_items=1000) -> Iterator[bytes]:
+        items = list(items)
+        packer = self._packer()
+        yield packer.pack_array_header(len(items))
+        for start in range(0, len(items), chunk_items):
+            yield b''.join(packer.pack(item)
+                           for item in items[start:start + chunk_items])
+
+
+def _load_serializers():
+    serializers = OrderedDict([(JSON_MIMETYPE, JSONSerializer())])
+    try:
+        serializers[MSGPACK_MIMETYPE] = MsgpackSerializer()
+    except ImportError:
+        pass
+    return serializers
+
+
+# serializers offered to clients, the first one is the default
+SERIALIZERS = _load_serializers()
+
+
+def negotiate():
+    """
+        :return: the serializer best matching the Accept header of the
+                 current request, JSON when nothing offered matches
+    """
+    mimetype = request.accept_mimetypes.best_match(
+        list(SERIALIZERS), default=JSON_MIMETYPE)
+    return SERIALIZERS[mimetype]
+
+
+def serialize(obj, status=200) -> Response:
+    """
+        Builds a response encoding obj in the format the client accepts
+        :param obj: JSON compatible value
+        :param status: HTTP status code of the response
+    """
+    serializer = negotiate()
+    result = Response(serializer.dumps(obj), status=status,
+                      mimetype=serializer.mimetype)
+    result.vary.add('Accept')
+    return result
+
+
+def serialize_list(items: Iterable, status=200) -> Response:
+    """
+        Builds a streamed response encoding a list item by item in the
+        format the client accepts, for list endpoints
+        :param items: list of JSON compatible values
+        :param status: HTTP status code of the response
+    """
+    serializer = negotiate()
+    result = Response(serializer.iter_array(items), status=status,
+                      mimetype=serializer.mimetype)
+    result.vary.add('Accept')
+    return result
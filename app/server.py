@@ -0,0 +1,99 @@
+from __future__ import absolute_import
+import logging
+import multiprocessing
+from typing import Dict
+
+logger = logging.getLogger(__name__)
+
+# defaults applied for keys missing from the server section of config.yml
+SERVER_DEFAULTS = {
+    'bind': '0.0.0.0:5000',
+    # number of pre-forked worker processes, 0 picks one per cpu core
+    'workers': 0,
+    # threads per worker, more than one selects threaded (gthread) workers
+    'threads': 4,
+    'worker_class': None,
+    # seconds an idle keep-alive connection is held open
+    'keepalive': 5,
+    # seconds before a silent worker is killed and restarted, sync
+    # workers must allow for the longest linchpin run
+    'timeout': 120,
+    'graceful_timeout': 30,
+    # recycle workers after this many requests, 0 disables recycling
+    'max_requests': 0,
+    'max_requests_jitter': 0,
+    # import the application and run create_app once in the master
+    'preload': True,
+}
+
+
+def server_options(config, overrides=None) -> Dict:
+    """
+        Merges the server section of config.yml with command line overrides
+        :param config: server section of config.yml
+        :param overrides: options given on the command line, None values
+                          are ignored
+        :return: a dict with every option of SERVER_DEFAULTS set
+    """
+    options = dict(SERVER_DEFAULTS)
+    options.update(config or {})
+    options.update({k: v for k, v in (overrides or {}).items()
+                    if v is not None})
+    if not options['workers']:
+        options['workers'] = multiprocessing.cpu_count()
+    if not options['worker_class']:
+        options['worker_class'] = \
+            'gthread' if options['threads'] > 1 else 'sync'
+    return options
+
+
+def post_fork(server, worker) -> None:
+    """
+        gunicorn hook starting the background services in each worker
+    """
+    from app import start_background_services
+    start_background_services()
+
+
+def serve(options) -> None:
+    """
+        Runs the API under gunicorn with a pre-fork worker model, falls
+        back to the threaded werkzeug server when gunicorn is missing
+        :param options: dict returned by server_options
+    """
+    try:
+        from gunicorn.app.base import BaseApplication
+    except ImportError:
+        BaseApplication = None
+
+    if BaseApplication is None:
+        from app import create_app
+        host, _, port = options['bind'].rpartition(':')
+        logger.warning("gunicorn is not installed, serving with the "
+                       "single process werkzeug server")
+        create_app().run(host=host or '0.0.0.0', port=int(port),
+                         threaded=True)
+        return
+
+    class Application(BaseApplication):
+
+        def load_config(self):
+            self.cfg.set('bind', options['bind'])
+            self.cfg.set('workers', options['workers'])
+            self.cfg.set('threads', options['threads'])
+            self.cfg.set('worker_class', options['worker_class'])
+            self.cfg.set('keepalive', options['keepalive'])
+            self.cfg.set('timeout', options['timeout'])
+            self.cfg.set('graceful_timeout', options['graceful_timeout'])
+            self.cfg.set('max_requests', options['max_requests'])
+            self.cfg.set('max_requests_jitter',
+                         options['max_requests_jitter'])
+            self.cfg.set('preload_app', options['preload'])
+            self.cfg.set('post_fork', post_fork)
+
+        def load(self):
+            from app import create_app
+            # background threads are started by post_fork in each worker
+            return create_app(background=False)
+
+    Application().run()
@@ -0,0 +1,294 @@
+from __future__ import absolute_import
+import os
+import json
+import time
+import queue
+import atexit
+import logging
+import threading
+import contextvars
+from collections import deque
+from contextlib import contextmanager
+from functools import wraps
+from flask import g, request
+from typing import Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+_current_span = contextvars.ContextVar('restylinchpin_span', default=None)
+
+
+class Span(object):
+    """
+        A timed operation within a trace, spans of one request share the
+        trace_id and point to their parent through parent_id
+    """
+
+    __slots__ = ('trace_id', 'span_id', 'parent_id', 'name', 'start',
+                 'end', 'attributes', 'status', '_token')
+
+    def __init__(self, name, trace_id=None, parent_id=None,
+                 attributes=None):
+        self.trace_id = trace_id or os.urandom(16).hex()
+        self.span_id = os.urandom(8).hex()
+        self.parent_id = parent_id
+        self.name = name
+        self.start = time.time()
+        self.end = None
+        self.attributes = dict(attributes or {})
+        self.status = 'ok'
+        self._token = None
+
+    def set_attribute(self, key, value) -> None:
+        self.attributes[key] = value
+
+    def set_error(self, error) -> None:
+        self.status = 'error'
+        self.attributes['error'] = str(error)
+
+    def to_dict(self) -> Dict:
+        return {'trace_id': self.trace_id, 'span_id': self.span_id,
+                'parent_id': self.parent_id, 'name': self.name,
+                'start': self.start, 'end': self.end,
+                'duration_ms': round((self.end - self.start) * 1000, 3)
+                if self.end else None,
+                'status': self.status, 'attributes': self.attributes}
+
+
+class RingBufferExporter(object):
+    """
+        Keeps the most recent finished spans in memory for the admin
+        traces endpoint, one buffer per worker process
+    """
+
+    def __init__(self, size=10000):
+        self.buffer = deque(maxlen=size)
+
+    def export(self, span) -> None:
+        self.buffer.append(span.to_dict())
+
+    def spans(self, trace_id=None, limit=None) -> List[Dict]:
+        spans = list(self.buffer)
+        if trace_id:
+            spans = [s for s in spans if s['trace_id'] == trace_id]
+        if limit:
+            spans = spans[-limit:]
+        return spans
+
+
+class JSONLinesExporter(object):
+    """
+        Appends finished spans as JSON lines to a file from a background
+        thread, forked workers start their own thread on first export.
+        The file name may contain {pid}.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._queue = None
+        self._pid = None
+        self._lock = threading.Lock()
+        atexit.register(self.flush)
+
+    def _start(self) -> None:
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._queue = queue.Queue()
+            thread = threading.Thread(target=self._run, args=(self._queue,),
+                                      name='span-exporter', daemon=True)
+            thread.start()
+            self._pid = os.getpid()
+
+    def _run(self, spans) -> None:
+        path = self.path.format(pid=os.getpid())
+        while True:
+            batch = [spans.get()]
+            while True:
+                try:
+                    batch.append(spans.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                with open(path, 'a') as handle:
+                    for item in batch:
+                        handle.write(json.dumps(item, default=str) + '\n')
+            except Exception as e:
+                # spans of a failed batch are dropped, the thread goes on
+                logger.error("could not export %d spans to %s: %s",
+                             len(batch), path, e)
+            finally:
+                for _ in batch:
+                    spans.task_done()
+
+    def export(self, span) -> None:
+        if self._pid != os.getpid():
+            self._start()
+        self._queue.put(span.to_dict())
+
+    def flush(self) -> None:
+        if self._queue is not None and self._pid == os.getpid():
+            self._queue.join()
+
+
+class Tracer(object):
+    """
+        Creates spans and hands finished ones to the exporters, disabled
+        tracers hand out no spans at all
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.exporters = []
+        self.ring_buffer = None
+
+    def configure(self, enabled, ring_size=None, file_path=None) -> None:
+        self.enabled = enabled
+        self.exporters = []
+        self.ring_buffer = None
+        if ring_size:
+            self.ring_buffer = RingBufferExporter(ring_size)
+            self.exporters.append(self.ring_buffer)
+        if file_path:
+            self.exporters.append(JSONLinesExporter(file_path))
+
+    def start_span(self, name, trace_id=None, parent_id=None,
+                   **attributes) -> Optional[Span]:
+        """
+            Starts a span as child of the current span and makes it current,
+            has to be closed with end_span
+        """
+        if not self.enabled:
+            return None
+        parent = _current_span.get()
+        if parent is not None and trace_id is None:
+            trace_id, parent_id = parent.trace_id, parent.span_id
+        span = Span(name, trace_id, parent_id, attributes)
+        span._token = _current_span.set(span)
+        return span
+
+    def end_span(self, span) -> None:
+        if span is None:
+            return
+        span.end = time.time()
+        try:
+            _current_span.reset(span._token)
+        except ValueError:
+            # ended from another context, e.g. flask teardown
+            _current_span.set(None)
+        for exporter in self.exporters:
+            exporter.export(span)
+
+    @contextmanager
+    def span(self, name, **attributes):
+        span = self.start_span(name, **attributes)
+        try:
+            yield span
+        except Exception as e:
+            if span is not None:
+                span.set_error(e)
+            raise
+        finally:
+            self.end_span(span)
+
+
+tracer = Tracer()
+
+
+def current_span() -> Optional[Span]:
+    return _current_span.get()
+
+
+def traced(name):
+    """
+        Decorator running the function inside a span
+    """
+    def decorator(function):
+        @wraps(function)
+        def wrapper(*args, **kwargs):
+            if not tracer.enabled:
+                return function(*args, **kwargs)
+            with tracer.span(name):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def trace_methods(cls):
+    """
+        Class decorator wrapping every db_* method in a span named after
+        the class and method
+    """
+    for attr, value in list(vars(cls).items()):
+        if attr.startswith('db_') and callable(value):
+            setattr(cls, attr, traced('%s.%s' % (cls.__name__, attr))(value))
+    return cls
+
+
+def propagate_context(function):
+    """
+        Binds function to a copy of the calling context so work handed to
+        another thread continues the caller's trace
+    """
+    context = contextvars.copy_context()
+
+    @wraps(function)
+    def wrapper(*args, **kwargs):
+        return context.run(function, *args, **kwargs)
+    return wrapper
+
+
+def _parse_traceparent(header):
+    # W3C trace context: version-trace_id-parent_id-flags
+    parts = (header or '').split('-')
+    if len(parts) == 4 and len(parts[1]) == 32 and len(parts[2]) == 16:
+        return parts[1], parts[2]
+    return None, None
+
+
+def _start_request_span() -> None:
+    trace_id, parent_id = _parse_traceparent(
+        request.headers.get('traceparent'))
+    rule = request.url_rule
+    g.trace_span = tracer.start_span(
+        '%s %s' % (request.method, rule.rule if rule else request.path),
+        trace_id=trace_id, parent_id=parent_id,
+        method=request.method, path=request.path)
+
+
+def _record_status(response):
+    span = g.get('trace_span')
+    if span is not None:
+        span.set_attribute('status_code', response.status_code)
+        response.headers['traceparent'] = '00-%s-%s-01' % (span.trace_id,
+                                                           span.span_id)
+    return response
+
+
+def _end_request_span(error=None) -> None:
+    span = g.pop('trace_span', None)
+    if span is not None:
+        if error is not None:
+            span.set_error(error)
+        user = g.get('current_user')
+        if user:
+            span.set_attribute('user', user['username'])
+        tracer.end_span(span)
+
+
+def setup_tracing(app, enabled, ring_size, file_path) -> Tracer:
+    """
+        Configures the module tracer and opens a root span per request
+        :param app: flask application
+        :param enabled: boolean enabling tracing
+        :param ring_size: number of spans kept in memory, 0 disables
+        :param file_path: JSON lines file spans are appended to, falsy
+                          disables the file exporter
+        :return: the module tracer
+    """
+    tracer.configure(enabled, ring_size, file_path)
+    if enabled:
+        app.before_request(_start_request_span)
+        app.after_request(_record_status)
+        app.teardown_request(_end_request_span)
+    return tracer
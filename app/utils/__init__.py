@@ -2,6 +2,7 @@ import os
 import json
 import uuid
 from app.data_access_layer import RestDB
+from app.data_access_layer import PartitionedRestDB
 from app.data_access_layer import UserRestDB
 from app.response_messages import response
 from flask import jsonify
@@ -9,12 +10,22 @@ from typing import List
 from werkzeug.security import generate_password_hash
 
 
-def get_connection(db_path):
+def get_connection(db_path, partitioned=False, owner=None, changes=None):
     """
         Method to create an object of subclass and create a connection
-        :return : an instantiated object for class RestDB
-    """
-    return RestDB.RestDB(db_path)
+        :param db_path: workspaces db file, or directory of per owner
+                        partitions when partitioned is set
+        :param partitioned: boolean indicating per owner partitioning
+        :param owner: username a partitioned connection is scoped to,
+                      None for admin connections
+        :param changes: ChangeFeed recording the writes of the
+                        connection, None to not record them
+        :return : an instantiated object for class RestDB or
+                  PartitionedRestDB
+    """
+    if partitioned:
+        return PartitionedRestDB.PartitionedRestDB(db_path, owner, changes)
+    return RestDB.RestDB(db_path, changes)
 
 
 def get_connection_users(db_path):
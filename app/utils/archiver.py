@@ -0,0 +1,304 @@
+import os
+import time
+import shutil
+import logging
+import tarfile
+import tempfile
+import threading
+from app.data_access_layer.locking import FileLock
+from app.tracing import tracer
+from app.utils.workspace_lock import operation_key
+from typing import Callable, Iterable, Optional
+
+ARCHIVE_SUFFIX = '.tar.gz'
+# extraction filter of python versions with PEP 706 tarfile filters
+EXTRACT_OPTIONS = {'filter': 'data'} if hasattr(tarfile, 'data_filter') \
+    else {}
+
+logger = logging.getLogger(__name__)
+
+
+def safe_members(tar, root):
+    """
+        Yields the members of a tar archive that extract inside root,
+        skipping absolute paths, paths leaving root, links pointing
+        outside of it and device files
+        :param root: name of the top level directory every member must
+                     be under
+    """
+    for member in tar:
+        name = os.path.normpath(member.name)
+        if os.path.isabs(name) or name.split(os.sep)[0] != root:
+            logger.warning("skipping %s outside of %s", member.name, root)
+            continue
+        if member.issym() or member.islnk():
+            target = os.path.normpath(os.path.join(
+                os.path.dirname(name) if member.issym() else '',
+                member.linkname))
+            if os.path.isabs(target) or target.split(os.sep)[0] != root:
+                logger.warning("skipping link %s to %s", member.name,
+                               member.linkname)
+                continue
+        elif not (member.isfile() or member.isdir()):
+            continue
+        yield member
+
+
+class WorkspaceArchiver(object):
+    """
+        Packs idle workspace directories into compressed tarballs and
+        unpacks them again when a route needs them. Workspaces are
+        archived in least recently used order, by the mtime of their
+        directory which routes touch, once they are idle for idle_days
+        or, while disk usage is above high_watermark, until it is down to
+        low_watermark. Archiving and restoring hold the workspace lock.
+    """
+
+    def __init__(self, workspace_path, archive_path, operations,
+                 idle_days=30, high_watermark=None, low_watermark=None,
+                 compress_level=6):
+        """
+            :param workspace_path: directory of the workspaces
+            :param archive_path: directory the archives are written to
+            :param operations: WorkspaceOperations serializing operations
+                               on a workspace
+            :param idle_days: days without use after which a workspace is
+                              archived, None to only archive on disk
+                              pressure
+            :param high_watermark: fraction of the disk used above which
+                                   recently used workspaces are archived
+                                   too, None disables
+            :param low_watermark: fraction of the disk used at which
+                                  archiving for disk pressure stops
+            :param compress_level: gzip level of the archives
+        """
+        self.workspace_path = workspace_path
+        self.archive_path = archive_path
+        self.operations = operations
+        self.idle_days = idle_days
+        self.high_watermark = high_watermark
+        self.low_watermark = low_watermark if low_watermark is not None \
+            else high_watermark
+        self.compress_level = compress_level
+        self._pid = None
+        self._lock = threading.Lock()
+        if hasattr(os, 'register_at_fork'):
+            os.register_at_fork(after_in_child=self._after_fork)
+
+    def _after_fork(self) -> None:
+        # the sweeping thread is not copied into a child
+        self._lock = threading.Lock()
+
+    def _directory(self, identity) -> str:
+        return os.path.join(self.workspace_path, identity)
+
+    def _archive_file(self, identity) -> str:
+        return os.path.join(self.archive_path, identity + ARCHIVE_SUFFIX)
+
+    def is_archived(self, identity) -> bool:
+        return os.path.exists(self._archive_file(identity))
+
+    def open_archive(self, identity):
+        """
+            Opens the archive of a workspace for reading, it stays readable
+            when the workspace is restored meanwhile
+            :return: binary file object, None when it is not archived
+        """
+        try:
+            return open(self._archive_file(identity), 'rb')
+        except FileNotFoundError:
+            return None
+
+    def touch(self, identity) -> None:
+        """
+            Marks a workspace as just used
+        """
+        try:
+            os.utime(self._directory(identity))
+        except FileNotFoundError:
+            pass
+
+    def usage(self) -> float:
+        """
+            :return: fraction of the disk of the workspaces in use
+        """
+        usage = shutil.disk_usage(self.workspace_path)
+        return usage.used / usage.total
+
+    def archive(self, identity,
+                check: Optional[Callable[[str], bool]] = None) -> bool:
+        """
+            Archives a workspace, with its lock held
+            :param check: callable run with the lock held, the workspace
+                          is only archived when it returns True
+            :return: True when the workspace has been archived
+        """
+        return self.operations.run(
+            identity, operation_key('archive', identity, None),
+            lambda: self._archive(identity, check))
+
+    def _archive(self, identity, check=None) -> bool:
+        directory = self._directory(identity)
+        if not os.path.isdir(directory):
+            return False
+        if check is not None and not check(identity):
+            return False
+        os.makedirs(self.archive_path, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(prefix='.' + identity + '.',
+                                        suffix='.tmp', dir=self.archive_path)
+        try:
+            with tracer.span('workspace.archive', workspace=identity):
+                with os.fdopen(fd, 'wb') as handle:
+                    with tarfile.open(fileobj=handle, mode='w:gz',
+                                      compresslevel=self.compress_level) \
+                            as tar:
+                        tar.add(directory, arcname=identity)
+                    handle.flush()
+                    os.fsync(handle.fileno())
+                os.replace(tmp_path, self._archive_file(identity))
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        shutil.rmtree(directory)
+        return True
+
+    def restore(self, identity) -> bool:
+        """
+            Unpacks an archived workspace, with its lock held, and marks
+            it as just used. Does nothing but touch the workspace when it
+            is not archived.
+            :return: True when the workspace has been restored
+        """
+        restored = False
+        if self.is_archived(identity):
+            restored = self.operations.run(
+                identity, operation_key('restore', identity, None),
+                lambda: self._restore(identity))
+        self.touch(identity)
+        return restored
+
+    def _restore(self, identity) -> bool:
+        directory = self._directory(identity)
+        archive = self._archive_file(identity)
+        if os.path.isdir(directory) or not os.path.exists(archive):
+            return False
+        tmp_path = tempfile.mkdtemp(prefix='.' + identity + '.',
+                                    dir=self.workspace_path)
+        try:
+            with tracer.span('workspace.restore', workspace=identity):
+                with tarfile.open(archive, 'r:*') as tar:
+                    tar.extractall(tmp_path,
+                                   members=safe_members(tar, identity),
+                                   **EXTRACT_OPTIONS)
+                os.replace(os.path.join(tmp_path, identity), directory)
+        finally:
+            shutil.rmtree(tmp_path, ignore_errors=True)
+        os.remove(archive)
+        return True
+
+    def remove(self, identity) -> bool:
+        """
+            Deletes the archive of a workspace
+            :return: True when there was one
+        """
+        try:
+            os.remove(self._archive_file(identity))
+            return True
+        except FileNotFoundError:
+            return False
+
+    def _idle(self, identity, cutoff, pressure) -> bool:
+        """
+            :return: True when a workspace has not been used since cutoff
+                     or the disk is still above low_watermark
+        """
+        try:
+            mtime = os.stat(self._directory(identity)).st_mtime
+        except FileNotFoundError:
+            return False
+        return (cutoff is not None and mtime < cutoff) or \
+            (pressure and self.usage() > self.low_watermark)
+
+    def sweep(self, identities: Iterable[str],
+              archivable: Optional[Callable[[str], bool]] = None) -> int:
+        """
+            Archives the idle workspaces among identities, least recently
+            used first, and more while the disk is above high_watermark.
+            Workspaces are checked again once their lock is held, one
+            used or provisioned meanwhile is left alone.
+            :param identities: workspaces that may be archived
+            :param archivable: callable telling whether a workspace may
+                               still be archived, run with its lock held
+            :return: number of workspaces archived
+        """
+        candidates = []
+        for identity in identities:
+            try:
+                candidates.append((os.stat(self._directory(identity))
+                                   .st_mtime, identity))
+            except FileNotFoundError:
+                continue
+        candidates.sort()
+        cutoff = time.time() - self.idle_days * 86400 \
+            if self.idle_days is not None else None
+        pressure = self.high_watermark is not None and \
+            self.usage() >= self.high_watermark
+        archived = 0
+        for mtime, identity in candidates:
+            if cutoff is None or mtime >= cutoff:
+                # every remaining workspace has been used recently
+                if not pressure or self.usage() <= self.low_watermark:
+                    break
+            try:
+                if self.archive(identity, lambda identity: self._idle(
+                        identity, cutoff, pressure) and
+                        (archivable is None or archivable(identity))):
+                    archived += 1
+            except Exception as e:
+                logger.error("archiving %s failed: %s", identity, e)
+        return archived
+
+    def start(self, candidates: Callable[[], Iterable[str]],
+              interval=3600,
+              archivable: Optional[Callable[[str], bool]] = None) -> None:
+        """
+            Starts a thread sweeping every interval seconds, one worker
+            process of a deployment sweeps at a time. Called in worker
+            processes, never in a master that forks them, a sweep holds
+            workspace locks a child would inherit held
+            :param candidates: callable returning the workspaces that may
+                               be archived
+            :param archivable: callable passed on to sweep
+        """
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            thread = threading.Thread(target=self._run,
+                                      args=(candidates, interval,
+                                            archivable),
+                                      name='workspace-archiver', daemon=True)
+            thread.start()
+            self._pid = os.getpid()
+
+    def _run(self, candidates, interval, archivable) -> None:
+        while True:
+            time.sleep(interval)
+            self.run_once(candidates, archivable)
+
+    def run_once(self, candidates, archivable=None) -> Optional[int]:
+        """
+            Sweeps unless another process is sweeping
+            :return: number of workspaces archived, None when skipped
+        """
+        os.makedirs(self.archive_path, exist_ok=True)
+        lock = FileLock(os.path.join(self.archive_path, '.sweep.lock'))
+        if not lock.acquire(blocking=False):
+            return None
+        try:
+            return self.sweep(candidates(), archivable)
+        except Exception as e:
+            logger.error(e)
+            return None
+        finally:
+            lock.release()
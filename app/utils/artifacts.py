@@ -0,0 +1,68 @@
+import os
+import gzip
+import shutil
+import tempfile
+from typing import List, Optional
+
+# suffix of the precompressed copy written next to an artifact
+GZIP_SUFFIX = '.gz'
+
+
+def precompress(path, level=6) -> Optional[str]:
+    """
+        Writes a gzip copy of a file next to it, through a temporary file
+        renamed into place so readers never see a partial copy
+        :param path: path of the file to compress
+        :param level: gzip compression level
+        :return: path of the compressed copy, None when path is not a file
+    """
+    if not os.path.isfile(path) or path.endswith(GZIP_SUFFIX):
+        return None
+    target = path + GZIP_SUFFIX
+    handle, temp = tempfile.mkstemp(dir=os.path.dirname(path),
+                                    prefix='.' + os.path.basename(path))
+    try:
+        with open(path, 'rb') as source, os.fdopen(handle, 'wb') as raw, \
+                gzip.GzipFile(fileobj=raw, mode='wb', compresslevel=level,
+                              mtime=0) as compressed:
+            shutil.copyfileobj(source, compressed)
+        shutil.copystat(path, temp)
+        os.replace(temp, target)
+    except BaseException:
+        os.unlink(temp)
+        raise
+    return target
+
+
+def precompress_artifacts(paths, level=6) -> List[str]:
+    """
+        Precompresses the outputs of a finished linchpin job, so reads of
+        them do not pay for compressing again. Failures are left to the
+        readers, which fall back to the uncompressed file
+        :param paths: list of file paths
+        :return: list of the compressed copies written
+    """
+    written = []
+    for path in paths:
+        try:
+            target = precompress(path, level)
+        except OSError:
+            continue
+        if target is not None:
+            written.append(target)
+    return written
+
+
+def precompressed(path) -> Optional[str]:
+    """
+        Used by the workspace files route to send the gzip copy as it is
+        :return: path of the gzip copy of a file when it is at least as
+                 new as the file, else None
+    """
+    target = path + GZIP_SUFFIX
+    try:
+        if os.stat(target).st_mtime >= os.stat(path).st_mtime:
+            return target
+    except OSError:
+        pass
+    return None
@@ -0,0 +1,94 @@
+import json
+from concurrent.futures import ThreadPoolExecutor
+from werkzeug.test import EnvironBuilder
+from app.response_messages import errors
+from app.tracing import current_span
+from typing import Dict, List
+
+# environ key carrying the user authenticated by the batch request
+BATCH_USER_KEY = 'restylinchpin.batch_user'
+# methods whose sub-requests may run concurrently
+READ_METHODS = ('GET', 'HEAD')
+
+
+def _sub_response(result) -> Dict:
+    body = result.get_data(as_text=True)
+    if result.is_json:
+        body = json.loads(body) if body else None
+    return {'status': result.status_code,
+            'headers': {'Content-Type': result.content_type},
+            'body': body}
+
+
+def _dispatch(app, sub_request, environ_extra, headers) -> Dict:
+    try:
+        method = sub_request.get('method', 'GET').upper()
+        path = sub_request['path']
+        if not isinstance(path, str) or not path.startswith('/'):
+            raise ValueError(path)
+        builder = EnvironBuilder(
+            path=path, method=method,
+            # sub-responses are embedded in the JSON of the batch
+            headers=dict(sub_request.get('headers') or {},
+                         Accept='application/json', **headers),
+            json=sub_request.get('body'))
+        environ = builder.get_environ()
+        environ.update(environ_extra)
+    except (KeyError, ValueError, TypeError, AttributeError):
+        return {'status': 400, 'headers': {},
+                'body': {'status': errors.ERROR_STATUS,
+                         'message': errors.KEY_ERROR_BATCH_ITEM}}
+    with app.request_context(environ):
+        return _sub_response(app.full_dispatch_request())
+
+
+def dispatch_batch(app, sub_requests, environ_extra, batch_path,
+                   max_parallel) -> List[Dict]:
+    """
+        Dispatches sub-requests through the routes of app. Consecutive
+        reads run concurrently, any other method waits for the
+        sub-requests before it and runs alone, so writes keep the order
+        of the batch.
+        :param app: flask application
+        :param sub_requests: list of {'method', 'path', 'body', 'headers'}
+        :param environ_extra: WSGI environ entries added to every
+                              sub-request, e.g. the authenticated user
+        :param batch_path: path of the batch route, which cannot be nested
+        :param max_parallel: reads running at once
+        :return: list of {'status', 'headers', 'body'} in request order
+    """
+    headers = {}
+    span = current_span()
+    if span is not None:
+        headers['traceparent'] = '00-%s-%s-01' % (span.trace_id,
+                                                  span.span_id)
+    results = [None] * len(sub_requests)
+    with ThreadPoolExecutor(max_workers=max(1, max_parallel),
+                            thread_name_prefix='batch') as executor:
+        reads = []
+        for index, sub_request in enumerate(sub_requests):
+            method = str(sub_request.get('method', 'GET')).upper() \
+                if isinstance(sub_request, dict) else None
+            if method is None or \
+                    str(sub_request.get('path', '')).split('?')[0] == \
+                    batch_path:
+                results[index] = {'status': 400, 'headers': {},
+                                  'body': {'status': errors.ERROR_STATUS,
+                                           'message':
+                                           errors.KEY_ERROR_BATCH_ITEM}}
+                continue
+            if method not in READ_METHODS:
+                for read_index, read in reads:
+                    results[read_index] = read.result()
+                reads = []
+            # sub-requests run on pool threads, which do not share the
+            # application context and flask.g of the batch request
+            future = executor.submit(_dispatch, app, sub_request,
+                                     environ_extra, headers)
+            if method in READ_METHODS:
+                reads.append((index, future))
+            else:
+                results[index] = future.result()
+        for read_index, future in reads:
+            results[read_index] = future.result()
+    return results
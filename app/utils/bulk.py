@@ -0,0 +1,80 @@
+import json
+import queue
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from app.response_messages import errors
+from app.tracing import propagate_context
+from typing import Dict, Iterator, List
+
+logger = logging.getLogger(__name__)
+
+
+def _call(function, *args):
+    try:
+        return function(*args)
+    except Exception as e:
+        logger.error(e)
+        return dict(status=errors.ERROR_STATUS, message=str(e))
+
+
+def stream_ndjson(ready, tasks, max_workers,
+                  finished=None) -> Iterator[str]:
+    """
+        Runs tasks on a thread pool and streams their results as JSON
+        lines in completion order. The tasks are started before the first
+        line is sent, so they finish even when the client goes away.
+        :param ready: list of result dicts known up front, sent first
+        :param tasks: list of callables returning a result dict each
+        :param max_workers: tasks running at once
+        :param finished: callable run once all tasks are done, before the
+                         last result is sent
+        :return: iterator over the lines of the response body
+    """
+    done = queue.Queue()
+    remaining = [len(tasks)]
+    guard = threading.Lock()
+
+    def run(task):
+        result = _call(task)
+        with guard:
+            remaining[0] -= 1
+            last = not remaining[0]
+        if last and finished is not None:
+            _call(finished)
+        done.put(result)
+
+    if not tasks and finished is not None:
+        _call(finished)
+    executor = ThreadPoolExecutor(max_workers=max(1, min(max_workers,
+                                                         len(tasks))),
+                                  thread_name_prefix='bulk')
+    for task in tasks:
+        executor.submit(propagate_context(run), task)
+    executor.shutdown(wait=False)
+
+    def generate():
+        for result in ready:
+            yield json.dumps(result, default=str) + '\n'
+        for _ in tasks:
+            yield json.dumps(done.get(), default=str) + '\n'
+    return generate()
+
+
+def bulk_items(data, key, max_items) -> List[Dict]:
+    """
+        Reads the list of items of a bulk request body
+        :param data: JSON data from the request body
+        :param key: key of the list in data
+        :param max_items: largest accepted list
+        :return: the list of item dicts
+        :raises KeyError: when the list is missing or malformed
+        :raises ValueError: when the list is larger than max_items
+    """
+    items = data[key]
+    if not isinstance(items, list) or \
+            not all(isinstance(item, dict) for item in items):
+        raise KeyError(key)
+    if len(items) > max_items:
+        raise ValueError(errors.BULK_TOO_LARGE % max_items)
+    return items
@@ -0,0 +1,117 @@
+import os
+import errno
+import shutil
+import logging
+import tempfile
+import threading
+from typing import Dict, Iterable
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - non POSIX hosts
+    fcntl = None
+
+# ioctl sharing the extents of a file with another, _IOW(0x94, 9, int)
+FICLONE = 0x40049409
+# errors of filesystems or pairs of files that cannot share extents
+REFLINK_UNSUPPORTED = (errno.EOPNOTSUPP, errno.ENOTTY, errno.EXDEV,
+                       errno.EINVAL, errno.ENOSYS, errno.EPERM)
+
+logger = logging.getLogger(__name__)
+
+# st_dev of the filesystems reflinks failed on, they are not tried again
+_no_reflink = set()
+_no_reflink_lock = threading.Lock()
+
+
+def reflink(src, dst) -> bool:
+    """
+        Creates dst sharing the data blocks of src, copy on write, on
+        filesystems supporting it (btrfs, xfs, ...)
+        :return: True when dst has been created
+    """
+    if fcntl is None:
+        return False
+    device = os.stat(src).st_dev
+    if device in _no_reflink:
+        return False
+    with open(src, 'rb') as source, open(dst, 'wb') as target:
+        try:
+            fcntl.ioctl(target.fileno(), FICLONE, source.fileno())
+            return True
+        except OSError as e:
+            if e.errno not in REFLINK_UNSUPPORTED:
+                raise
+    os.remove(dst)
+    with _no_reflink_lock:
+        _no_reflink.add(device)
+    return False
+
+
+def clone_file(src, dst, hardlinks=True) -> str:
+    """
+        Copies a file the cheapest way available: a reflink, else a hard
+        link when hardlinks is set, else a copy
+        :return: reflink, hardlink or copy
+    """
+    if reflink(src, dst):
+        shutil.copystat(src, dst)
+        return 'reflink'
+    if hardlinks:
+        try:
+            os.link(src, dst)
+            return 'hardlink'
+        except OSError:
+            pass
+    shutil.copy2(src, dst)
+    return 'copy'
+
+
+def clone_tree(src, dst, exclude: Iterable[str] = (),
+               private: Iterable[str] = (), hardlinks=True) -> Dict[str, int]:
+    """
+        Clones the directory src into dst, which must not exist. The tree
+        is built next to dst and renamed into place once complete.
+        :param exclude: names of directories left out at any depth
+        :param private: names of directories whose files are never hard
+                        linked, for files written in place
+        :param hardlinks: boolean allowing hard links when reflinks are
+                          not supported, files of the clone then share
+                          their inode with src and must only be replaced,
+                          never written in place
+        :return: number of files cloned per method
+    """
+    exclude = set(exclude)
+    private = set(private)
+    stats = {'reflink': 0, 'hardlink': 0, 'copy': 0}
+    parent, name = os.path.split(os.path.abspath(dst))
+    tmp_path = tempfile.mkdtemp(prefix='.' + name + '.', dir=parent)
+    directories = []
+    try:
+        for root, dirs, files in os.walk(src):
+            dirs[:] = [d for d in dirs if d not in exclude]
+            target = os.path.join(tmp_path, os.path.relpath(root, src))
+            directories.append((root, target))
+            shared = hardlinks and private.isdisjoint(
+                os.path.relpath(root, src).split(os.sep))
+            for d in dirs:
+                path = os.path.join(root, d)
+                if os.path.islink(path):
+                    os.symlink(os.readlink(path), os.path.join(target, d))
+                else:
+                    os.mkdir(os.path.join(target, d))
+            for f in files:
+                path = os.path.join(root, f)
+                if os.path.islink(path):
+                    os.symlink(os.readlink(path), os.path.join(target, f))
+                else:
+                    stats[clone_file(path, os.path.join(target, f),
+                                     shared)] += 1
+        # children first, creating entries changes the mtime of a parent
+        for root, target in reversed(directories):
+            shutil.copystat(root, target)
+        os.rename(tmp_path, dst)
+    except BaseException:
+        shutil.rmtree(tmp_path, ignore_errors=True)
+        raise
+    return stats
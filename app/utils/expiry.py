@@ -0,0 +1,173 @@
+import os
+import time
+import heapq
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from typing import Callable, Dict, Iterable, Optional, Tuple
+
+# longest sleep of the timer thread, bounds the effect of clock changes
+MAX_SLEEP = 60
+
+logger = logging.getLogger(__name__)
+
+
+def parse_expiry(data, default_ttl=None, max_ttl=None,
+                 now=None) -> Optional[float]:
+    """
+        Reads the expiry of a request body, given as ttl seconds from now
+        or as expires_at, a unix timestamp or an ISO 8601 date
+        :param default_ttl: ttl used when the body has neither, None for
+                            no expiry
+        :param max_ttl: longest ttl accepted, None for no limit
+        :return: the expiry as unix timestamp, None for no expiry
+        :raises ValueError: when the expiry is not valid
+    """
+    now = time.time() if now is None else now
+    ttl = data.get('ttl', default_ttl) if 'expires_at' not in data else None
+    expires_at = data.get('expires_at')
+    if ttl is not None:
+        if isinstance(ttl, bool) or float(ttl) <= 0:
+            raise ValueError(ttl)
+        expires_at = now + float(ttl)
+    elif isinstance(expires_at, str):
+        parsed = datetime.fromisoformat(expires_at.replace('Z', '+00:00'))
+        if parsed.tzinfo is None:
+            parsed = parsed.replace(tzinfo=timezone.utc)
+        expires_at = parsed.timestamp()
+    elif expires_at is not None:
+        if isinstance(expires_at, bool):
+            raise ValueError(expires_at)
+        expires_at = float(expires_at)
+    if expires_at is not None and max_ttl is not None and \
+            expires_at - now > max_ttl:
+        raise ValueError(expires_at)
+    return expires_at
+
+
+class ExpiryScheduler(object):
+    """
+        Calls expire for each workspace when its expiry time is reached.
+        A single thread sleeps until the earliest expiry of a heap, a
+        rescheduled or cancelled workspace leaves its old entry behind to
+        be skipped when it surfaces. Expired workspaces are handed to a
+        small thread pool so a slow expiry does not delay the next one.
+        Every worker process runs its own thread and loads the persisted
+        expiries when it starts, expire must check the workspace is
+        still due since several processes may call it. It is started in
+        the worker processes only, a master process reaps the children
+        of the destroys run by expire.
+    """
+
+    def __init__(self, expire: Callable[[str], None], max_workers=4):
+        """
+            :param expire: callable run with the identity of a workspace
+                           whose expiry time is reached
+            :param max_workers: expiries handled at once
+        """
+        self.expire = expire
+        self.max_workers = max_workers
+        self._loader = None
+        self._pid = None
+        self._reset()
+        if hasattr(os, 'register_at_fork'):
+            os.register_at_fork(after_in_child=self._after_fork)
+
+    def _reset(self) -> None:
+        self._heap = []
+        self._deadlines = {}
+        self._cond = threading.Condition()
+        self._executor = None
+
+    def _after_fork(self) -> None:
+        # the thread is not copied into a forked child and its lock may be
+        # held by it, the child calls start itself to load the expiries
+        self._reset()
+        self._pid = None
+
+    def start(self, loader: Callable[[], Iterable[Tuple[str, float]]]) \
+            -> None:
+        """
+            Starts the timer thread of this process
+            :param loader: callable returning the (identity, expires_at)
+                           of every workspace that may expire, loaded by
+                           the thread before it waits for the first one
+        """
+        with self._cond:
+            if self._pid == os.getpid():
+                return
+            self._loader = loader
+            self._executor = ThreadPoolExecutor(
+                self.max_workers, thread_name_prefix='workspace-expiry')
+            thread = threading.Thread(target=self._run, args=(loader,),
+                                      name='expiry-scheduler', daemon=True)
+            thread.start()
+            self._pid = os.getpid()
+
+    def schedule(self, identity, expires_at) -> None:
+        """
+            Sets or, when expires_at is None, cancels the expiry of a
+            workspace
+        """
+        with self._cond:
+            if expires_at is None:
+                self._deadlines.pop(identity, None)
+                return
+            self._deadlines[identity] = expires_at
+            heapq.heappush(self._heap, (expires_at, identity))
+            if self._heap[0] == (expires_at, identity):
+                self._cond.notify()
+
+    def pending(self) -> Dict[str, float]:
+        """
+            :return: dict of identity to expiry of the scheduled workspaces
+        """
+        with self._cond:
+            return dict(self._deadlines)
+
+    def _load(self, loader) -> None:
+        try:
+            entries = list(loader())
+        except Exception as e:
+            logger.error("could not load workspace expiries: %s", e)
+            return
+        with self._cond:
+            for identity, expires_at in entries:
+                # schedules made while loading are newer
+                self._deadlines.setdefault(identity, expires_at)
+            self._compact()
+            self._cond.notify()
+
+    def _compact(self) -> None:
+        self._heap = [(expires_at, identity) for identity, expires_at
+                      in self._deadlines.items()]
+        heapq.heapify(self._heap)
+
+    def _next_due(self) -> str:
+        with self._cond:
+            while True:
+                if len(self._heap) > 2 * len(self._deadlines) + 64:
+                    self._compact()
+                heap = self._heap
+                while heap and self._deadlines.get(heap[0][1]) != heap[0][0]:
+                    heapq.heappop(heap)
+                now = time.time()
+                if heap and heap[0][0] <= now:
+                    identity = heapq.heappop(heap)[1]
+                    del self._deadlines[identity]
+                    return identity
+                self._cond.wait(min(heap[0][0] - now, MAX_SLEEP)
+                                if heap else MAX_SLEEP)
+
+    def _run(self, loader) -> None:
+        self._load(loader)
+        while True:
+            identity = self._next_due()
+            self._executor.submit(self._expire, identity)
+
+    def _expire(self, identity) -> None:
+        try:
+            self.expire(identity)
+        except Exception as e:
+            logger.error("expiring workspace %s failed: %s", identity, e)
@@ -0,0 +1,201 @@
+import os
+import stat
+import mimetypes
+from email.utils import formatdate, parsedate_to_datetime
+from urllib.parse import quote
+from flask import Response
+from app.middleware import parse_accept_encoding
+from app.utils.artifacts import precompressed
+from typing import Iterator, Optional, Tuple
+
+# size of the reads of ranges served without the file wrapper
+CHUNK_SIZE = 1 << 20
+OFFLOAD_HEADERS = {'x-sendfile': 'X-Sendfile',
+                   'x-accel-redirect': 'X-Accel-Redirect'}
+
+
+def workspace_file(directory, relative) -> Optional[str]:
+    """
+        Resolves a path below a workspace directory, symlinks included
+        :return: real path of the regular file, None when it is missing,
+                 not a regular file or outside of the directory
+    """
+    root = os.path.realpath(directory)
+    path = os.path.realpath(os.path.join(root, relative))
+    if not path.startswith(root + os.sep):
+        return None
+    try:
+        if not stat.S_ISREG(os.stat(path).st_mode):
+            return None
+    except OSError:
+        return None
+    return path
+
+
+def make_etag(st, suffix='') -> str:
+    return '"%x-%x-%x%s"' % (st.st_ino, st.st_size, st.st_mtime_ns, suffix)
+
+
+def _etag_matches(header, etag, weak) -> bool:
+    """
+        :param weak: compare with the weak comparison of If-None-Match
+                     instead of the strong one of If-Match and If-Range
+    """
+    if header.strip() == '*':
+        return True
+    for tag in header.split(','):
+        tag = tag.strip()
+        if tag.startswith('W/'):
+            if not weak:
+                continue
+            tag = tag[2:]
+        if tag == etag:
+            return True
+    return False
+
+
+def _not_after(header, mtime) -> bool:
+    """
+        :return: True when mtime is not after the HTTP date of header,
+                 False when the date is not valid
+    """
+    try:
+        return int(mtime) <= parsedate_to_datetime(header).timestamp()
+    except (TypeError, ValueError, IndexError, OverflowError):
+        return False
+
+
+def check_conditions(headers, etag, mtime) -> Optional[int]:
+    """
+        Evaluates the conditional headers of a GET request, in the order
+        of RFC 9110 section 13.2.2
+        :return: 412 or 304 when the request is answered by that status,
+                 None when the file is to be sent
+    """
+    if 'If-Match' in headers:
+        if not _etag_matches(headers['If-Match'], etag, False):
+            return 412
+    elif 'If-Unmodified-Since' in headers:
+        if not _not_after(headers['If-Unmodified-Since'], mtime):
+            return 412
+    if 'If-None-Match' in headers:
+        if _etag_matches(headers['If-None-Match'], etag, True):
+            return 304
+    elif 'If-Modified-Since' in headers:
+        if _not_after(headers['If-Modified-Since'], mtime):
+            return 304
+    return None
+
+
+def parse_range(header, size) -> Optional[Tuple[int, int]]:
+    """
+        Reads a single byte range, requests for several ranges are served
+        the whole file
+        :return: first and last byte of the range, None for the whole file
+        :raises ValueError: when the range is not satisfiable
+    """
+    unit, _, ranges = (header or '').partition('=')
+    if unit.strip().lower() != 'bytes' or ',' in ranges:
+        return None
+    first, dash, last = (part.strip() for part in ranges.partition('-'))
+    if not dash or not (first or last) or \
+            not (first or '0').isdigit() or not (last or '0').isdigit():
+        return None
+    if not first:
+        # suffix range, the last bytes of the file
+        length = int(last)
+        if not length or not size:
+            raise ValueError(header)
+        return max(size - length, 0), size - 1
+    start = int(first)
+    if last and int(last) < start:
+        return None
+    if start >= size:
+        raise ValueError(header)
+    return start, min(int(last), size - 1) if last else size - 1
+
+
+def _read_range(handle, length, chunk_size) -> Iterator[bytes]:
+    with handle:
+        while length > 0:
+            chunk = handle.read(min(chunk_size, length))
+            if not chunk:
+                return
+            length -= len(chunk)
+            yield chunk
+
+
+def file_response(path, request, offload=None, offload_root=None,
+                  offload_prefix='', max_age=0,
+                  chunk_size=CHUNK_SIZE) -> Response:
+    """
+        Serves a file with conditional and range request support. Bodies
+        reaching the end of the file go through the file wrapper of the
+        server, which gunicorn sends with sendfile without copying them
+        through the worker. The precompressed copy of a file is sent to
+        clients accepting gzip that do not ask for a range.
+        :param path: real path of a regular file
+        :param offload: x-sendfile or x-accel-redirect to leave sending
+                        the file to the proxy in front of the API, None to
+                        send it from the worker
+        :param offload_root: directory whose path is replaced by
+                             offload_prefix in X-Accel-Redirect
+        :param offload_prefix: internal location of offload_root in the
+                               proxy
+        :return: 200, 206, 304, 412 or 416 response
+    """
+    mimetype = mimetypes.guess_type(path)[0] or 'application/octet-stream'
+    st = os.stat(path)
+    if offload:
+        result = Response(mimetype=mimetype)
+        target = path if offload == 'x-sendfile' else offload_prefix + quote(
+            os.path.relpath(path, offload_root).replace(os.sep, '/'))
+        result.headers[OFFLOAD_HEADERS[offload]] = target
+        result.headers['ETag'] = make_etag(st)
+        return result
+    encoding = None
+    if 'Range' not in request.headers:
+        accepted = parse_accept_encoding(request.headers.get(
+            'Accept-Encoding'))
+        compressed = precompressed(path) \
+            if accepted.get('gzip', accepted.get('*', 0)) > 0 else None
+        if compressed is not None:
+            path, encoding = compressed, 'gzip'
+            st = os.stat(path)
+    etag = make_etag(st, '-gzip' if encoding else '')
+    headers = {'ETag': etag, 'Accept-Ranges': 'bytes',
+               'Last-Modified': formatdate(st.st_mtime, usegmt=True),
+               # keeps the compression middleware off the sendfile path
+               'Cache-Control': 'private, no-transform, max-age=%d' %
+               max_age,
+               'Vary': 'Accept-Encoding'}
+    status = check_conditions(request.headers, etag, st.st_mtime)
+    if status is not None:
+        return Response(status=status, headers=headers)
+    size = st.st_size
+    byte_range = None
+    if 'Range' in request.headers and (
+            request.headers.get('If-Range', etag) in
+            (etag, headers['Last-Modified'])):
+        try:
+            byte_range = parse_range(request.headers['Range'], size)
+        except ValueError:
+            headers['Content-Range'] = 'bytes */%d' % size
+            return Response(status=416, headers=headers)
+    start, end = byte_range or (0, size - 1)
+    handle = open(path, 'rb')
+    handle.seek(start)
+    length = end - start + 1
+    file_wrapper = request.environ.get('wsgi.file_wrapper')
+    if end == size - 1 and file_wrapper is not None:
+        body = file_wrapper(handle, chunk_size)
+    else:
+        body = _read_range(handle, length, chunk_size)
+    if encoding:
+        headers['Content-Encoding'] = encoding
+    if byte_range:
+        headers['Content-Range'] = 'bytes %d-%d/%d' % (start, end, size)
+    headers['Content-Length'] = str(max(length, 0))
+    return Response(body, status=206 if byte_range else 200,
+                    mimetype=mimetype, headers=headers,
+                    direct_passthrough=True)
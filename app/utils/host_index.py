@@ -0,0 +1,185 @@
+import os
+import json
+import sqlite3
+import ipaddress
+import threading
+from typing import Dict, Iterable, List, Set, Tuple
+
+# keys of linchpin.latest values indexed as host names
+HOST_KEYS = ('hostname', 'host', 'fqdn', 'dns_name', 'public_dns_name',
+             'private_dns_name', 'server_name', 'instance_name')
+# keys of linchpin.latest values indexed as resource names
+RESOURCE_KEYS = ('name', 'resource_group_name', 'topology_name')
+# keys of linchpin.latest values indexed as providers
+PROVIDER_KEYS = ('resource_group_type', 'provider', 'resource_type', 'role')
+# inventory host variables holding the address ansible connects to
+INVENTORY_ADDRESS_KEYS = ('ansible_host', 'ansible_ssh_host')
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS hosts (
+    identity TEXT NOT NULL,
+    username TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    value TEXT NOT NULL COLLATE NOCASE
+);
+CREATE INDEX IF NOT EXISTS hosts_value ON hosts (value);
+CREATE INDEX IF NOT EXISTS hosts_user_value ON hosts (username, value);
+CREATE INDEX IF NOT EXISTS hosts_identity ON hosts (identity);
+"""
+
+
+def _is_ip(value) -> bool:
+    try:
+        ipaddress.ip_address(value.split('/')[0])
+        return True
+    except ValueError:
+        return False
+
+
+def _walk(node, entries) -> None:
+    if isinstance(node, dict):
+        for key, value in node.items():
+            key = str(key).lower()
+            if isinstance(value, str) and value:
+                if _is_ip(value):
+                    entries.add(('ip', value.split('/')[0]))
+                elif key in HOST_KEYS:
+                    entries.add(('host', value))
+                elif key in RESOURCE_KEYS:
+                    entries.add(('resource', value))
+                elif key in PROVIDER_KEYS:
+                    entries.add(('provider', value))
+            _walk(value, entries)
+    elif isinstance(node, list):
+        for item in node:
+            if isinstance(item, str) and _is_ip(item):
+                entries.add(('ip', item.split('/')[0]))
+            _walk(item, entries)
+
+
+def latest_entries(path) -> Set[Tuple[str, str]]:
+    """
+        Extracts host names, IPs, resource names and providers from a
+        linchpin.latest file
+        :return: set of (kind, value)
+    """
+    entries = set()
+    with open(path, 'r') as handle:
+        _walk(json.load(handle), entries)
+    return entries
+
+
+def inventory_entries(path) -> Set[Tuple[str, str]]:
+    """
+        Extracts the hosts of an INI ansible inventory and the addresses
+        they are reached at
+        :return: set of (kind, value)
+    """
+    entries = set()
+    section_vars = False
+    with open(path, 'r') as handle:
+        for line in handle:
+            line = line.strip()
+            if not line or line[0] in '#;':
+                continue
+            if line.startswith('['):
+                section_vars = line.rstrip(']').endswith(':vars') or \
+                    line.rstrip(']').endswith(':children')
+                continue
+            if section_vars:
+                continue
+            fields = line.split()
+            entries.add(('ip' if _is_ip(fields[0]) else 'host', fields[0]))
+            for field in fields[1:]:
+                key, _, value = field.partition('=')
+                if key in INVENTORY_ADDRESS_KEYS and value:
+                    entries.add(('ip' if _is_ip(value) else 'host', value))
+    return entries
+
+
+class HostIndex(object):
+    """
+        SQLite index of the hosts, IPs, resource names and providers of
+        provisioned workspaces, so they can be searched by prefix without
+        reading every workspace. Each thread uses its own connection, the
+        database is shared by all workers.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+
+    def _connection(self) -> sqlite3.Connection:
+        connection = getattr(self._local, 'connection', None)
+        # connections cannot be used across a fork
+        if connection is None or self._local.pid != os.getpid():
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)),
+                        exist_ok=True)
+            connection = sqlite3.connect(self.path, timeout=30)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.executescript(SCHEMA)
+            self._local.connection = connection
+            self._local.pid = os.getpid()
+        return connection
+
+    def update(self, identity, username, entries: Iterable) -> None:
+        """
+            Replaces the indexed entries of a workspace
+            :param identity: unique uuid_name assigned to the workspace
+            :param username: owner of the workspace
+            :param entries: iterable of (kind, value)
+        """
+        connection = self._connection()
+        with connection:
+            connection.execute('DELETE FROM hosts WHERE identity = ?',
+                               (identity,))
+            connection.executemany(
+                'INSERT INTO hosts (identity, username, kind, value) '
+                'VALUES (?, ?, ?, ?)',
+                [(identity, username, kind, value)
+                 for kind, value in set(entries)])
+
+    def update_files(self, identity, username, latest_path,
+                     inventory_paths) -> None:
+        """
+            Indexes the linchpin.latest and inventory files of a workspace,
+            files that cannot be read or parsed are skipped
+        """
+        entries = set()
+        for path, extract in [(latest_path, latest_entries)] + \
+                [(path, inventory_entries) for path in inventory_paths]:
+            try:
+                entries.update(extract(path))
+            except (OSError, ValueError, UnicodeDecodeError):
+                pass
+        self.update(identity, username, entries)
+
+    def remove(self, identity) -> None:
+        """
+            Drops the indexed entries of a workspace
+        """
+        connection = self._connection()
+        with connection:
+            connection.execute('DELETE FROM hosts WHERE identity = ?',
+                               (identity,))
+
+    def search(self, query, username=None, limit=100) -> List[Dict]:
+        """
+            Finds indexed values starting with query, case insensitively
+            :param username: owner the search is limited to, None for all
+            :param limit: largest number of matches returned
+            :return: list of {value, kind, id, username} sorted by value
+        """
+        pattern = query.replace('\\', '\\\\').replace('%', '\\%') \
+            .replace('_', '\\_') + '%'
+        sql = 'SELECT value, kind, identity, username FROM hosts ' \
+              'WHERE value LIKE ? ESCAPE \'\\\''
+        args = [pattern]
+        if username is not None:
+            sql += ' AND username = ?'
+            args.append(username)
+        sql += ' ORDER BY value LIMIT ?'
+        args.append(limit)
+        rows = self._connection().execute(sql, args).fetchall()
+        return [dict(value=value, kind=kind, id=identity, username=owner)
+                for value, kind, identity, owner in rows]
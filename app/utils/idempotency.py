@@ -0,0 +1,186 @@
+import os
+import time
+import base64
+import hashlib
+import threading
+from collections import OrderedDict
+from functools import wraps
+from flask import request, jsonify, Response
+from app.data_access_layer.locking import FileLock
+from app.data_access_layer.storage import AtomicJSONStorage
+from app.response_messages import errors
+
+IDEMPOTENCY_HEADER = 'Idempotency-Key'
+
+
+class ExpiringStore(object):
+    """
+        In-memory map whose entries expire after a fixed ttl. Entries are
+        kept in insertion order, which is also expiry order, so purging
+        only ever looks at the oldest entries.
+    """
+
+    def __init__(self, ttl, max_entries=10000):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _purge(self, now) -> None:
+        while self._entries:
+            key, (expires, _) = next(iter(self._entries.items()))
+            if expires > now and len(self._entries) <= self.max_entries:
+                break
+            del self._entries[key]
+
+    def get(self, key):
+        now = time.time()
+        with self._lock:
+            self._purge(now)
+            entry = self._entries.get(key)
+            # entries set with an earlier expiry may be behind newer ones
+            return entry[1] if entry is not None and entry[0] > now \
+                else None
+
+    def set(self, key, value, expires=None) -> None:
+        with self._lock:
+            self._entries.pop(key, None)
+            self._entries[key] = (expires or time.time() + self.ttl, value)
+            self._purge(time.time())
+
+
+class IdempotencyStore(object):
+    """
+        Remembers the responses of requests made with an Idempotency-Key.
+        Responses are cached in memory and stored as files under path so
+        every worker process can replay them until the ttl expires. While
+        the first request runs it holds a lock file; retries, in this or
+        another worker, wait for it and replay its response.
+    """
+
+    def __init__(self, path, ttl):
+        self.path = path
+        self.ttl = ttl
+        self.cache = ExpiringStore(ttl)
+        self._guard = threading.Lock()
+        self._in_flight = {}
+        self._writes = 0
+
+    def _file(self, digest, suffix) -> str:
+        return os.path.join(self.path, digest + suffix)
+
+    def lookup(self, digest):
+        stored = self.cache.get(digest)
+        if stored is not None:
+            return stored
+        stored = AtomicJSONStorage(self._file(digest, '.json')).read()
+        if stored is None or stored['expires'] < time.time():
+            return None
+        self.cache.set(digest, stored, stored['expires'])
+        return stored
+
+    def save(self, digest, stored) -> None:
+        stored['expires'] = time.time() + self.ttl
+        AtomicJSONStorage(self._file(digest, '.json')).write(stored)
+        self.cache.set(digest, stored, stored['expires'])
+        self._writes += 1
+        if self._writes % 100 == 0:
+            self.sweep()
+
+    def sweep(self) -> None:
+        """
+            Removes stored responses whose ttl has expired
+        """
+        cutoff = time.time() - self.ttl
+        for entry in os.scandir(self.path):
+            try:
+                if entry.stat().st_mtime < cutoff:
+                    os.remove(entry.path)
+            except FileNotFoundError:
+                pass
+
+    def run(self, digest, function):
+        """
+            Returns the stored response for digest, or runs function once
+            and stores its response
+            :param digest: scoped hash of the Idempotency-Key
+            :param function: callable building the stored response dict,
+                             responses flagged failed are not stored so
+                             the request can be retried with the same key
+            :return: tuple of the stored response dict and a boolean that
+                     is True when it was replayed
+        """
+        stored = self.lookup(digest)
+        if stored is not None:
+            return stored, True
+        with self._guard:
+            event = self._in_flight.get(digest)
+            owner = event is None
+            if owner:
+                event = self._in_flight[digest] = threading.Event()
+        if not owner:
+            event.wait()
+            stored = self.lookup(digest)
+            if stored is not None:
+                return stored, True
+            return self.run(digest, function)
+        try:
+            os.makedirs(self.path, exist_ok=True)
+            with FileLock(self._file(digest, '.lock')):
+                stored = self.lookup(digest)
+                if stored is not None:
+                    return stored, True
+                stored = function()
+                if stored['status'] < 500 and not stored.pop('failed'):
+                    self.save(digest, stored)
+                return stored, False
+        finally:
+            with self._guard:
+                del self._in_flight[digest]
+            event.set()
+
+
+def idempotent(store):
+    """
+        Decorator for POST routes creating workspaces or provisioning,
+        requests with an Idempotency-Key header are run once per user,
+        route and key, retries get the original response replayed
+        :param store: IdempotencyStore keeping the responses
+    """
+    def decorator(function):
+        @wraps(function)
+        def decorated(current_user, *args, **kwargs):
+            key = request.headers.get(IDEMPOTENCY_HEADER)
+            if not key:
+                return function(current_user, *args, **kwargs)
+            # the path scopes keys to the workspace or user of the route
+            digest = hashlib.sha256('\0'.join(
+                (current_user['username'], request.endpoint, request.path,
+                 key)).encode('utf-8')).hexdigest()
+            fingerprint = hashlib.sha256(request.get_data()).hexdigest()
+
+            def execute():
+                result = function(current_user, *args, **kwargs)
+                # errors are answered with 200 and an error status body
+                body = result.get_json(silent=True) if result.is_json \
+                    else None
+                return {'failed': isinstance(body, dict) and
+                        body.get('status') == errors.ERROR_STATUS,
+                        'fingerprint': fingerprint,
+                        'status': result.status_code,
+                        'mimetype': result.mimetype,
+                        'body': base64.b64encode(result.get_data())
+                        .decode('ascii')}
+
+            stored, replayed = store.run(digest, execute)
+            if stored['fingerprint'] != fingerprint:
+                return jsonify(status=errors.ERROR_STATUS,
+                               message=errors.IDEMPOTENCY_KEY_REUSED)
+            result = Response(base64.b64decode(stored['body']),
+                              status=stored['status'],
+                              mimetype=stored['mimetype'])
+            if replayed:
+                result.headers['Idempotent-Replayed'] = 'true'
+            return result
+        return decorated
+    return decorator
@@ -0,0 +1,116 @@
+import os
+import time
+import uuid
+from app.data_access_layer.storage import AtomicJSONStorage
+from typing import Dict, List, Optional
+
+
+class JobRegistry(object):
+    """
+        Keeps one JSON file per running linchpin job under path so any
+        worker process can list the jobs of a deployment and ask for one
+        to be cancelled. Cancelling creates a marker file next to the
+        record, the worker running the job polls for it and terminates
+        the process group.
+    """
+
+    def __init__(self, path):
+        self.path = path
+
+    def _file(self, job_id, suffix='.json') -> str:
+        return os.path.join(self.path, job_id + suffix)
+
+    @staticmethod
+    def new_job(action, identity, username) -> Dict:
+        """
+            Creates the record of a job, registered once saved
+            :param action: linchpin action of the job
+            :param identity: unique uuid_name of the workspace acted on
+            :param username: username of the user starting the job
+            :return: the job record
+        """
+        return {'id': uuid.uuid4().hex, 'action': action,
+                'workspace': identity, 'username': username,
+                'status': 'running', 'owner_pid': os.getpid(), 'pid': None,
+                'created': time.time(), 'started': None}
+
+    def save(self, job) -> None:
+        os.makedirs(self.path, exist_ok=True)
+        AtomicJSONStorage(self._file(job['id'])).write(job)
+
+    def get(self, job_id) -> Optional[Dict]:
+        if not job_id or os.sep in job_id or job_id.startswith('.'):
+            return None
+        return AtomicJSONStorage(self._file(job_id)).read()
+
+    def remove(self, job_id) -> None:
+        for suffix in ('.json', '.cancel'):
+            try:
+                os.remove(self._file(job_id, suffix))
+            except FileNotFoundError:
+                pass
+
+    def cancelled(self, job_id) -> bool:
+        return os.path.exists(self._file(job_id, '.cancel'))
+
+    def cancel(self, job_id) -> None:
+        """
+            Marks a job cancelled, the worker running it terminates it
+        """
+        open(self._file(job_id, '.cancel'), 'a').close()
+
+    def list(self, username=None) -> List[Dict]:
+        """
+            Lists registered jobs, dropping records left behind by dead
+            worker processes
+            :param username: only list jobs of this user, None for all
+            :return: job records ordered by creation time
+        """
+        if not os.path.isdir(self.path):
+            return []
+        jobs = []
+        names = os.listdir(self.path)
+        for name in names:
+            if name.endswith('.cancel') and \
+                    name[:-len('.cancel')] + '.json' not in names:
+                # cancelled after the job finished
+                self.remove(name[:-len('.cancel')])
+            if not name.endswith('.json') or name.startswith('.'):
+                continue
+            job = self.get(name[:-len('.json')])
+            if job is None:
+                continue
+            if not _alive(job.get('owner_pid')):
+                self.remove(job['id'])
+                continue
+            if username is None or job['username'] == username:
+                job['cancelled'] = self.cancelled(job['id'])
+                jobs.append(job)
+        return sorted(jobs, key=lambda job: job['created'])
+
+    def position(self, job) -> int:
+        """
+            Returns the 1 based position of a queued job among the jobs
+            queued in the same worker process, in dispatch order. Queues
+            are per process, jobs of other workers compete for free slots
+            and are not ordered against this one.
+        """
+        if job.get('status') != 'queued':
+            return 0
+        key = (job['priority'], job['tag'])
+        return 1 + sum(1 for other in self.list()
+                       if other['status'] == 'queued' and
+                       other.get('owner_pid') == job.get('owner_pid') and
+                       (other['priority'], other['tag']) < key)
+
+
+def _alive(pid) -> bool:
+    if pid is None:
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
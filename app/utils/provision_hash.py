@@ -0,0 +1,66 @@
+import os
+import json
+import hashlib
+from app.utils.validation import TOPOLOGY_FOLDER, LAYOUT_FOLDER, \
+    load_document
+from typing import List
+
+
+def referenced_files(pinfile_path) -> List[str]:
+    """
+        Lists the topology and layout files a PinFile references by name,
+        falls back to every file of the topologies and layouts folders when
+        the PinFile cannot be parsed, e.g. when it is a template
+        :param pinfile_path: path of the PinFile
+        :return: sorted list of existing file paths
+    """
+    base = os.path.dirname(pinfile_path)
+    try:
+        targets = load_document(pinfile_path)
+        if not isinstance(targets, dict):
+            raise ValueError(pinfile_path)
+        files = set()
+        for target in targets.values():
+            if not isinstance(target, dict):
+                continue
+            for key, folder in (('topology', TOPOLOGY_FOLDER),
+                                ('layout', LAYOUT_FOLDER)):
+                if isinstance(target.get(key), str):
+                    files.add(os.path.join(base, folder, target[key]))
+    except Exception:
+        files = set()
+        for folder in (TOPOLOGY_FOLDER, LAYOUT_FOLDER):
+            for root, _, names in os.walk(os.path.join(base, folder)):
+                files.update(os.path.join(root, name) for name in names)
+    return sorted(f for f in files if os.path.isfile(f))
+
+
+def _update_with_file(digest, path) -> None:
+    digest.update(path.encode('utf-8') + b'\0')
+    with open(path, 'rb') as handle:
+        for chunk in iter(lambda: handle.read(65536), b''):
+            digest.update(chunk)
+    digest.update(b'\0')
+
+
+def hash_provision_inputs(pinfile_path, creds_path, cmd) -> str:
+    """
+        Hashes everything a linchpin up run depends on: the PinFile, the
+        topology and layout files it references, the credential files and
+        the command built from the request
+        :param pinfile_path: path of the PinFile
+        :param creds_path: credentials folder passed to linchpin
+        :param cmd: list of the command and its arguments
+        :return: hex digest of the inputs
+    """
+    digest = hashlib.sha256()
+    digest.update(json.dumps(cmd).encode('utf-8') + b'\0')
+    _update_with_file(digest, pinfile_path)
+    for path in referenced_files(pinfile_path):
+        _update_with_file(digest, path)
+    if os.path.isdir(creds_path):
+        for name in sorted(os.listdir(creds_path)):
+            path = os.path.join(creds_path, name)
+            if os.path.isfile(path):
+                _update_with_file(digest, path)
+    return digest.hexdigest()
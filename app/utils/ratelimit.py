@@ -0,0 +1,147 @@
+import os
+import math
+import time
+import threading
+from collections import OrderedDict
+from flask import jsonify
+from app.response_messages import errors
+
+# endpoints starting linchpin jobs
+PROVISION_ENDPOINTS = ('linchpin_init', 'linchpin_fetch_workspace',
+                       'linchpin_up', 'linchpin_destroy',
+                       'linchpin_init_bulk', 'linchpin_destroy_bulk')
+# provisioning endpoints freeing resources, rate limited but never shed
+DESTROY_ENDPOINTS = ('linchpin_destroy', 'linchpin_destroy_bulk')
+
+
+def _name(endpoint) -> str:
+    return endpoint.rsplit('.', 1)[-1] if endpoint else ''
+
+
+def route_class(endpoint, method) -> str:
+    """
+        Classifies a request for rate limiting
+        :param endpoint: flask endpoint of the request
+        :param method: HTTP method of the request
+        :return: provision, read or write
+    """
+    if _name(endpoint) in PROVISION_ENDPOINTS:
+        return 'provision'
+    return 'read' if method in ('GET', 'HEAD') else 'write'
+
+
+class RateLimiter(object):
+    """
+        Token buckets keyed by api key and route class. A bucket holds up
+        to burst tokens and refills at rate tokens per second, each
+        request takes one. Buckets are kept in LRU order so memory stays
+        bounded by max_keys and every request costs O(1). They live in
+        the memory of one worker process, each worker limits on its own.
+    """
+
+    def __init__(self, limits, max_keys=100000):
+        """
+            :param limits: dict of route class to {'rate', 'burst'},
+                           classes left out are not limited
+            :param max_keys: buckets kept before the least recently used
+                             ones are dropped
+        """
+        self.limits = limits or {}
+        for klass, limit in self.limits.items():
+            if limit and limit['rate'] <= 0:
+                raise ValueError("rate of %s must be positive" % klass)
+        self.max_keys = max_keys
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+
+    def acquire(self, key, klass) -> float:
+        """
+            Takes a token from the bucket of key and klass
+            :return: 0 when allowed, else seconds until a token is free
+        """
+        limit = self.limits.get(klass)
+        if not limit:
+            return 0
+        rate, burst = limit['rate'], limit.get('burst', 1)
+        now = time.monotonic()
+        with self._lock:
+            bucket = self._buckets.pop((key, klass), None)
+            if bucket is None:
+                tokens = burst
+            else:
+                tokens = min(burst, bucket[0] + (now - bucket[1]) * rate)
+            allowed = tokens >= 1
+            if allowed:
+                tokens -= 1
+            self._buckets[(key, klass)] = (tokens, now)
+            if len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+        return 0 if allowed else (1 - tokens) / rate
+
+
+class AdmissionControl(object):
+    """
+        Rejects requests over their rate limit with 429 and, while the
+        linchpin job backlog of the deployment is above max_jobs, sheds
+        provisioning requests with 503. Both carry a Retry-After header.
+        Destroys are never shed, they shrink the backlog of resources.
+    """
+
+    def __init__(self, limiter, jobs_path, max_jobs=None, retry_after=30,
+                 refresh_interval=1.0):
+        """
+            :param limiter: RateLimiter of the api keys
+            :param jobs_path: directory of the linchpin job registry
+            :param max_jobs: queued and running jobs at which provisioning
+                             requests are shed, None disables shedding
+            :param retry_after: seconds clients are asked to wait when shed
+            :param refresh_interval: seconds the job count is cached for
+        """
+        self.limiter = limiter
+        self.jobs_path = jobs_path
+        self.max_jobs = max_jobs
+        self.retry_after = retry_after
+        self.refresh_interval = refresh_interval
+        self._count = (0, -refresh_interval)
+        self._lock = threading.Lock()
+
+    def job_count(self) -> int:
+        """
+            Number of registered linchpin jobs of all workers, cached for
+            refresh_interval seconds
+        """
+        now = time.monotonic()
+        count, checked = self._count
+        if now - checked < self.refresh_interval:
+            return count
+        with self._lock:
+            try:
+                count = sum(1 for name in os.listdir(self.jobs_path)
+                            if name.endswith('.json') and
+                            not name.startswith('.'))
+            except FileNotFoundError:
+                count = 0
+            self._count = (count, now)
+        return count
+
+    @staticmethod
+    def _reject(message, status, retry_after):
+        result = jsonify(status=status, message=message)
+        result.status_code = status
+        result.headers['Retry-After'] = str(max(1, math.ceil(retry_after)))
+        return result
+
+    def check(self, api_key, endpoint, method):
+        """
+            :return: None when the request is admitted, else the 429 or
+                     503 response to send
+        """
+        klass = route_class(endpoint, method)
+        if klass == 'provision' and self.max_jobs and \
+                _name(endpoint) not in DESTROY_ENDPOINTS and \
+                self.job_count() >= self.max_jobs:
+            return self._reject(errors.OVERLOADED, 503, self.retry_after)
+        wait = self.limiter.acquire(api_key, klass)
+        if wait:
+            return self._reject(errors.RATE_LIMITED, 429, wait)
+        return None
@@ -0,0 +1,182 @@
+import os
+import time
+import signal
+import logging
+import subprocess
+from flask import g, has_app_context
+from app.logs import add_subprocess_time
+from app.response_messages import errors
+from app.tracing import tracer
+from app.utils.jobs import JobRegistry
+
+try:
+    import resource
+except ImportError:  # pragma: no cover, not available on windows
+    resource = None
+
+LINCHPIN_ACTIONS = ('init', 'fetch', 'up', 'destroy')
+
+# rlimits config keys
+RLIMITS = {'cpu': 'RLIMIT_CPU', 'memory': 'RLIMIT_AS',
+           'nofile': 'RLIMIT_NOFILE', 'nproc': 'RLIMIT_NPROC'}
+
+logger = logging.getLogger(__name__)
+
+
+class JobTerminated(Exception):
+    """
+        Raised when a linchpin job is killed for exceeding its timeout or
+        because it was cancelled
+    """
+
+
+def get_action(cmd) -> str:
+    """
+        Returns the linchpin action of a command list built by utils
+    """
+    return next((arg for arg in cmd if arg in LINCHPIN_ACTIONS), None)
+
+
+class LinchpinRunner(object):
+    """
+        Runs linchpin commands as jobs in their own process group with a
+        wall clock timeout per action and optional rlimits. Running jobs
+        are registered in a JobRegistry so they can be listed and
+        cancelled from any worker process.
+    """
+
+    def __init__(self, jobs_path, timeouts=None, rlimits=None,
+                 kill_grace=10, poll_interval=0.5, scheduler=None):
+        """
+            :param jobs_path: directory of the job registry
+            :param timeouts: dict of action to seconds, missing or falsy
+                             actions run without timeout
+            :param rlimits: dict of cpu, memory, nofile or nproc limits
+                            applied to each linchpin process
+            :param kill_grace: seconds between SIGTERM and SIGKILL
+            :param poll_interval: seconds between cancellation checks
+            :param scheduler: FairScheduler admitting jobs, None runs
+                              every job right away
+        """
+        unknown = set(rlimits or {}) - set(RLIMITS)
+        if unknown:
+            raise ValueError("unknown linchpin_rlimits: %s" %
+                             ', '.join(sorted(unknown)))
+        self.jobs = JobRegistry(jobs_path)
+        self.timeouts = timeouts or {}
+        self.rlimits = rlimits or {}
+        self.kill_grace = kill_grace
+        self.poll_interval = poll_interval
+        self.scheduler = scheduler
+
+    def _apply_rlimits(self, pid) -> None:
+        if not self.rlimits:
+            return
+        if resource is None or not hasattr(resource, 'prlimit'):
+            logger.warning("rlimits are not supported on this platform")
+            return
+        for key, value in self.rlimits.items():
+            limit = getattr(resource, RLIMITS[key])
+            try:
+                # set from the parent, preexec_fn is unsafe with threads
+                resource.prlimit(pid, limit, (value, value))
+            except (OSError, ValueError) as e:
+                logger.warning("could not set %s limit of %s: %s",
+                               key, pid, e)
+
+    def _kill(self, process) -> None:
+        """
+            Terminates the process group of process, SIGKILL follows
+            SIGTERM after the grace period
+        """
+        for sig, wait in ((signal.SIGTERM, self.kill_grace),
+                          (signal.SIGKILL, None)):
+            try:
+                os.killpg(process.pid, sig)
+            except ProcessLookupError:
+                return
+            try:
+                process.communicate(timeout=wait)
+                if sig == signal.SIGTERM:
+                    # reap children left behind in the group
+                    os.killpg(process.pid, signal.SIGKILL)
+                return
+            except subprocess.TimeoutExpired:
+                continue
+            except ProcessLookupError:
+                return
+
+    def _wait(self, process, job, timeout) -> None:
+        deadline = time.monotonic() + timeout if timeout else None
+        while True:
+            wait = self.poll_interval
+            if deadline is not None:
+                wait = min(wait, max(deadline - time.monotonic(), 0))
+            try:
+                process.communicate(timeout=wait)
+                return
+            except subprocess.TimeoutExpired:
+                pass
+            if self.jobs.cancelled(job['id']):
+                self._kill(process)
+                raise JobTerminated(errors.JOB_CANCELLED % job['id'])
+            if deadline is not None and time.monotonic() >= deadline:
+                self._kill(process)
+                raise JobTerminated(errors.JOB_TIMEOUT %
+                                    (job['action'], timeout))
+
+    def run(self, cmd, identity=None, username=None) -> subprocess.Popen:
+        """
+            Runs a linchpin command to completion inside a tracing span
+            once the scheduler admits it, its wall time is added to the
+            access log entry of the current request
+            :param cmd: list of the command and its arguments
+            :param identity: unique uuid_name of the workspace acted on
+            :param username: user the job is scheduled for, defaults to
+                             the user of the current request
+            :return: the finished process, returncode is set
+        """
+        action = get_action(cmd)
+        if username is None and has_app_context():
+            user = g.get('current_user')
+            username = user['username'] if user else None
+        job = self.jobs.new_job(action, identity, username)
+        try:
+            if self.scheduler is not None:
+                self.scheduler.enqueue(job)
+                try:
+                    self.jobs.save(job)
+                except BaseException:
+                    # the job would hold its queue entry or slots forever
+                    self.scheduler.discard(job)
+                    raise
+                with tracer.span('linchpin.queued', action=action,
+                                 workspace=identity, job=job['id']):
+                    if not self.scheduler.wait(
+                            job, lambda: self.jobs.cancelled(job['id'])):
+                        raise JobTerminated(errors.JOB_CANCELLED %
+                                            job['id'])
+            try:
+                return self._execute(cmd, job)
+            finally:
+                if self.scheduler is not None:
+                    self.scheduler.release(job)
+        finally:
+            self.jobs.remove(job['id'])
+
+    def _execute(self, cmd, job) -> subprocess.Popen:
+        with tracer.span('linchpin', action=job['action'],
+                         workspace=job['workspace'], job=job['id']) as span:
+            start = time.perf_counter()
+            try:
+                output = subprocess.Popen(cmd, stdout=subprocess.PIPE,
+                                          start_new_session=True)
+                self._apply_rlimits(output.pid)
+                job.update(pid=output.pid, started=time.time())
+                self.jobs.save(job)
+                self._wait(output, job, self.timeouts.get(job['action']))
+            finally:
+                add_subprocess_time(time.perf_counter() - start)
+            if span is not None:
+                span.set_attribute('exit_code', output.returncode)
+        return output
@@ -0,0 +1,165 @@
+import os
+import time
+import threading
+from urllib.parse import quote
+from app.data_access_layer.locking import FileLock
+
+# lower classes are dispatched first, destroy releases resources
+DEFAULT_PRIORITIES = {'destroy': 0, 'init': 1, 'fetch': 1, 'up': 2}
+
+
+class FairScheduler(object):
+    """
+        Admits linchpin jobs under a global and a per-user concurrency cap
+        shared by all worker processes. Waiting jobs are ordered by
+        priority class, then by a virtual clock tag: every job of a user
+        advances the user's clock by quantum / weight seconds, so users
+        with many queued jobs are interleaved with users submitting few.
+        Running slots are held as locks on slot files, a slot of a
+        crashed worker is freed with its process. The queue and the
+        clocks are kept per worker process: the ordering holds among the
+        jobs of one worker, while workers take free slots in no
+        particular order.
+    """
+
+    def __init__(self, path, max_running=None, max_per_user=None,
+                 weights=None, priorities=None, quantum=60,
+                 poll_interval=0.5):
+        """
+            :param path: directory of the slot files
+            :param max_running: jobs running at once, None for no limit
+            :param max_per_user: jobs of one user running at once, None
+                                 for no limit
+            :param weights: dict of username to share weight, default 1
+            :param priorities: dict of action to priority class
+            :param quantum: seconds a job advances its user's clock by
+            :param poll_interval: seconds between checks for slots freed
+                                  by other processes and cancellations
+        """
+        self.path = path
+        self.max_running = max_running
+        self.max_per_user = max_per_user
+        self.weights = weights or {}
+        self.priorities = dict(DEFAULT_PRIORITIES, **(priorities or {}))
+        self.quantum = quantum
+        self.poll_interval = poll_interval
+        self._condition = threading.Condition()
+        self._queue = []
+        self._clocks = {}
+        self._running = {}
+        self._slots = {}
+
+    def enqueue(self, job) -> None:
+        """
+            Sets the priority and tag of a job and queues it
+        """
+        username = job['username'] or ''
+        with self._condition:
+            weight = self.weights.get(username, 1)
+            tag = max(time.time(), self._clocks.get(username, 0)) + \
+                self.quantum / weight
+            self._clocks[username] = tag
+            job['priority'] = self.priorities.get(job['action'],
+                                                  max(self.priorities
+                                                      .values()))
+            job['tag'] = tag
+            job['status'] = 'queued'
+            self._queue.append(job)
+
+    def _take_slot(self, name, size) -> FileLock:
+        for index in range(size):
+            lock = FileLock(os.path.join(self.path, '%s.%d.slot' %
+                                         (name, index)))
+            if lock.acquire(blocking=False):
+                return lock
+        return None
+
+    def _take_slots(self, job) -> str:
+        """
+            Takes the global and user slots of a job
+            :return: None when taken, else the name of the full pool
+        """
+        locks = []
+        for name, size in (('global', self.max_running),
+                           ('user-' + quote(job['username'] or '', safe=''),
+                            self.max_per_user)):
+            if not size:
+                continue
+            lock = self._take_slot(name, size)
+            if lock is None:
+                for taken in locks:
+                    taken.release()
+                return name
+            locks.append(lock)
+        self._slots[job['id']] = locks
+        return None
+
+    def _dispatch(self) -> None:
+        """
+            Starts queued jobs in priority and tag order while slots are
+            free, jobs of users at their cap are passed over
+        """
+        dispatched = False
+        for job in sorted(self._queue,
+                          key=lambda job: (job['priority'], job['tag'])):
+            username = job['username']
+            if self.max_per_user and \
+                    self._running.get(username, 0) >= self.max_per_user:
+                continue
+            full = self._take_slots(job)
+            if full == 'global':
+                break
+            if full is not None:
+                continue
+            self._queue.remove(job)
+            self._running[username] = self._running.get(username, 0) + 1
+            job['status'] = 'running'
+            dispatched = True
+        if dispatched:
+            self._condition.notify_all()
+
+    def wait(self, job, cancelled) -> bool:
+        """
+            Blocks until the job is dispatched
+            :param job: job queued with enqueue
+            :param cancelled: callable returning True once the job has
+                              been cancelled
+            :return: True when dispatched, False when cancelled while
+                     waiting, the job is dequeued either way
+        """
+        os.makedirs(self.path, exist_ok=True)
+        with self._condition:
+            while True:
+                self._dispatch()
+                if job['status'] == 'running':
+                    return True
+                self._condition.wait(self.poll_interval)
+                if job['status'] != 'running' and cancelled():
+                    self._queue.remove(job)
+                    self._condition.notify_all()
+                    return False
+
+    def discard(self, job) -> None:
+        """
+            Dequeues a job that will not wait for its turn, or frees its
+            slots when another waiting job dispatched it meanwhile
+        """
+        with self._condition:
+            if job in self._queue:
+                self._queue.remove(job)
+                self._condition.notify_all()
+                return
+        self.release(job)
+
+    def release(self, job) -> None:
+        """
+            Frees the slots of a finished job and wakes the waiting jobs
+        """
+        with self._condition:
+            for lock in self._slots.pop(job['id'], []):
+                lock.release()
+            username = job['username']
+            self._running[username] -= 1
+            if not self._running[username]:
+                del self._running[username]
+            self._condition.notify_all()
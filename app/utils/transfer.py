@@ -0,0 +1,288 @@
+import os
+import stat
+import zlib
+import shutil
+import logging
+import tarfile
+import tempfile
+from typing import Dict, Iterable, Iterator, Optional
+
+# size of the reads from disk and of the chunks sent to clients
+CHUNK_SIZE = 1 << 20
+BLOCK = tarfile.BLOCKSIZE
+# largest pax or GNU long name header, tarfile reads them into memory
+MAX_HEADER_SIZE = 1 << 20
+
+logger = logging.getLogger(__name__)
+
+
+class ArchiveError(ValueError):
+    """
+        Raised when an uploaded archive is malformed, has members leaving
+        its directory or is larger than allowed
+    """
+
+
+def _tarinfo(path, arcname) -> Optional[tarfile.TarInfo]:
+    """
+        :return: the tar header of a directory, regular file or symlink,
+                 None for other file types
+    """
+    st = os.lstat(path)
+    info = tarfile.TarInfo(arcname)
+    info.mode = stat.S_IMODE(st.st_mode)
+    info.mtime = int(st.st_mtime)
+    info.uid, info.gid = st.st_uid, st.st_gid
+    if stat.S_ISREG(st.st_mode):
+        info.size = st.st_size
+    elif stat.S_ISDIR(st.st_mode):
+        info.type = tarfile.DIRTYPE
+    elif stat.S_ISLNK(st.st_mode):
+        info.type = tarfile.SYMTYPE
+        info.linkname = os.readlink(path)
+    else:
+        return None
+    return info
+
+
+def _file_blocks(path, size, chunk_size) -> Iterator[bytes]:
+    """
+        Yields the content of a file as announced in its header: a file
+        truncated meanwhile is padded with zeros, a file that grew is cut
+    """
+    remaining = size
+    with open(path, 'rb') as handle:
+        while remaining:
+            chunk = handle.read(min(chunk_size, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+    if remaining:
+        yield bytes(remaining)
+    if size % BLOCK:
+        yield bytes(BLOCK - size % BLOCK)
+
+
+def tar_stream(directory, arcname,
+               chunk_size=CHUNK_SIZE) -> Iterator[bytes]:
+    """
+        Yields a tar archive of directory as it is read, the archive is
+        never held in memory or on disk. Files changed while they are
+        read are archived with the size they had when reached.
+        :param arcname: name of the directory in the archive
+    """
+    for root, dirs, files in os.walk(directory):
+        relative = os.path.relpath(root, directory)
+        base = arcname if relative == os.curdir else \
+            arcname + '/' + relative.replace(os.sep, '/')
+        if relative == os.curdir:
+            yield _tarinfo(root, base).tobuf(tarfile.PAX_FORMAT, 'utf-8',
+                                             'surrogateescape')
+        dirs.sort()
+        for name in sorted(dirs + files):
+            path = os.path.join(root, name)
+            try:
+                info = _tarinfo(path, base + '/' + name)
+            except FileNotFoundError:
+                continue
+            if info is None:
+                continue
+            yield info.tobuf(tarfile.PAX_FORMAT, 'utf-8', 'surrogateescape')
+            if info.isreg():
+                yield from _file_blocks(path, info.size, chunk_size)
+    # end of archive marker
+    yield bytes(2 * BLOCK)
+
+
+def coalesce(chunks: Iterable[bytes], size=CHUNK_SIZE) -> Iterator[bytes]:
+    """
+        Joins small chunks, headers of small files, into chunks of about
+        size bytes so they are not written to the socket one by one
+    """
+    pending, length = [], 0
+    for chunk in chunks:
+        pending.append(chunk)
+        length += len(chunk)
+        if length >= size:
+            yield pending[0] if len(pending) == 1 else b''.join(pending)
+            pending, length = [], 0
+    if pending:
+        yield b''.join(pending)
+
+
+def gzip_stream(chunks: Iterable[bytes], level=1) -> Iterator[bytes]:
+    """
+        Yields chunks compressed into a single gzip member
+    """
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def export_workspace(directory, arcname, compress_level=None,
+                     chunk_size=CHUNK_SIZE) -> Iterator[bytes]:
+    """
+        :param compress_level: gzip level of the archive, None for a plain
+                               tar
+        :return: iterator over the chunks of a tar archive of directory
+    """
+    chunks = coalesce(tar_stream(directory, arcname, chunk_size), chunk_size)
+    if compress_level is None:
+        return chunks
+    return gzip_stream(chunks, compress_level)
+
+
+def file_stream(handle, chunk_size=CHUNK_SIZE) -> Iterator[bytes]:
+    """
+        Yields the content of an open file and closes it
+    """
+    with handle:
+        while True:
+            chunk = handle.read(chunk_size)
+            if not chunk:
+                return
+            yield chunk
+
+
+class _LimitedTarInfo(tarfile.TarInfo):
+    """
+        TarInfo refusing extended headers larger than MAX_HEADER_SIZE
+        before tarfile reads them
+    """
+
+    def _proc_member(self, tarfile_):
+        if self.type in (tarfile.XHDTYPE, tarfile.XGLTYPE,
+                         tarfile.SOLARIS_XHDTYPE, tarfile.GNUTYPE_LONGNAME,
+                         tarfile.GNUTYPE_LONGLINK) and \
+                self.size > MAX_HEADER_SIZE:
+            raise ArchiveError("extended header of %d bytes" % self.size)
+        return super()._proc_member(tarfile_)
+
+
+def _inside(path, root) -> bool:
+    return path == root or path.startswith(root + os.sep)
+
+
+def _member_path(member, root) -> Optional[str]:
+    """
+        :return: path of a member relative to the top level directory of
+                 the archive, None for that directory itself
+        :raises ArchiveError: when the member is outside of it
+    """
+    name = os.path.normpath(member.name)
+    parts = name.split(os.sep)
+    if os.path.isabs(name) or '..' in parts or parts[0] != root:
+        raise ArchiveError("%s is outside of %s" % (member.name, root))
+    return os.path.join(*parts[1:]) if len(parts) > 1 else None
+
+
+def extract_stream(stream, destination, max_size=None, max_files=None,
+                   chunk_size=CHUNK_SIZE) -> Dict[str, int]:
+    """
+        Extracts a tar archive, compressed or not, read once from stream
+        into destination, which must not exist. Every member must be
+        under a single top level directory, which is stripped. The tree is
+        built next to destination and renamed into place once complete.
+        Devices and fifos are skipped, owners are not restored.
+        :param max_size: largest total size of the extracted files
+        :param max_files: largest number of members
+        :return: number of files, directories, links and bytes extracted
+        :raises ArchiveError: when the archive is malformed, unsafe or
+                              larger than allowed
+    """
+    stats = {'files': 0, 'directories': 0, 'links': 0, 'bytes': 0}
+    parent, name = os.path.split(os.path.abspath(destination))
+    tmp_path = tempfile.mkdtemp(prefix='.' + name + '.', dir=parent)
+    real_tmp = os.path.realpath(tmp_path)
+    directories = []
+    symlinks = []
+    root = None
+    count = 0
+    try:
+        with tarfile.open(fileobj=stream, mode='r|*', bufsize=chunk_size,
+                          tarinfo=_LimitedTarInfo) as tar:
+            for member in tar:
+                count += 1
+                if max_files is not None and count > max_files:
+                    raise ArchiveError("more than %d members" % max_files)
+                if root is None:
+                    root = os.path.normpath(member.name).split(os.sep)[0]
+                relative = _member_path(member, root)
+                if relative is None:
+                    continue
+                path = os.path.join(tmp_path, relative)
+                if not _inside(os.path.realpath(os.path.dirname(path)),
+                               real_tmp):
+                    raise ArchiveError("%s is outside of %s" %
+                                       (member.name, root))
+                if os.path.lexists(path) and not os.path.isdir(path):
+                    os.remove(path)
+                if member.isdir():
+                    os.makedirs(path, exist_ok=True)
+                    directories.append((path, member))
+                    stats['directories'] += 1
+                elif member.isreg():
+                    stats['bytes'] += member.size
+                    if max_size is not None and stats['bytes'] > max_size:
+                        raise ArchiveError("more than %d bytes" % max_size)
+                    os.makedirs(os.path.dirname(path), exist_ok=True)
+                    with tar.extractfile(member) as source, \
+                            open(path, 'wb') as target:
+                        shutil.copyfileobj(source, target, chunk_size)
+                    os.chmod(path, member.mode & 0o755)
+                    os.utime(path, (member.mtime, member.mtime))
+                    stats['files'] += 1
+                elif member.issym() or member.islnk():
+                    base = os.path.dirname(relative) if member.issym() \
+                        else ''
+                    target = os.path.normpath(os.path.join(base,
+                                                           member.linkname))
+                    if os.path.isabs(member.linkname) or \
+                            target.split(os.sep)[0] == '..':
+                        raise ArchiveError("link %s to %s leaves %s" %
+                                           (member.name, member.linkname,
+                                            root))
+                    os.makedirs(os.path.dirname(path), exist_ok=True)
+                    if member.issym():
+                        os.symlink(member.linkname, path)
+                        symlinks.append((path, member))
+                        # links through links extracted before
+                        if not _inside(os.path.realpath(path), real_tmp):
+                            raise ArchiveError("link %s to %s leaves %s" %
+                                               (member.name,
+                                                member.linkname, root))
+                    else:
+                        source = os.path.join(tmp_path, _member_path(
+                            tarfile.TarInfo(member.linkname), root) or '')
+                        # a symlink source may point anywhere by now
+                        if os.path.islink(source) or not _inside(
+                                os.path.realpath(source), real_tmp):
+                            raise ArchiveError("link %s to %s leaves %s" %
+                                               (member.name,
+                                                member.linkname, root))
+                        os.link(source, path, follow_symlinks=False)
+                    stats['links'] += 1
+                else:
+                    logger.warning("skipping %s of type %s", member.name,
+                                   member.type)
+        # links extracted later may redirect the target of a symlink
+        for path, member in symlinks:
+            if not _inside(os.path.realpath(path), real_tmp):
+                raise ArchiveError("link %s to %s leaves %s" %
+                                   (member.name, member.linkname, root))
+        # children first, creating entries changes the mtime of a parent
+        for path, member in reversed(directories):
+            os.chmod(path, member.mode & 0o755 | 0o700)
+            os.utime(path, (member.mtime, member.mtime))
+        os.rename(tmp_path, destination)
+    except (tarfile.TarError, EOFError, zlib.error) as e:
+        shutil.rmtree(tmp_path, ignore_errors=True)
+        raise ArchiveError(str(e) or "archive is truncated")
+    except BaseException:
+        shutil.rmtree(tmp_path, ignore_errors=True)
+        raise
+    return stats
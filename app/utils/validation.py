@@ -0,0 +1,215 @@
+import os
+import json
+import yaml
+from functools import lru_cache
+from typing import Dict, List
+
+# folders next to the PinFile linchpin resolves references from
+TOPOLOGY_FOLDER = 'topologies'
+LAYOUT_FOLDER = 'layouts'
+
+TYPE_NAMES = {dict: 'object', list: 'array', str: 'string', int: 'integer'}
+
+# Schemas are plain data: a python type, or a dict with a 'type' and its
+# constraints ('required', 'optional', 'values', 'items', 'min_items',
+# 'minimum', 'required_any'), or {'any_of': [...]} picking the branch
+# matching the value's type. Unknown keys are allowed, linchpin accepts
+# provider specific ones.
+COUNT = {'type': int, 'minimum': 0}
+
+RESOURCE_DEFINITION = {
+    'type': dict,
+    'required_any': ('role', 'type'),
+    'optional': {'role': str, 'type': str, 'name': str, 'count': COUNT},
+}
+
+RESOURCE_GROUP = {
+    'type': dict,
+    'required': {'resource_group_type': str,
+                 'resource_definitions': {'type': list, 'min_items': 1,
+                                          'items': RESOURCE_DEFINITION}},
+    'optional': {'resource_group_name': str, 'credentials': dict},
+}
+
+TOPOLOGY = {
+    'type': dict,
+    'required': {'resource_groups': {'type': list, 'min_items': 1,
+                                     'items': RESOURCE_GROUP}},
+    'optional': {'topology_name': str},
+}
+
+HOST = {
+    'type': dict,
+    'optional': {'count': COUNT,
+                 'host_groups': {'type': list, 'items': str}},
+}
+
+LAYOUT = {
+    'type': dict,
+    'required': {'inventory_layout': {
+        'type': dict,
+        'required': {'hosts': {'type': dict, 'values': HOST}},
+        'optional': {'vars': dict}}},
+}
+
+TARGET = {
+    'type': dict,
+    'required': {'topology': {'any_of': [str, TOPOLOGY]}},
+    'optional': {'layout': {'any_of': [str, LAYOUT]}, 'hooks': dict},
+}
+
+PINFILE = {'type': dict, 'min_items': 1, 'values': TARGET}
+
+SCHEMAS = {'pinfile': PINFILE, 'topology': TOPOLOGY, 'layout': LAYOUT}
+
+
+def _error(errors, path, message) -> None:
+    errors.append({'path': path or '$', 'message': message})
+
+
+def _is_type(value, expected) -> bool:
+    # bool is a subclass of int but never a valid count
+    if expected is int and isinstance(value, bool):
+        return False
+    return isinstance(value, expected)
+
+
+def _compile(spec):
+    """
+        Turns a schema into a function(value, path, errors) appending
+        {'path', 'message'} dicts for every problem found
+    """
+    if isinstance(spec, type):
+        spec = {'type': spec}
+    if 'any_of' in spec:
+        branches = [({'type': b} if isinstance(b, type) else b)['type']
+                    for b in spec['any_of']]
+        checks = [_compile(b) for b in spec['any_of']]
+        expected = ' or '.join(TYPE_NAMES[b] for b in branches)
+
+        def check_any(value, path, errors):
+            for branch, check in zip(branches, checks):
+                if _is_type(value, branch):
+                    return check(value, path, errors)
+            _error(errors, path, 'expected %s' % expected)
+        return check_any
+
+    expected = spec['type']
+    required = {k: _compile(v) for k, v in spec.get('required', {}).items()}
+    optional = {k: _compile(v) for k, v in spec.get('optional', {}).items()}
+    values = _compile(spec['values']) if 'values' in spec else None
+    items = _compile(spec['items']) if 'items' in spec else None
+    required_any = spec.get('required_any')
+    min_items = spec.get('min_items')
+    minimum = spec.get('minimum')
+
+    def check(value, path, errors):
+        if not _is_type(value, expected):
+            _error(errors, path, 'expected %s' % TYPE_NAMES[expected])
+            return
+        if min_items is not None and len(value) < min_items:
+            _error(errors, path, 'expected at least %d entries' % min_items)
+        if minimum is not None and value < minimum:
+            _error(errors, path, 'expected a value >= %d' % minimum)
+        if expected is dict:
+            prefix = path + '.' if path else ''
+            for key, sub in required.items():
+                if key not in value:
+                    _error(errors, prefix + key, 'is required')
+                else:
+                    sub(value[key], prefix + key, errors)
+            for key, sub in optional.items():
+                if key in value:
+                    sub(value[key], prefix + key, errors)
+            if required_any and not any(k in value for k in required_any):
+                _error(errors, path, 'requires one of %s' %
+                       ', '.join(required_any))
+            if values is not None:
+                for key, item in value.items():
+                    values(item, prefix + str(key), errors)
+        elif items is not None:
+            for index, item in enumerate(value):
+                items(item, '%s[%d]' % (path, index), errors)
+    return check
+
+
+@lru_cache(maxsize=None)
+def compiled(name):
+    """
+        Returns the compiled validator of a schema, compiled once per
+        process
+        :param name: pinfile, topology or layout
+    """
+    return _compile(SCHEMAS[name])
+
+
+def validate(name, document) -> List[Dict]:
+    """
+        Validates a document against one of the schemas
+        :param name: pinfile, topology or layout
+        :param document: parsed document
+        :return: list of {'path', 'message'} dicts, empty when valid
+    """
+    errors = []
+    compiled(name)(document, '', errors)
+    return errors
+
+
+def load_document(path):
+    """
+        Loads a JSON or YAML file
+        :param path: path of the file
+        :return: the parsed document
+    """
+    with open(path, 'r') as handle:
+        content = handle.read()
+    try:
+        return json.loads(content)
+    except ValueError:
+        return yaml.safe_load(content)
+
+
+def validate_pinfile(pinfile, base=None) -> List[Dict]:
+    """
+        Validates a PinFile and, when base is given, the topology and
+        layout files it references by name
+        :param pinfile: parsed PinFile
+        :param base: folder holding the PinFile, None to skip references
+        :return: list of {'path', 'message'} dicts, empty when valid
+    """
+    errors = validate('pinfile', pinfile)
+    if errors or base is None:
+        return errors
+    for target, content in pinfile.items():
+        for key, folder in (('topology', TOPOLOGY_FOLDER),
+                            ('layout', LAYOUT_FOLDER)):
+            if not isinstance(content.get(key), str):
+                continue
+            path = '%s.%s' % (target, key)
+            file_path = os.path.join(base, folder, content[key])
+            if not os.path.isfile(file_path):
+                _error(errors, path, '%s file %s not found' %
+                       (key, os.path.join(folder, content[key])))
+                continue
+            try:
+                document = load_document(file_path)
+            except (ValueError, yaml.YAMLError):
+                # templated files are only valid once rendered by linchpin
+                continue
+            for error in validate(key, document):
+                _error(errors, path + ':' + error['path'], error['message'])
+    return errors
+
+
+def validate_pinfile_file(pinfile_path) -> List[Dict]:
+    """
+        Validates a PinFile on disk and the files it references, files
+        which cannot be read or parsed are left to linchpin
+        :param pinfile_path: path of the PinFile
+        :return: list of {'path', 'message'} dicts, empty when valid
+    """
+    try:
+        pinfile = load_document(pinfile_path)
+    except (OSError, ValueError, yaml.YAMLError):
+        return []
+    return validate_pinfile(pinfile, os.path.dirname(pinfile_path))
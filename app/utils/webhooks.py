@@ -0,0 +1,349 @@
+import os
+import hmac
+import json
+import time
+import uuid
+import heapq
+import queue
+import atexit
+import random
+import hashlib
+import logging
+import threading
+import http.client
+from collections import OrderedDict
+from itertools import count
+from urllib.parse import urlsplit
+from app.data_access_layer.storage import AtomicJSONStorage
+from typing import Callable, Dict, List, Optional, Tuple
+
+SIGNATURE_HEADER = 'X-Restylinchpin-Signature'
+TIMESTAMP_HEADER = 'X-Restylinchpin-Timestamp'
+DELIVERY_HEADER = 'X-Restylinchpin-Delivery'
+
+# errors of a keep-alive connection closed by the receiver meanwhile
+STALE_CONNECTION_ERRORS = (http.client.RemoteDisconnected,
+                           ConnectionResetError, BrokenPipeError)
+
+logger = logging.getLogger(__name__)
+
+_STOP = object()
+
+
+class WebhookError(Exception):
+    """
+        Raised when a receiver answers a delivery with a non 2xx status
+    """
+
+
+def valid_webhook_url(url) -> bool:
+    """
+        :return: True when url is an absolute http or https URL
+    """
+    if not isinstance(url, str):
+        return False
+    parts = urlsplit(url)
+    return parts.scheme in ('http', 'https') and bool(parts.netloc)
+
+
+def sign(secret, timestamp, body) -> str:
+    """
+        Signs a delivery, receivers compute the HMAC-SHA256 of the
+        timestamp header, a dot and the body with their secret
+        :return: value of the signature header
+    """
+    message = timestamp.encode('utf-8') + b'.' + body
+    return 'sha256=' + hmac.new(secret.encode('utf-8'), message,
+                                hashlib.sha256).hexdigest()
+
+
+class DeadLetters(object):
+    """
+        Keeps one JSON file per delivery that failed every attempt so
+        users can list them and ask for them to be delivered again
+    """
+
+    def __init__(self, path):
+        self.path = path
+
+    def _file(self, delivery_id) -> str:
+        return os.path.join(self.path, delivery_id + '.json')
+
+    def save(self, delivery) -> None:
+        os.makedirs(self.path, exist_ok=True)
+        AtomicJSONStorage(self._file(delivery['id'])).write(delivery)
+
+    def get(self, delivery_id) -> Optional[Dict]:
+        if not delivery_id or os.sep in delivery_id or \
+                delivery_id.startswith('.'):
+            return None
+        return AtomicJSONStorage(self._file(delivery_id)).read()
+
+    def remove(self, delivery_id) -> None:
+        try:
+            os.remove(self._file(delivery_id))
+        except FileNotFoundError:
+            pass
+
+    def list(self, username=None) -> List[Dict]:
+        """
+            :param username: only list deliveries of this user, None for
+                             all
+            :return: dead deliveries ordered by creation time
+        """
+        if not os.path.isdir(self.path):
+            return []
+        deliveries = []
+        for name in os.listdir(self.path):
+            if not name.endswith('.json') or name.startswith('.'):
+                continue
+            delivery = self.get(name[:-len('.json')])
+            if delivery is not None and \
+                    (username is None or delivery['username'] == username):
+                deliveries.append(delivery)
+        return sorted(deliveries, key=lambda delivery: delivery['created'])
+
+
+class WebhookDispatcher(object):
+    """
+        Delivers completion events to webhook URLs from a background
+        thread, forked workers start their own thread on first event.
+        Events queued within batch_interval of each other are posted
+        together per user and URL, connections to a receiver are kept
+        open between deliveries. Failed deliveries are retried with
+        exponential backoff and moved to the dead letters after
+        max_attempts. Queuing an event never waits on the network.
+    """
+
+    def __init__(self, resolve: Callable[[str], Tuple[str, str]],
+                 dead_letter_path, batch_interval=1.0, batch_max=100,
+                 max_attempts=8, backoff=2.0, max_backoff=600, timeout=10):
+        """
+            :param resolve: callable returning the registered webhook URL
+                            and signing secret of a username, None for
+                            either when unset
+            :param dead_letter_path: directory of the dead letters
+            :param batch_interval: seconds events are collected for
+                                   before they are posted
+            :param batch_max: largest number of events per post
+            :param max_attempts: posts tried before a delivery is dead
+            :param backoff: seconds before the first retry, doubled for
+                            every further attempt
+            :param max_backoff: longest delay between two attempts
+            :param timeout: seconds to connect and to wait for a receiver
+        """
+        self.resolve = resolve
+        self.dead_letters = DeadLetters(dead_letter_path)
+        self.batch_interval = batch_interval
+        self.batch_max = batch_max
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.timeout = timeout
+        self._queue = None
+        self._thread = None
+        self._pid = None
+        self._lock = threading.Lock()
+        self._connections = {}
+        atexit.register(self.close)
+
+    def _start(self) -> None:
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._queue = queue.Queue()
+            self._connections = {}
+            self._thread = threading.Thread(target=self._run,
+                                            args=(self._queue,),
+                                            name='webhook-dispatcher',
+                                            daemon=True)
+            self._thread.start()
+            self._pid = os.getpid()
+
+    def notify(self, username, event, url=None) -> None:
+        """
+            Queues an event for the registered webhook of username and
+            for url
+            :param url: webhook URL given with the request, None to only
+                        call the registered webhook
+        """
+        if self._pid != os.getpid():
+            self._start()
+        self._queue.put((username, url, event))
+
+    def redeliver(self, delivery) -> None:
+        """
+            Queues a dead delivery for another round of attempts
+        """
+        if self._pid != os.getpid():
+            self._start()
+        self.dead_letters.remove(delivery['id'])
+        delivery['attempts'] = 0
+        self._queue.put(delivery)
+
+    def close(self, timeout=None) -> None:
+        """
+            Posts the queued events once, failed and scheduled deliveries
+            are kept as dead letters, and stops the thread
+        """
+        if self._thread is None or self._pid != os.getpid():
+            return
+        self._queue.put(_STOP)
+        self._thread.join(self.timeout * 2 if timeout is None else timeout)
+
+    def _collect(self, items, first, registered) -> Tuple[List[Dict], bool]:
+        """
+            Groups the items queued within batch_interval of first into
+            deliveries per user and URL
+            :param registered: cache of the registered URL per username
+            :return: the deliveries and whether close was called
+        """
+        deliveries = OrderedDict()
+        deadline = time.monotonic() + self.batch_interval
+        item = first
+        while True:
+            if item is _STOP:
+                stopped = True
+                break
+            if isinstance(item, dict):
+                deliveries[item['id']] = item
+            else:
+                username, url, event = item
+                if username not in registered:
+                    try:
+                        registered[username] = self.resolve(username)[0]
+                    except Exception as e:
+                        logger.error("could not look up the webhook of "
+                                     "%s: %s", username, e)
+                        registered[username] = None
+                for target in OrderedDict.fromkeys(
+                        [registered[username], url]):
+                    if target:
+                        deliveries.setdefault(
+                            (username, target),
+                            self._new_delivery(username, target)
+                        )['events'].append(event)
+            remaining = deadline - time.monotonic()
+            try:
+                item = self._queue_get(items, remaining)
+            except queue.Empty:
+                stopped = False
+                break
+        result = []
+        for delivery in deliveries.values():
+            events = delivery['events']
+            for start in range(0, max(len(events), 1), self.batch_max):
+                if start:
+                    delivery = self._new_delivery(delivery['username'],
+                                                  delivery['url'])
+                delivery['events'] = events[start:start + self.batch_max]
+                result.append(delivery)
+        return result, stopped
+
+    @staticmethod
+    def _queue_get(items, timeout):
+        if timeout is None:
+            return items.get()
+        if timeout <= 0:
+            return items.get_nowait()
+        return items.get(timeout=timeout)
+
+    @staticmethod
+    def _new_delivery(username, url) -> Dict:
+        return {'id': uuid.uuid4().hex, 'username': username, 'url': url,
+                'events': [], 'attempts': 0, 'created': time.time(),
+                'error': None}
+
+    def _run(self, items) -> None:
+        retries = []
+        order = count()
+        while True:
+            wait = max(retries[0][0] - time.monotonic(), 0) \
+                if retries else None
+            try:
+                first = self._queue_get(items, wait)
+            except queue.Empty:
+                first = None
+            ready, stopped = [], False
+            if first is not None:
+                ready, stopped = self._collect(items, first, {})
+            now = time.monotonic()
+            while retries and (stopped or retries[0][0] <= now):
+                ready.append(heapq.heappop(retries)[2])
+            for delivery in ready:
+                if self._deliver(delivery):
+                    continue
+                if stopped or delivery['attempts'] >= self.max_attempts:
+                    logger.error("webhook delivery %s to %s failed %d "
+                                 "times: %s", delivery['id'],
+                                 delivery['url'], delivery['attempts'],
+                                 delivery['error'])
+                    self.dead_letters.save(delivery)
+                else:
+                    heapq.heappush(retries, (now + self._delay(delivery),
+                                             next(order), delivery))
+            if stopped:
+                for connection in self._connections.values():
+                    connection.close()
+                return
+
+    def _delay(self, delivery) -> float:
+        delay = min(self.max_backoff,
+                    self.backoff * 2 ** (delivery['attempts'] - 1))
+        # jitter spreads retries of deliveries that failed together
+        return delay * random.uniform(0.5, 1)
+
+    def _deliver(self, delivery) -> bool:
+        """
+            Posts a delivery once
+            :return: True when the receiver accepted it
+        """
+        delivery['attempts'] += 1
+        body = json.dumps({'delivery': delivery['id'],
+                           'events': delivery['events']},
+                          default=str).encode('utf-8')
+        timestamp = str(int(time.time()))
+        headers = {'Content-Type': 'application/json',
+                   DELIVERY_HEADER: delivery['id'],
+                   TIMESTAMP_HEADER: timestamp}
+        try:
+            secret = self.resolve(delivery['username'])[1]
+            if secret:
+                headers[SIGNATURE_HEADER] = sign(secret, timestamp, body)
+            self._post(delivery['url'], body, headers)
+            return True
+        except Exception as e:
+            delivery['error'] = str(e)
+            logger.warning("webhook delivery %s to %s failed: %s",
+                           delivery['id'], delivery['url'], e)
+            return False
+
+    def _post(self, url, body, headers) -> None:
+        parts = urlsplit(url)
+        key = (parts.scheme, parts.netloc)
+        path = (parts.path or '/') + ('?' + parts.query if parts.query
+                                      else '')
+        reused = key in self._connections
+        if not reused:
+            connection_class = http.client.HTTPSConnection \
+                if parts.scheme == 'https' else http.client.HTTPConnection
+            self._connections[key] = connection_class(parts.netloc,
+                                                      timeout=self.timeout)
+        connection = self._connections[key]
+        try:
+            connection.request('POST', path, body, headers)
+            result = connection.getresponse()
+            result.read()
+        except STALE_CONNECTION_ERRORS:
+            self._connections.pop(key).close()
+            if not reused:
+                raise
+            return self._post(url, body, headers)
+        except Exception:
+            self._connections.pop(key).close()
+            raise
+        if result.will_close:
+            self._connections.pop(key).close()
+        if not 200 <= result.status < 300:
+            raise WebhookError("receiver answered %d %s" %
+                               (result.status, result.reason))
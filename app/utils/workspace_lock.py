@@ -0,0 +1,143 @@
+import os
+import json
+import time
+import hashlib
+import threading
+from app.data_access_layer.locking import FileLock
+from app.data_access_layer.storage import AtomicJSONStorage
+from app.tracing import tracer
+from typing import Dict
+
+
+def operation_key(action, identity, data) -> str:
+    """
+        Builds the key identifying identical operations on a workspace
+        :param action: up, destroy, update or delete
+        :param identity: unique uuid_name assigned to the workspace
+        :param data: JSON data from the request body
+        :return: hex digest of the action, workspace and request body
+    """
+    body = json.dumps(data, sort_keys=True, default=str)
+    return hashlib.sha256(('%s\0%s\0%s' % (action, identity, body))
+                          .encode('utf-8')).hexdigest()
+
+
+class _InFlight(object):
+
+    def __init__(self, key):
+        self.key = key
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class WorkspaceOperations(object):
+    """
+        Runs operations on a workspace one at a time across the threads
+        and worker processes of a deployment. A request identical to the
+        operation in flight waits for it and shares its result instead of
+        running again, within a process through an in-memory registry and
+        across processes through the last result stored next to the lock
+        file.
+    """
+
+    def __init__(self, lock_path):
+        self.lock_path = lock_path
+        self._reset()
+        if hasattr(os, 'register_at_fork'):
+            os.register_at_fork(after_in_child=self._reset)
+
+    def _reset(self) -> None:
+        # locks held by threads of the parent at fork time would never be
+        # released in the child, it starts with fresh ones
+        self._guard = threading.Lock()
+        self._locks = {}
+        self._in_flight = {}
+
+    def _lock_file(self, identity) -> str:
+        return os.path.join(self.lock_path, identity + '.lock')
+
+    def _result_file(self, identity) -> str:
+        return os.path.join(self.lock_path, identity + '.result.json')
+
+    def _thread_lock(self, identity):
+        with self._guard:
+            entry = self._locks.setdefault(identity, [threading.Lock(), 0])
+            entry[1] += 1
+            return entry[0]
+
+    def _release_thread_lock(self, identity) -> None:
+        with self._guard:
+            entry = self._locks[identity]
+            entry[1] -= 1
+            if not entry[1]:
+                del self._locks[identity]
+
+    def _stored_result(self, identity, key, since) -> Dict:
+        stored = AtomicJSONStorage(self._result_file(identity)).read()
+        if stored and stored['key'] == key and stored['finished'] >= since:
+            return stored
+        return None
+
+    def run(self, identity, key, function):
+        """
+            Runs function while holding the workspace lock
+            :param identity: unique uuid_name assigned to the workspace
+            :param key: operation_key of the request
+            :param function: callable returning a JSON serializable result
+            :return: the result of function, or of the identical operation
+                     this request was coalesced onto
+        """
+        with self._guard:
+            in_flight = self._in_flight.get(identity)
+            if in_flight is not None and in_flight.key == key:
+                follower = True
+            else:
+                follower = False
+        if follower:
+            with tracer.span('workspace.coalesced', workspace=identity):
+                in_flight.done.wait()
+            if in_flight.error is not None:
+                raise in_flight.error
+            return in_flight.result
+
+        arrived = time.time()
+        thread_lock = self._thread_lock(identity)
+        try:
+            with tracer.span('workspace.lock', workspace=identity):
+                thread_lock.acquire()
+                try:
+                    os.makedirs(self.lock_path, exist_ok=True)
+                    file_lock = FileLock(self._lock_file(identity))
+                    file_lock.acquire()
+                except BaseException:
+                    thread_lock.release()
+                    raise
+            try:
+                stored = self._stored_result(identity, key, arrived)
+                if stored is not None:
+                    return stored['result']
+                return self._run_locked(identity, key, function)
+            finally:
+                file_lock.release()
+                thread_lock.release()
+        finally:
+            self._release_thread_lock(identity)
+
+    def _run_locked(self, identity, key, function):
+        in_flight = _InFlight(key)
+        with self._guard:
+            self._in_flight[identity] = in_flight
+        try:
+            in_flight.result = function()
+            AtomicJSONStorage(self._result_file(identity)).write(
+                {'key': key, 'finished': time.time(),
+                 'result': in_flight.result})
+            return in_flight.result
+        except Exception as e:
+            in_flight.error = e
+            raise
+        finally:
+            with self._guard:
+                del self._in_flight[identity]
+            in_flight.done.set()
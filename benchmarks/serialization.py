@@ -0,0 +1,111 @@
+"""
+    Serialization benchmark for restylinchpin
+
+    Encodes a large synthetic workspace listing, as returned to admin users
+    by GET /api/v1.0/workspaces, with the previous json.dumps call and with
+    each installed serializer, whole and through the incremental array
+    encoder of list endpoints. Reports the median encode time, the payload
+    size and the gzip compressed size, and exits non zero when an encoder
+    does not round trip the listing.
+
+    usage: python benchmarks/serialization.py [--workspaces 50000] [--runs 5]
+"""
+import argparse
+import gzip
+import json
+import os
+import statistics
+import sys
+import time
+import uuid
+
+ROOT = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+sys.path.insert(0, ROOT)
+
+from app.serialization import JSONSerializer, orjson  # noqa: E402
+
+STATUSES = ('CREATED', 'PROVISIONED', 'DESTROYED', 'FETCHED')
+
+
+def workspaces(count):
+    """
+        :return: list of count workspace records shaped like the db ones
+    """
+    users = ['user%d' % i for i in range(max(1, count // 50))]
+    records = []
+    for i in range(count):
+        name = 'workspace-%d' % i
+        records.append({'name': name,
+                        'id': '%s_%s' % (uuid.uuid4(), name),
+                        'status': STATUSES[i % len(STATUSES)],
+                        'username': users[i % len(users)],
+                        'provision_hash': uuid.uuid4().hex * 2
+                        if i % 4 == 1 else None})
+    return records
+
+
+def encoders():
+    """
+        :return: list of (name, encode, decode) for every installed encoder
+    """
+    found = [('json.dumps (previous)',
+              lambda items: json.dumps(items).encode('utf-8'), json.loads)]
+    backends = ['json'] + (['orjson'] if orjson is not None else [])
+    for backend in backends:
+        serializer = JSONSerializer(backend)
+        found.append(('%s whole' % backend, serializer.dumps, json.loads))
+        found.append(('%s incremental' % backend,
+                      lambda items, s=serializer: b''.join(
+                          s.iter_array(items)), json.loads))
+    try:
+        import msgpack
+        from app.serialization import MsgpackSerializer
+        serializer = MsgpackSerializer()
+        found.append(('msgpack incremental',
+                      lambda items: b''.join(serializer.iter_array(items)),
+                      msgpack.unpackb))
+    except ImportError:
+        pass
+    return found
+
+
+def time_encoder(encode, items, runs):
+    """
+        :return: (median seconds per encode, encoded payload)
+    """
+    samples = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        payload = encode(items)
+        samples.append(time.perf_counter() - start)
+    return statistics.median(samples), payload
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--workspaces', type=int, default=50000)
+    parser.add_argument('--runs', type=int, default=5)
+    args = parser.parse_args()
+
+    items = workspaces(args.workspaces)
+    print("%d workspaces\n" % len(items))
+    print("%-24s %12s %12s %12s %10s" % ('encoder', 'encode ms', 'bytes',
+                                         'gzip bytes', 'speedup'))
+    failed = False
+    baseline = None
+    for name, encode, decode in encoders():
+        elapsed, payload = time_encoder(encode, items, args.runs)
+        baseline = baseline or elapsed
+        if decode(payload) != items:
+            failed = True
+            name += ' MISMATCH'
+        print("%-24s %12.1f %12d %12d %9.1fx" % (
+            name, elapsed * 1000, len(payload),
+            len(gzip.compress(payload, 6)), baseline / elapsed))
+    if failed:
+        print("\nFAIL: an encoder did not round trip the listing")
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,100 @@
+"""
+    Startup benchmark for restylinchpin
+
+    Imports the app package in fresh interpreters with ``python -X importtime``
+    and reports the cumulative import time, the slowest top level packages
+    and the time spent in create_app(). Exits non zero when the import
+    exceeds the budget or pulls in a module that must be loaded lazily.
+
+    usage: python benchmarks/startup.py [--runs 5] [--budget-ms 600]
+"""
+import argparse
+import os
+import re
+import statistics
+import subprocess
+import sys
+import time
+from collections import defaultdict
+
+ROOT = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+
+# modules only needed by credentials routes and the docs UI
+LAZY_MODULES = ('ansible', 'ansible_vault', 'flask_swagger_ui')
+
+LINE = re.compile(r'import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)')
+
+
+def import_report(statement):
+    """
+        Runs statement in a fresh interpreter with -X importtime
+        :return: (list of (self_us, cumulative_us, depth, module),
+                  wall clock seconds)
+    """
+    env = dict(os.environ, PYTHONPATH=ROOT)
+    start = time.perf_counter()
+    proc = subprocess.run([sys.executable, '-X', 'importtime', '-c',
+                           statement], env=env, stdout=subprocess.PIPE,
+                          stderr=subprocess.PIPE, universal_newlines=True)
+    elapsed = time.perf_counter() - start
+    if proc.returncode:
+        sys.stderr.write(proc.stderr)
+        raise SystemExit(proc.returncode)
+    rows = []
+    for line in proc.stderr.splitlines():
+        match = LINE.match(line)
+        if match:
+            rows.append((int(match.group(1)), int(match.group(2)),
+                         len(match.group(3)) // 2, match.group(4)))
+    return rows, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--budget-ms', type=float, default=600.0,
+                        help="maximum median cumulative import time of app")
+    parser.add_argument('--top', type=int, default=10)
+    args = parser.parse_args()
+
+    totals, walls, factory = [], [], []
+    by_package = defaultdict(list)
+    loaded = set()
+    for _ in range(args.runs):
+        rows, wall = import_report('import app')
+        walls.append(wall)
+        totals.append(next(c for s, c, d, m in rows if m == 'app') / 1000.0)
+        per_run = defaultdict(int)
+        for self_us, _, _, module in rows:
+            per_run[module.split('.')[0]] += self_us
+            loaded.add(module)
+        for package, self_us in per_run.items():
+            by_package[package].append(self_us / 1000.0)
+        _, wall = import_report('import app; app.create_app()')
+        factory.append(wall - walls[-1])
+
+    print("import app            median %8.1f ms  (wall %.1f ms)" %
+          (statistics.median(totals), statistics.median(walls) * 1000))
+    print("create_app()          median %8.1f ms" %
+          (max(statistics.median(factory), 0) * 1000))
+    print("\nslowest packages (self time, median ms)")
+    ranked = sorted(by_package.items(),
+                    key=lambda item: statistics.median(item[1]),
+                    reverse=True)
+    for package, times in ranked[:args.top]:
+        print("  %-28s %8.1f" % (package, statistics.median(times)))
+
+    failed = False
+    eager = sorted(m for m in loaded if m.split('.')[0] in LAZY_MODULES)
+    if eager:
+        failed = True
+        print("\nFAIL: imported eagerly: %s" % ', '.join(eager))
+    if statistics.median(totals) > args.budget_ms:
+        failed = True
+        print("\nFAIL: import app exceeds budget of %.0f ms" %
+              args.budget_ms)
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,120 @@
+"""
+    PinFile validation benchmark for restylinchpin
+
+    Times the in-process validator on a set of malformed PinFiles against
+    the linchpin init plus linchpin up cycle the same input used to go
+    through before it failed, and reports the time saved per rejected
+    request. The subprocess cycle is skipped when linchpin is not on PATH.
+
+    usage: python benchmarks/validation.py [--runs 1000] [--linchpin-runs 3]
+"""
+import argparse
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+sys.path.insert(0, ROOT)
+
+from app.utils.validation import compiled, validate_pinfile  # noqa: E402
+
+RESOURCE_GROUP = {'resource_group_name': 'rg',
+                  'resource_group_type': 'dummy',
+                  'resource_definitions': [{'name': 'web', 'role':
+                                            'dummy_node', 'count': 1}]}
+
+BAD_PINFILES = {
+    'missing topology': {'target': {'layout': 'dummy-layout.yml'}},
+    'empty resource groups': {'target': {'topology': {
+        'topology_name': 'bad', 'resource_groups': []}}},
+    'string count': {'target': {'topology': {
+        'topology_name': 'bad', 'resource_groups': [dict(
+            RESOURCE_GROUP, resource_definitions=[
+                {'name': 'web', 'role': 'dummy_node', 'count': 'two'}])]}}},
+    'hosts not a mapping': {'target': {
+        'topology': {'topology_name': 'bad',
+                     'resource_groups': [RESOURCE_GROUP]},
+        'layout': {'inventory_layout': {'hosts': ['web']}}}},
+}
+
+
+def time_validator(pinfile, runs):
+    """
+        :return: (median seconds per validation, list of errors)
+    """
+    samples = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        errors = validate_pinfile(pinfile)
+        samples.append(time.perf_counter() - start)
+    return statistics.median(samples), errors
+
+
+def time_linchpin(pinfile, runs):
+    """
+        Runs linchpin init and linchpin up on pinfile in a scratch
+        workspace the way provisioning a pinfile does
+        :return: median seconds per cycle, None without linchpin
+    """
+    if shutil.which('linchpin') is None:
+        return None
+    samples = []
+    for _ in range(runs):
+        workspace = tempfile.mkdtemp(prefix='restylinchpin-bench-')
+        try:
+            start = time.perf_counter()
+            subprocess.run(['linchpin', '-w', workspace, 'init'],
+                           stdout=subprocess.DEVNULL,
+                           stderr=subprocess.DEVNULL)
+            os.makedirs(os.path.join(workspace, 'dummy'), exist_ok=True)
+            with open(os.path.join(workspace, 'dummy', 'PinFile.json'),
+                      'w') as handle:
+                json.dump(pinfile, handle)
+            subprocess.run(['linchpin', '-w',
+                            os.path.join(workspace, 'dummy'),
+                            '-p', 'PinFile.json', 'up'],
+                           stdout=subprocess.DEVNULL,
+                           stderr=subprocess.DEVNULL)
+            samples.append(time.perf_counter() - start)
+        finally:
+            shutil.rmtree(workspace, ignore_errors=True)
+    return statistics.median(samples)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--runs', type=int, default=1000)
+    parser.add_argument('--linchpin-runs', type=int, default=3)
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    compiled('pinfile')
+    print("schema compilation     %10.3f ms (once per process)\n" %
+          ((time.perf_counter() - start) * 1000))
+    print("%-24s %14s %14s %12s" % ('input', 'validator ms',
+                                    'linchpin ms', 'saved ms'))
+    failed = False
+    for name, pinfile in BAD_PINFILES.items():
+        validator, errors = time_validator(pinfile, args.runs)
+        linchpin = time_linchpin(pinfile, args.linchpin_runs)
+        if not errors:
+            failed = True
+        print("%-24s %14.4f %14s %12s" % (
+            name, validator * 1000,
+            '%.1f' % (linchpin * 1000) if linchpin is not None else 'n/a',
+            '%.1f' % ((linchpin - validator) * 1000)
+            if linchpin is not None else 'n/a'))
+        for error in errors:
+            print("    %s: %s" % (error['path'], error['message']))
+    if failed:
+        print("\nFAIL: a malformed PinFile passed validation")
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,6 +1,6 @@
-from distutils.core import setup
 import os
 import setuptools
+from setuptools import setup
 
 dir_path = os.path.dirname(os.path.realpath(__file__))
 reqs_file = 'requirements.txt'.format(dir_path)
@@ -21,7 +21,7 @@ setup(
     author_email="mankulka@redhat.com",
 
     # Packages
-    packages=["app"],
+    packages=setuptools.find_namespace_packages(include=["app", "app.*"]),
 
     # Include additional files into the package
     include_package_data=True,
@@ -41,7 +41,14 @@ setup(
     # Dependent packages (distributions)
     install_requires=[
         "flask",
-        "linchpin"
+        "linchpin",
+        "gunicorn"
     ],
+
+    entry_points={
+        "console_scripts": [
+            "restylinchpin = app.cli:main",
+        ],
+    },
 )
 